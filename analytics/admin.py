@@ -1,2 +1,10 @@
-# Analytics app - no models to manage in admin
-# All data is aggregated from other apps
+from django.contrib import admin
+from .models import DailyRollup
+
+
+@admin.register(DailyRollup)
+class DailyRollupAdmin(admin.ModelAdmin):
+    list_display = ('date', 'shop', 'user', 'income', 'expenses', 'sales_count', 'items_sold')
+    search_fields = ('shop__name', 'user__username')
+    list_filter = ('shop', 'date')
+    readonly_fields = ('updated_at',)
@@ -0,0 +1,92 @@
+"""
+Inventory health for one shop, several shops, or broken down by shop and
+category.
+
+Every figure comes from one conditional-aggregation pass over the stock
+rows (COUNT(...) FILTER (WHERE ...) on PostgreSQL, COUNT(CASE ...) on
+SQLite). Breakdowns group that same pass by shop and/or category and add
+the groups up in Python, so a consolidated view of N branches with a
+category breakdown still costs one query. Only the requested fields are
+grouped on; grouping is most of the cost of the query.
+
+An item is critical when nothing is left and low when it is below its
+minimum but not empty, so no item is counted twice (the same split as
+inventory.services.low_stock). It is overstocked when it holds more than
+OVERSTOCK_MULTIPLE times its minimum level.
+"""
+from decimal import Decimal
+from django.db.models import Count, Q, F, Sum
+from inventory.services import CRITICAL_STOCK, LOW_STOCK, MONEY
+
+OVERSTOCK_MULTIPLE = 5
+OVERSTOCK = Q(quantity_in_stock__gt=F('min_stock_level') * OVERSTOCK_MULTIPLE)
+
+COUNTS = ('total', 'low', 'critical', 'overstock')
+VALUES = ('inventory_value', 'inventory_cost')
+
+
+def _aggregates():
+    return {
+        'total': Count('id'),
+        'low': Count('id', filter=LOW_STOCK & ~CRITICAL_STOCK),
+        'critical': Count('id', filter=CRITICAL_STOCK),
+        'overstock': Count('id', filter=OVERSTOCK),
+        # Retail value of what is on the shelves, and its cost where cost_price is known
+        'inventory_value': Sum(F('price') * F('quantity_in_stock'), output_field=MONEY),
+        'inventory_cost': Sum(F('cost_price') * F('quantity_in_stock'), output_field=MONEY),
+    }
+
+
+def _health(row):
+    total = row['total']
+    needs_restock = row['low'] + row['critical']
+    return {
+        'total_stocks': total,
+        'low_stock': row['low'],
+        'critical_stock': row['critical'],
+        'overstock': row['overstock'],
+        'health_percent': round(100 - needs_restock / total * 100, 2) if total > 0 else 0,
+        'inventory_value': row['inventory_value'] or Decimal('0'),
+        'inventory_cost': row['inventory_cost'] or Decimal('0'),
+    }
+
+
+def _add(rows):
+    totals = dict.fromkeys(COUNTS, 0)
+    totals.update(dict.fromkeys(VALUES, Decimal('0')))
+    for row in rows:
+        for key in COUNTS + VALUES:
+            totals[key] += row[key] or 0
+    return totals
+
+
+def inventory_health(stocks):
+    """Counts, health percentage and valuation of a Stock queryset, one aggregate"""
+    return _health(stocks.aggregate(**_aggregates()))
+
+
+def inventory_health_rows(stocks, *fields):
+    """The inventory_health() aggregates grouped by ``fields`` ('shop_id', 'category'), one query"""
+    return list(stocks.values(*fields).annotate(**_aggregates()).order_by(*fields))
+
+
+def rows_by_shop(rows):
+    """Split inventory_health_rows() into {shop_id: rows}"""
+    shops = {}
+    for row in rows:
+        shops.setdefault(row['shop_id'], []).append(row)
+    return shops
+
+
+def summarize(rows, by_category=False):
+    """Health figures for some inventory_health_rows(), optionally with a per-category list"""
+    figures = _health(_add(rows))
+    if by_category:
+        categories = {}
+        for row in rows:
+            categories.setdefault(row['category'], []).append(row)
+        figures['by_category'] = [
+            dict(category=category, **_health(_add(category_rows)))
+            for category, category_rows in sorted(categories.items())
+        ]
+    return figures
@@ -0,0 +1,102 @@
+"""
+Response cache for the analytics endpoints.
+
+``@cached`` stores an action's response data under
+(user, version, day, endpoint, query params), so the shop selection and
+every other parameter are part of the key. Each user has a version number
+in the cache; any Sale, Expense, Stock or Shop write bumps it once the
+transaction commits (see signals.py), which retires all of that user's
+cached responses at once without having to find them. The local day is in
+the key too, so "today" figures roll over at midnight.
+
+Entries live in the ``analytics`` cache alias (settings.CACHES). Hits and
+misses are counted per endpoint in the same cache, so the counters cover
+every worker that shares it; see stats().
+"""
+from functools import wraps
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+ALIAS = 'analytics'
+CACHE_TIMEOUT = 300
+ENDPOINTS = []
+
+
+def _cache():
+    return caches[ALIAS]
+
+
+def _version_key(user_id):
+    return f'analytics:version:{user_id}'
+
+
+def version(user_id):
+    return _cache().get_or_set(_version_key(user_id), 1, None)
+
+
+def invalidate(user_id):
+    """Retire every cached analytics response of a user"""
+    try:
+        _cache().incr(_version_key(user_id))
+    except ValueError:
+        _cache().set(_version_key(user_id), 1, None)
+
+
+def invalidate_on_commit(user_id):
+    """invalidate() once the current transaction commits, so no reader caches pre-commit data"""
+    transaction.on_commit(lambda: invalidate(user_id))
+
+
+def response_key(user_id, endpoint, params):
+    query = '&'.join(f'{name}={",".join(params.getlist(name))}' for name in sorted(params))
+    return f'analytics:response:{user_id}:{version(user_id)}:{timezone.localdate()}:{endpoint}:{query}'
+
+
+def _count(endpoint, outcome):
+    key = f'analytics:stats:{endpoint}:{outcome}'
+    try:
+        _cache().incr(key)
+    except ValueError:
+        _cache().add(key, 0, None)
+        _cache().incr(key)
+
+
+def stats():
+    """{endpoint: {'hits': n, 'misses': n}} since the cache was last cleared"""
+    counters = _cache().get_many([
+        f'analytics:stats:{endpoint}:{outcome}' for endpoint in ENDPOINTS for outcome in ('hits', 'misses')
+    ])
+    return {
+        endpoint: {
+            outcome: counters.get(f'analytics:stats:{endpoint}:{outcome}', 0)
+            for outcome in ('hits', 'misses')
+        }
+        for endpoint in ENDPOINTS
+    }
+
+
+def cached(view, timeout=CACHE_TIMEOUT):
+    """Serve a viewset action's successful GET responses from the cache"""
+    endpoint = view.__name__
+    ENDPOINTS.append(endpoint)
+
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = response_key(request.user.pk, endpoint, request.query_params)
+        data = _cache().get(key)
+        if data is not None:
+            _count(endpoint, 'hits')
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _count(endpoint, 'misses')
+        response = view(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            _cache().set(key, response.data, timeout)
+        response['X-Cache'] = 'MISS'
+        return response
+    return wrapper
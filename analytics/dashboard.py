@@ -0,0 +1,140 @@
+"""
+Dashboard snapshot: the figures the dashboard used to fetch from seven
+endpoints, built in one request.
+
+Sections share queries where they can: today, yesterday and the all-time
+summary come from one conditional aggregate over closed DailyRollup days
+plus one live aggregate of today's rows. Every other section is a single
+aggregate or grouped query.
+
+The dashboard endpoint caches snapshots like every other analytics
+endpoint (see cache.py), so edits show up on the next load.
+"""
+from datetime import timedelta
+from django.db.models import Sum, Count, Q, F, DecimalField
+from django.utils import timezone
+from inventory.models import Stock
+from inventory.services import low_stock, low_stock_counts
+from sales.models import Sale
+from .models import DailyRollup
+from . import breakdowns, leaderboard, rollups
+
+SECTIONS = (
+    'today', 'yesterday', 'summary', 'low_stock', 'profit_margin', 'inventory_health', 'top_products'
+)
+ALERT_ITEMS = 5
+TOP_PRODUCTS = 5
+
+
+def _sales_totals(user, shop, sections):
+    """today / yesterday / summary from closed rollup days plus today's live rows"""
+    today = timezone.localdate()
+    yesterday = today - timedelta(days=1)
+    data = {}
+
+    closed = {}
+    if 'summary' in sections or 'yesterday' in sections:
+        rows = DailyRollup.objects.filter(user=user, date__lt=today)
+        if shop is not None:
+            rows = rows.filter(shop=shop)
+        closed = rows.aggregate(
+            total_income=Sum('income'),
+            total_sales=Sum('sales_count'),
+            yesterday_income=Sum('income', filter=Q(date=yesterday)),
+            yesterday_sales=Sum('sales_count', filter=Q(date=yesterday)),
+        )
+
+    live = rollups.empty_totals()
+    if 'summary' in sections or 'today' in sections:
+        live = rollups._live_day(user, today, shop)
+
+    if 'today' in sections:
+        data['today'] = {
+            'date': today,
+            'total_sales': live['sales_count'],
+            'total_amount': float(live['income']),
+            'total_expenses': float(live['expenses']),
+        }
+    if 'yesterday' in sections:
+        data['yesterday'] = {
+            'date': yesterday,
+            'total_sales': closed['yesterday_sales'] or 0,
+            'total_amount': float(closed['yesterday_income'] or 0),
+        }
+    if 'summary' in sections:
+        total_sales = (closed['total_sales'] or 0) + live['sales_count']
+        total_amount = float(closed['total_income'] or 0) + float(live['income'])
+        data['summary'] = {
+            'total_sales': total_sales,
+            'total_amount': total_amount,
+            'average_sale': total_amount / total_sales if total_sales > 0 else 0,
+        }
+    return data
+
+
+def _low_stock(stocks):
+    counts = low_stock_counts(stocks)
+    items = low_stock(stocks).values(
+        'id', 'name', 'category', 'quantity_in_stock', 'min_stock_level', 'stock_deficit', 'alert_level'
+    )[:ALERT_ITEMS]
+    return {
+        'critical_alerts': counts['critical'],
+        'warning_alerts': counts['warning'],
+        'total_alerts': counts['critical'] + counts['warning'],
+        'items': [
+            {
+                'product_id': item['id'],
+                'product_name': item['name'],
+                'category': item['category'],
+                'current_stock': item['quantity_in_stock'],
+                'min_stock_level': item['min_stock_level'],
+                'stock_deficit': item['stock_deficit'],
+                'alert_level': item['alert_level'],
+            }
+            for item in items
+        ],
+    }
+
+
+def _profit_margin(sales):
+    """Same overall figures as SaleViewSet.profit_margin_analysis, one aggregate"""
+    costed = Q(unit_cost__isnull=False)
+    totals = sales.aggregate(
+        revenue=Sum('total_amount'),
+        costed_revenue=Sum('total_amount', filter=costed),
+        cost=Sum(F('unit_cost') * F('quantity'), filter=costed,
+                 output_field=DecimalField(max_digits=15, decimal_places=2)),
+        uncosted_sales=Count('id', filter=~costed),
+        product_count=Count('stock', distinct=True),
+    )
+    costed_revenue = float(totals['costed_revenue'] or 0)
+    cost = float(totals['cost'] or 0)
+    profit = costed_revenue - cost
+    return {
+        'total_revenue': float(totals['revenue'] or 0),
+        'total_cost': cost,
+        'total_profit': profit,
+        'overall_margin_percent': (profit / costed_revenue * 100) if costed_revenue > 0 else 0,
+        'product_count': totals['product_count'],
+        'uncosted_sales': totals['uncosted_sales'],
+    }
+
+
+def build(user, shop=None, sections=SECTIONS):
+    """Compute the requested sections for a user, optionally limited to one shop"""
+    sales = Sale.objects.filter(user=user)
+    stocks = Stock.objects.filter(user=user)
+    if shop is not None:
+        sales = sales.filter(shop=shop)
+        stocks = stocks.filter(shop=shop)
+
+    data = _sales_totals(user, shop, sections)
+    if 'low_stock' in sections:
+        data['low_stock'] = _low_stock(stocks)
+    if 'profit_margin' in sections:
+        data['profit_margin'] = _profit_margin(sales)
+    if 'inventory_health' in sections:
+        data['inventory_health'] = breakdowns.inventory_health(stocks)
+    if 'top_products' in sections:
+        data['top_products'] = leaderboard.top_products(user, TOP_PRODUCTS, shop=shop)
+    return data
@@ -0,0 +1,154 @@
+"""
+Top-products leaderboard maintained on write.
+
+ProductRollup holds one row per (stock item, period) for the current
+day, ISO week, calendar month and all time. Every sale adjusts its four
+rows in the same transaction (rollups.record_sale calls record_sale here),
+so reading the leaderboard is an indexed ORDER BY revenue / LIMIT over
+the matching period instead of a GROUP BY over the whole sales history.
+Rows are per stock item, so products that share a name in different
+shops stay apart.
+
+``manage.py rebuild_rollups`` recomputes the rows from the sales table.
+"""
+from datetime import date
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum, Window
+from django.db.models.functions import RowNumber, TruncDate
+from django.utils import timezone
+from sales.models import Sale
+from .models import ProductRollup
+
+PERIODS = ('day', 'week', 'month', 'all')
+ALL_TIME = date.min
+
+
+def period_start(day, period):
+    """First day of the period containing ``day``"""
+    if period == 'week':
+        return date.fromordinal(day.toordinal() - day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    if period == 'all':
+        return ALL_TIME
+    return day
+
+
+def _bump(user_id, shop_id, stock_id, day, revenue, items_sold, sales_count):
+    """Add deltas to the stock's row for each period containing ``day``"""
+    for period in PERIODS:
+        key = dict(stock_id=stock_id, period=period, period_start=period_start(day, period))
+        deltas = dict(
+            revenue=F('revenue') + revenue,
+            items_sold=F('items_sold') + items_sold,
+            sales_count=F('sales_count') + sales_count,
+            updated_at=timezone.now(),
+        )
+        if ProductRollup.objects.filter(**key).update(**deltas) or sales_count < 0:
+            # Removals never create rows; a missing row means the stock is being deleted
+            continue
+        try:
+            with transaction.atomic():
+                ProductRollup.objects.create(
+                    user_id=user_id, shop_id=shop_id, revenue=revenue,
+                    items_sold=items_sold, sales_count=sales_count, **key,
+                )
+        except IntegrityError:
+            # Created by a concurrent sale in the meantime
+            ProductRollup.objects.filter(**key).update(**deltas)
+
+
+def record_sale(user_id, shop_id, stock_id, created_at, total_amount, quantity, sign=1):
+    """Apply a sale to its stock's leaderboard rows (sign=-1 removes it)"""
+    _bump(
+        user_id, shop_id, stock_id, timezone.localdate(created_at),
+        revenue=sign * Decimal(str(total_amount)),
+        items_sold=sign * int(quantity),
+        sales_count=sign,
+    )
+
+
+def record_sales(sales):
+    """Apply many new sales at once, e.g. after bulk_create"""
+    deltas = {}
+    for sale in sales:
+        key = (sale.user_id, sale.shop_id, sale.stock_id, timezone.localdate(sale.created_at))
+        delta = deltas.setdefault(key, {'revenue': Decimal('0'), 'items_sold': 0, 'sales_count': 0})
+        delta['revenue'] += Decimal(str(sale.total_amount))
+        delta['items_sold'] += int(sale.quantity)
+        delta['sales_count'] += 1
+    for key, delta in deltas.items():
+        _bump(*key, **delta)
+
+
+def rebuild(user=None, shop=None):
+    """Recompute leaderboard rows from the sales table; returns the row count"""
+    sales = Sale.objects.all()
+    existing = ProductRollup.objects.all()
+    if user is not None:
+        sales, existing = sales.filter(user=user), existing.filter(user=user)
+    if shop is not None:
+        sales, existing = sales.filter(shop=shop), existing.filter(shop=shop)
+
+    rows = {}
+    daily = sales.annotate(day=TruncDate('created_at')).values('user_id', 'shop_id', 'stock_id', 'day').annotate(
+        revenue=Sum('total_amount'),
+        items_sold=Sum('quantity'),
+        sales_count=Count('id'),
+    ).order_by()
+    for record in daily:
+        for period in PERIODS:
+            key = (record['stock_id'], period, period_start(record['day'], period))
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = ProductRollup(
+                    user_id=record['user_id'], shop_id=record['shop_id'], stock_id=key[0],
+                    period=period, period_start=key[2], revenue=0, items_sold=0, sales_count=0,
+                )
+            row.revenue += record['revenue'] or 0
+            row.items_sold += record['items_sold'] or 0
+            row.sales_count += record['sales_count']
+
+    with transaction.atomic():
+        existing.delete()
+        ProductRollup.objects.bulk_create(rows.values(), batch_size=1000)
+    return len(rows)
+
+
+def _rows(user, period, shop=None):
+    rows = ProductRollup.objects.filter(
+        user=user, period=period, period_start=period_start(timezone.localdate(), period), sales_count__gt=0
+    )
+    if isinstance(shop, (list, tuple, set)):
+        return rows.filter(shop_id__in=shop)
+    if shop is not None:
+        return rows.filter(shop=shop)
+    return rows
+
+
+def _entries(rows):
+    return rows.values(
+        'stock_id', 'shop_id', 'stock__name',
+        total_quantity=F('items_sold'),
+        total_revenue=F('revenue'),
+        sale_count=F('sales_count'),
+    )
+
+
+def top_products(user, limit, period='all', shop=None):
+    """Best-selling stock items by revenue in the current period"""
+    return list(_entries(_rows(user, period, shop)).order_by('-revenue', 'stock_id')[:limit])
+
+
+def top_products_by_shop(user, limit, period='all', shop=None):
+    """top_products() per shop as {shop_id: [...]}, ranked in the database"""
+    rows = _entries(_rows(user, period, shop)).annotate(
+        rank=Window(RowNumber(), partition_by=F('shop_id'), order_by=[F('revenue').desc(), F('stock_id').asc()]),
+    ).filter(rank__lte=limit).order_by('shop_id', 'rank')
+
+    shops = {}
+    for row in rows:
+        row.pop('rank')
+        shops.setdefault(row['shop_id'], []).append(row)
+    return shops
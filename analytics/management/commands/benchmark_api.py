@@ -0,0 +1,301 @@
+import json
+import math
+import re
+import statistics
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from importlib import import_module
+from analytics import cache as analytics_cache, leaderboard, rollups
+from config.seeding import bulk_create_backdated
+from expenses.models import Expense
+from inventory.models import Stock
+from sales.models import Sale
+from shops.models import Shop
+
+# (name, method, path, query params); the write runs last so that, under
+# the rolled-back test client run, reads are not measured against a cache
+# its uncommitted sales could not invalidate
+ENDPOINTS = [
+    ('sales_list', 'GET', '/api/sales/', {}),
+    ('sales_daily_summary', 'GET', '/api/sales/daily_summary/', {}),
+    ('sales_summary', 'GET', '/api/sales/summary/', {}),
+    ('sales_report_data', 'GET', '/api/sales/report_data/', {'type': 'weekly'}),
+    ('expenses_summary', 'GET', '/api/expenses/summary/', {}),
+    ('stock_summary', 'GET', '/api/inventory/summary/', {}),
+    ('analytics_dashboard', 'GET', '/api/analytics/dashboard/', {}),
+    ('analytics_report_data', 'GET', '/api/analytics/analytics/report_data/', {'type': 'weekly'}),
+    ('analytics_timeseries', 'GET', '/api/analytics/timeseries/', {'granularity': 'day'}),
+    ('analytics_top_products', 'GET', '/api/analytics/analytics/top_products/', {'period': 'month'}),
+    ('analytics_inventory_health', 'GET', '/api/analytics/analytics/inventory_health/', {'group_by': 'shop'}),
+    ('report_generate', 'GET', '/api/reports/reports/generate/', {'period': 'weekly', 'format': 'pdf'}),
+    ('sales_create', 'POST', '/api/sales/', None),
+]
+
+# Query count in the Server-Timing header of a server running with REQUEST_METRICS=true
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def percentile(samples, percent):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(samples)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(samples, queries, statuses, elapsed):
+    """Latency percentiles, throughput and queries per request of one endpoint"""
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for code in statuses if code >= 400),
+        'status_codes': {str(code): statuses.count(code) for code in sorted(set(statuses))},
+        'p50_ms': round(percentile(samples, 50), 2),
+        'p95_ms': round(percentile(samples, 95), 2),
+        'p99_ms': round(percentile(samples, 99), 2),
+        'mean_ms': round(statistics.mean(samples), 2),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else None,
+        'queries_per_request': round(statistics.mean(queries), 1) if queries else None,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed users, shops, stock, sales and expenses, then time the main API endpoints and print '
+        'p50/p95/p99 latency, throughput and queries per request as JSON. By default requests go '
+        'through the Django test client inside a transaction that is rolled back; with --url they '
+        'go to a running server (e.g. a local gunicorn) and the seeded users are deleted afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2, help='Users to seed')
+        parser.add_argument('--shops', type=int, default=2, help='Shops per user')
+        parser.add_argument('--stocks', type=int, default=50, help='Stock items per shop')
+        parser.add_argument('--sales', type=int, default=2000, help='Sales per shop')
+        parser.add_argument('--expenses', type=int, default=200, help='Expenses per shop')
+        parser.add_argument('--days', type=int, default=90, help='Days of history to spread sales and expenses over')
+        parser.add_argument('--requests', type=int, default=50, help='Requests per endpoint')
+        parser.add_argument('--endpoints', help=f"Comma-separated subset of: {', '.join(e[0] for e in ENDPOINTS)}")
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Retire cached analytics responses before each request (with --url, needs a shared cache)'
+        )
+        parser.add_argument('--url', help='Base URL of a running server to benchmark instead of the test client')
+        parser.add_argument('--concurrency', type=int, default=1, help='Parallel clients (--url only)')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--compare', help='Earlier JSON report to print p95 changes against')
+
+    def handle(self, *args, **options):
+        endpoints = ENDPOINTS
+        if options['endpoints']:
+            names = options['endpoints'].split(',')
+            unknown = set(names) - {e[0] for e in ENDPOINTS}
+            if unknown:
+                raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+            endpoints = [e for e in ENDPOINTS if e[0] in names]
+        if options['concurrency'] > 1 and not options['url']:
+            raise CommandError('--concurrency needs --url; the test client runs in one transaction')
+
+        if options['url']:
+            users = self._seed(options)
+            try:
+                results = self._run_http(users, endpoints, options)
+            finally:
+                User.objects.filter(pk__in=[user.pk for user in users]).delete()
+        else:
+            with transaction.atomic():
+                users = self._seed(options)
+                results = self._run_client(users, endpoints, options)
+                transaction.set_rollback(True)
+
+        report = {
+            'meta': {
+                'commit': self._commit(),
+                'timestamp': timezone.now().isoformat(),
+                'mode': 'http' if options['url'] else 'test-client',
+                'database': connection.vendor,
+                'cold_cache': options['cold'],
+                'concurrency': options['concurrency'],
+                'seed': {key: options[key] for key in ('users', 'shops', 'stocks', 'sales', 'expenses', 'days')},
+            },
+            'endpoints': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+        else:
+            self.stdout.write(output)
+        if options['compare']:
+            self._compare(options['compare'], results)
+
+    def _seed(self, options):
+        """Users with shops, stock and a history of sales and expenses; rollups are rebuilt to match"""
+        now = timezone.now()
+        stamp = time.time_ns()
+        users = []
+        for u in range(options['users']):
+            user = User.objects.create_user(username=f'bench-{stamp}-{u}')
+            users.append(user)
+            for s in range(options['shops']):
+                shop = Shop.objects.create(user=user, name=f'Branch {s}', is_active=s == 0)
+                stocks = Stock.objects.bulk_create([
+                    Stock(
+                        shop=shop, user=user, name=f'Item {i}', category=f'Category {i % 8}',
+                        price=100 + i, cost_price=60 + i, quantity_in_stock=1000000, min_stock_level=10,
+                    )
+                    for i in range(options['stocks'])
+                ])
+                # Hourly timestamps keep bulk_create_backdated to one UPDATE per hour
+                hours = options['days'] * 24
+                sales = []
+                for i in range(options['sales']):
+                    stock = stocks[i * 7 % len(stocks)]
+                    quantity = 1 + i % 3
+                    sales.append(Sale(
+                        shop=shop, stock=stock, user=user, quantity=quantity,
+                        price_per_unit=stock.price, total_amount=stock.price * quantity, unit_cost=stock.cost_price,
+                        created_at=now - timedelta(hours=i * hours // max(options['sales'], 1)),
+                    ))
+                bulk_create_backdated(Sale, sales)
+                bulk_create_backdated(Expense, [
+                    Expense(
+                        shop=shop, user=user, category=Expense.CATEGORY_CHOICES[i % len(Expense.CATEGORY_CHOICES)][0],
+                        description=f'Expense {i}', amount=Decimal(50 + i % 500),
+                        created_at=now - timedelta(hours=i * hours // max(options['expenses'], 1)),
+                    )
+                    for i in range(options['expenses'])
+                ])
+            rollups.rebuild(user=user)
+            leaderboard.rebuild(user=user)
+        return users
+
+    def _sale_body(self, user):
+        stock = Stock.objects.filter(user=user, shop__is_active=True).values('id', 'price').first()
+        return {'stock': stock['id'], 'quantity': 1, 'price_per_unit': str(stock['price']),
+                'total_amount': str(stock['price'])}
+
+    def _run_client(self, users, endpoints, options):
+        clients = []
+        for user in users:
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(user)
+            clients.append((user, client))
+
+        results = {}
+        for name, method, path, params in endpoints:
+            samples, queries, statuses = [], [], []
+            started = time.perf_counter()
+            for i in range(options['requests']):
+                user, client = clients[i % len(clients)]
+                if options['cold']:
+                    analytics_cache.invalidate(user.pk)
+                body = self._sale_body(user) if method == 'POST' else None
+                with CaptureQueriesContext(connection) as captured:
+                    began = time.perf_counter()
+                    if method == 'POST':
+                        response = client.post(path, body, content_type='application/json')
+                    else:
+                        response = client.get(path, params)
+                    if getattr(response, 'streaming', False):
+                        b''.join(response.streaming_content)
+                    samples.append((time.perf_counter() - began) * 1000)
+                queries.append(len(captured))
+                statuses.append(response.status_code)
+            results[name] = summarize(samples, queries, statuses, time.perf_counter() - started)
+        return results
+
+    def _login(self, user):
+        """A logged-in session for ``user`` in the server's session store"""
+        session = import_module(settings.SESSION_ENGINE).SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return session
+
+    def _run_http(self, users, endpoints, options):
+        base = options['url'].rstrip('/')
+        sessions = []
+        for user in users:
+            session, csrf = self._login(user), get_random_string(32)
+            cookie = f'{settings.SESSION_COOKIE_NAME}={session.session_key}; {settings.CSRF_COOKIE_NAME}={csrf}'
+            sessions.append((user, session, {'Cookie': cookie, 'X-CSRFToken': csrf, 'Referer': base + '/'}))
+        try:
+            return self._drive(base, sessions, endpoints, options)
+        finally:
+            for _, session, _ in sessions:
+                session.delete()
+
+    def _drive(self, base, sessions, endpoints, options):
+        results = {}
+        for name, method, path, params in endpoints:
+            bodies = {}
+            if method == 'POST':
+                bodies = {user.pk: json.dumps(self._sale_body(user)).encode() for user, _, _ in sessions}
+            samples, queries, statuses, lock = [], [], [], threading.Lock()
+
+            def worker(offset):
+                for i in range(offset, options['requests'], options['concurrency']):
+                    user, _, headers = sessions[i % len(sessions)]
+                    if options['cold']:
+                        analytics_cache.invalidate(user.pk)
+                    url = base + path + ('?' + urllib.parse.urlencode(params) if params else '')
+                    request = urllib.request.Request(url, data=bodies.get(user.pk), method=method, headers=dict(
+                        headers, **({'Content-Type': 'application/json'} if method == 'POST' else {})
+                    ))
+                    began = time.perf_counter()
+                    try:
+                        with urllib.request.urlopen(request) as response:
+                            response.read()
+                            code, timing = response.status, response.headers.get('Server-Timing')
+                    except urllib.error.HTTPError as error:
+                        code, timing = error.code, error.headers.get('Server-Timing')
+                    elapsed = (time.perf_counter() - began) * 1000
+                    counted = SERVER_TIMING_QUERIES.search(timing or '')
+                    with lock:
+                        samples.append(elapsed)
+                        statuses.append(code)
+                        if counted:
+                            queries.append(int(counted.group(1)))
+
+            started = time.perf_counter()
+            threads = [threading.Thread(target=worker, args=(n,)) for n in range(options['concurrency'])]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            results[name] = summarize(samples, queries, statuses, time.perf_counter() - started)
+        return results
+
+    def _commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _compare(self, path, results):
+        with open(path) as handle:
+            previous = json.load(handle)
+        self.stderr.write(f"p95 against {previous['meta'].get('commit') or path}:")
+        for name, figures in results.items():
+            before = previous['endpoints'].get(name)
+            if not before:
+                continue
+            change = (figures['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+            self.stderr.write(f"  {name:<28}{before['p95_ms']:>9.1f} -> {figures['p95_ms']:>7.1f} ms ({change:+.0f}%)")
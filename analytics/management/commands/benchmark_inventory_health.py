@@ -0,0 +1,109 @@
+import statistics
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+from analytics import cache as analytics_cache
+from analytics.views import AnalyticsViewSet
+from inventory.models import Stock
+from inventory.services import CRITICAL_STOCK, LOW_STOCK
+from shops.models import Shop
+
+VARIANTS = [
+    ('total', {}),
+    ('by shop', {'group_by': 'shop'}),
+    ('by category', {'breakdown': 'category'}),
+    ('by shop+category', {'group_by': 'shop', 'breakdown': 'category'}),
+]
+
+
+def three_counts(stocks):
+    """The previous implementation: one COUNT per figure"""
+    total = stocks.count()
+    low = stocks.filter(quantity_in_stock__lt=F('min_stock_level')).count()
+    critical = stocks.filter(quantity_in_stock=0).count()
+    return total, low, critical
+
+
+def single_pass_counts(stocks):
+    """The same three figures from one conditional aggregate, for a like-for-like comparison"""
+    return stocks.aggregate(
+        total=Count('id'),
+        low=Count('id', filter=LOW_STOCK & ~CRITICAL_STOCK),
+        critical=Count('id', filter=CRITICAL_STOCK),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the inventory health endpoint against a generated stock fixture '
+        '(100k SKUs by default). Runs in a transaction that is rolled back, so no data is kept.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skus', type=int, default=100000, help='Stock items to generate')
+        parser.add_argument('--shops', type=int, default=10, help='Shops to spread the items over')
+        parser.add_argument('--categories', type=int, default=25, help='Categories to spread the items over')
+        parser.add_argument('--repeat', type=int, default=5, help='Requests per variant (median is shown)')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._run(options['skus'], options['shops'], options['categories'], options['repeat'])
+            transaction.set_rollback(True)
+
+    def _run(self, skus, shop_count, categories, repeat):
+        user = User.objects.create_user(username=f'bench-{time.time_ns()}')
+        shops = Shop.objects.bulk_create([Shop(user=user, name=f'Branch {i}') for i in range(shop_count)])
+        self._insert(user, shops, skus, categories)
+        stocks = Stock.objects.filter(user=user)
+
+        self.stdout.write(f'{skus} SKUs in {shop_count} shops and {categories} categories\n')
+        self.stdout.write(f"{'variant':<28}{'median':>10}{'queries':>9}")
+        baselines = [
+            ('three COUNTs (before)', lambda: three_counts(stocks)),
+            ('three COUNTs per shop', lambda: [three_counts(stocks.filter(shop=shop)) for shop in shops]),
+            ('one pass, counts only', lambda: single_pass_counts(stocks)),
+        ]
+        for label, call in baselines:
+            samples = [self._time(call) for _ in range(repeat)]
+            self._report(label, samples)
+
+        factory = APIRequestFactory()
+        view = AnalyticsViewSet.as_view({'get': 'inventory_health'})
+        for label, params in VARIANTS:
+            samples = []
+            for _ in range(repeat):
+                # Measure the query, not the response cache
+                analytics_cache.invalidate(user.pk)
+                request = factory.get('/api/analytics/analytics/inventory_health/', params)
+                force_authenticate(request, user=user)
+                samples.append(self._time(lambda: view(request).render()))
+            self._report(f'endpoint, {label}', samples)
+
+    def _report(self, label, samples):
+        self.stdout.write(f'{label:<28}{statistics.median(ms for ms, _ in samples):>7.1f} ms{samples[0][1]:>9}')
+
+    def _time(self, call):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            call()
+            elapsed = (time.perf_counter() - started) * 1000
+        return elapsed, len(queries)
+
+    def _insert(self, user, shops, skus, categories):
+        batch = []
+        for i in range(skus):
+            minimum = 5 + i % 20
+            batch.append(Stock(
+                shop=shops[i % len(shops)], user=user, name=f'SKU {i}', category=f'Category {i % categories}',
+                price=100 + i % 900, cost_price=60 + i % 500, min_stock_level=minimum,
+                # Mostly healthy, with some empty, low and overstocked items
+                quantity_in_stock=(0, minimum - 1, minimum * 6)[i % 10] if i % 10 < 3 else minimum + i % 50,
+            ))
+            if len(batch) == 10000:
+                Stock.objects.bulk_create(batch)
+                batch = []
+        Stock.objects.bulk_create(batch)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from shops.models import Shop
+from analytics import leaderboard
+from analytics.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily sales/expense rollups and the product leaderboard from raw sales and expenses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild rows for this username')
+        parser.add_argument('--shop', type=int, help='Only rebuild rows for this shop id')
+
+    def handle(self, *args, **options):
+        user = shop = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+        if options['shop']:
+            try:
+                shop = Shop.objects.get(pk=options['shop'])
+            except Shop.DoesNotExist:
+                raise CommandError(f"Shop {options['shop']} does not exist")
+
+        count = rebuild(user=user, shop=shop)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} daily rollup rows'))
+        count = leaderboard.rebuild(user=user, shop=shop)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} product leaderboard rows'))
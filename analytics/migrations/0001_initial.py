@@ -0,0 +1,70 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    """Populate DailyRollup from existing sales and expenses"""
+    Sale = apps.get_model('sales', 'Sale')
+    Expense = apps.get_model('expenses', 'Expense')
+    DailyRollup = apps.get_model('analytics', 'DailyRollup')
+
+    rows = {}
+    daily_sales = Sale.objects.annotate(date=TruncDate('created_at')).values('user_id', 'shop_id', 'date').annotate(
+        income=Sum('total_amount'), sales_count=Count('id'), items_sold=Sum('quantity')
+    ).order_by()
+    for record in daily_sales:
+        rows[(record['user_id'], record['shop_id'], record['date'])] = DailyRollup(
+            user_id=record['user_id'], shop_id=record['shop_id'], date=record['date'],
+            income=record['income'] or 0, sales_count=record['sales_count'], items_sold=record['items_sold'] or 0,
+        )
+
+    daily_expenses = Expense.objects.annotate(date=TruncDate('created_at')).values('user_id', 'shop_id', 'date').annotate(
+        total=Sum('amount')
+    ).order_by()
+    for record in daily_expenses:
+        key = (record['user_id'], record['shop_id'], record['date'])
+        if key not in rows:
+            rows[key] = DailyRollup(user_id=key[0], shop_id=key[1], date=key[2])
+        rows[key].expenses = record['total'] or 0
+
+    DailyRollup.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('expenses', '0001_initial'),
+        ('sales', '0001_initial'),
+        ('shops', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('income', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('expenses', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('sales_count', models.IntegerField(default=0)),
+                ('items_sold', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='shops.shop')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['date'],
+                'indexes': [models.Index(fields=['user', 'date'], name='analytics_d_user_id_0c9473_idx'), models.Index(fields=['shop', 'date'], name='analytics_d_shop_id_bb4b4c_idx')],
+                'unique_together': {('user', 'shop', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
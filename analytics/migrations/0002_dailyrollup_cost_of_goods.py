@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyrollup',
+            name='cost_of_goods',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=15),
+        ),
+    ]
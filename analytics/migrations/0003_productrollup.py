@@ -0,0 +1,75 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:08
+
+from datetime import date, timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_product_rollups(apps, schema_editor):
+    """Populate ProductRollup from existing sales"""
+    Sale = apps.get_model('sales', 'Sale')
+    ProductRollup = apps.get_model('analytics', 'ProductRollup')
+
+    def starts(day):
+        return {
+            'day': day,
+            'week': day - timedelta(days=day.weekday()),
+            'month': day.replace(day=1),
+            'all': date.min,
+        }
+
+    rows = {}
+    daily = Sale.objects.annotate(day=TruncDate('created_at')).values('user_id', 'shop_id', 'stock_id', 'day').annotate(
+        revenue=Sum('total_amount'), items_sold=Sum('quantity'), sales_count=Count('id')
+    ).order_by()
+    for record in daily:
+        for period, start in starts(record['day']).items():
+            key = (record['stock_id'], period, start)
+            if key not in rows:
+                rows[key] = ProductRollup(
+                    user_id=record['user_id'], shop_id=record['shop_id'], stock_id=key[0],
+                    period=period, period_start=start, revenue=0, items_sold=0, sales_count=0,
+                )
+            rows[key].revenue += record['revenue'] or 0
+            rows[key].items_sold += record['items_sold'] or 0
+            rows[key].sales_count += record['sales_count']
+
+    ProductRollup.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_dailyrollup_cost_of_goods'),
+        ('inventory', '0003_stock_cost_price'),
+        ('sales', '0003_sale_unit_cost'),
+        ('shops', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month'), ('all', 'All time')], max_length=5)),
+                ('period_start', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('items_sold', models.IntegerField(default=0)),
+                ('sales_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_rollups', to='shops.shop')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_rollups', to='inventory.stock')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='product_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'period', 'period_start', '-revenue'], name='analytics_p_user_id_73e083_idx'), models.Index(fields=['shop', 'period', 'period_start', '-revenue'], name='analytics_p_shop_id_0be644_idx')],
+                'unique_together': {('stock', 'period', 'period_start')},
+            },
+        ),
+        migrations.RunPython(backfill_product_rollups, migrations.RunPython.noop),
+    ]
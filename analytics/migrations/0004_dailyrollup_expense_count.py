@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:48
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_expense_counts(apps, schema_editor):
+    """Count existing expenses into their days' rollup rows"""
+    Expense = apps.get_model('expenses', 'Expense')
+    DailyRollup = apps.get_model('analytics', 'DailyRollup')
+
+    daily = Expense.objects.annotate(day=TruncDate('created_at')).values('user_id', 'shop_id', 'day').annotate(
+        count=Count('id')
+    ).order_by()
+    for record in daily:
+        DailyRollup.objects.filter(
+            user_id=record['user_id'], shop_id=record['shop_id'], date=record['day']
+        ).update(expense_count=record['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_productrollup'),
+        ('expenses', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyrollup',
+            name='expense_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_expense_counts, migrations.RunPython.noop),
+    ]
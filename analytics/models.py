@@ -1,4 +1,63 @@
 from django.db import models
+from django.contrib.auth.models import User
+from inventory.models import Stock
+from shops.models import Shop
 
-# Analytics app - no models needed, only views for reporting
-# All data comes from other apps (sales, expenses, inventory, shops)
+# Analytics reads from other apps (sales, expenses, inventory, shops).
+# The models here are derived tables kept in sync with that source data.
+
+
+class DailyRollup(models.Model):
+    """Per-day sales and expense totals for one shop"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_rollups')
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='daily_rollups')
+    date = models.DateField()
+    income = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    expenses = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    expense_count = models.IntegerField(default=0)
+    cost_of_goods = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    sales_count = models.IntegerField(default=0)
+    items_sold = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'shop', 'date')
+        ordering = ['date']
+        indexes = [
+            models.Index(fields=['user', 'date']),
+            models.Index(fields=['shop', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.shop.name} - {self.date}"
+
+
+class ProductRollup(models.Model):
+    """Sales of one stock item over a day, a week, a month or all time"""
+    PERIOD_CHOICES = [
+        ('day', 'Day'),
+        ('week', 'Week'),
+        ('month', 'Month'),
+        ('all', 'All time'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='product_rollups')
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='product_rollups')
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='product_rollups')
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    # First local day of the period (Monday for weeks); date.min for all time
+    period_start = models.DateField()
+    revenue = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    items_sold = models.IntegerField(default=0)
+    sales_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('stock', 'period', 'period_start')
+        indexes = [
+            models.Index(fields=['user', 'period', 'period_start', '-revenue']),
+            models.Index(fields=['shop', 'period', 'period_start', '-revenue']),
+        ]
+
+    def __str__(self):
+        return f"{self.stock.name} - {self.period} {self.period_start}"
@@ -0,0 +1,282 @@
+"""
+Daily sales/expense rollups.
+
+DailyRollup holds one row per (user, shop, local day) with income,
+cost of goods sold, expenses, sale count, items sold and expense count. Rows are adjusted
+incrementally whenever a Sale or Expense is written (see signals.py) and
+can be rebuilt from scratch with ``manage.py rebuild_rollups``. Sales
+also feed the per-product leaderboard (see leaderboard.py).
+
+Summary endpoints read closed days from the rollup table and aggregate the
+raw rows only for the current, still-changing day.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Sum, Count, F, DecimalField
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from config.dates import on_day
+from sales.models import Sale
+from expenses.models import Expense
+from .models import DailyRollup
+from . import leaderboard
+
+
+ZERO = Decimal('0')
+
+# unit_cost * quantity; NULL (and so skipped by Sum) for sales without a known cost
+SALE_COST = F('unit_cost') * F('quantity')
+
+LIVE_SALE_TOTALS = {
+    'income': Sum('total_amount'),
+    'cost_of_goods': Sum(SALE_COST, output_field=DecimalField(max_digits=15, decimal_places=2)),
+    'sales_count': Count('id'),
+    'items_sold': Sum('quantity'),
+}
+
+ROLLUP_TOTALS = {
+    'income': Sum('income'),
+    'cost_of_goods': Sum('cost_of_goods'),
+    'expenses': Sum('expenses'),
+    'sales_count': Sum('sales_count'),
+    'items_sold': Sum('items_sold'),
+    'expense_count': Sum('expense_count'),
+}
+
+LIVE_EXPENSE_TOTALS = {
+    'expenses': Sum('amount'),
+    'expense_count': Count('id'),
+}
+
+
+def empty_totals():
+    """Totals for a period with no activity"""
+    return {
+        'income': ZERO, 'cost_of_goods': ZERO, 'expenses': ZERO, 'sales_count': 0, 'items_sold': 0,
+        'expense_count': 0,
+    }
+
+
+def _clean(totals):
+    """Replace NULL aggregates with zeros"""
+    return {
+        'income': totals.get('income') or ZERO,
+        'cost_of_goods': totals.get('cost_of_goods') or ZERO,
+        'expenses': totals.get('expenses') or ZERO,
+        'sales_count': totals.get('sales_count') or 0,
+        'items_sold': totals.get('items_sold') or 0,
+        'expense_count': totals.get('expense_count') or 0,
+    }
+
+
+def _bump(user_id, shop_id, day, income=ZERO, cost_of_goods=ZERO, expenses=ZERO, sales_count=0, items_sold=0,
+          expense_count=0):
+    """Add deltas to the rollup row for (user, shop, day)"""
+    with transaction.atomic():
+        row, _ = DailyRollup.objects.get_or_create(user_id=user_id, shop_id=shop_id, date=day)
+        DailyRollup.objects.filter(pk=row.pk).update(
+            income=F('income') + income,
+            cost_of_goods=F('cost_of_goods') + cost_of_goods,
+            expenses=F('expenses') + expenses,
+            sales_count=F('sales_count') + sales_count,
+            items_sold=F('items_sold') + items_sold,
+            expense_count=F('expense_count') + expense_count,
+            updated_at=timezone.now(),
+        )
+
+
+def _sale_cost(unit_cost, quantity):
+    return Decimal(str(unit_cost)) * int(quantity) if unit_cost is not None else ZERO
+
+
+def record_sale(user_id, shop_id, created_at, total_amount, quantity, unit_cost=None, stock_id=None, sign=1):
+    """Apply a sale to its day's rollup and, given its stock, the product leaderboard (sign=-1 removes it)"""
+    with transaction.atomic():
+        _bump(
+            user_id, shop_id, timezone.localdate(created_at),
+            income=sign * Decimal(str(total_amount)),
+            cost_of_goods=sign * _sale_cost(unit_cost, quantity),
+            sales_count=sign,
+            items_sold=sign * int(quantity),
+        )
+        if stock_id is not None:
+            leaderboard.record_sale(user_id, shop_id, stock_id, created_at, total_amount, quantity, sign=sign)
+
+
+def record_sales(sales):
+    """Apply many new sales at once, e.g. after bulk_create (which sends no signals)"""
+    deltas = {}
+    for sale in sales:
+        key = (sale.user_id, sale.shop_id, timezone.localdate(sale.created_at))
+        delta = deltas.setdefault(key, empty_totals())
+        delta['income'] += Decimal(str(sale.total_amount))
+        delta['cost_of_goods'] += _sale_cost(sale.unit_cost, sale.quantity)
+        delta['sales_count'] += 1
+        delta['items_sold'] += int(sale.quantity)
+    for (user_id, shop_id, day), delta in deltas.items():
+        _bump(user_id, shop_id, day, **delta)
+    leaderboard.record_sales(sales)
+
+
+def record_expense(user_id, shop_id, created_at, amount, sign=1):
+    """Apply an expense to its day's rollup (sign=-1 removes it)"""
+    _bump(
+        user_id, shop_id, timezone.localdate(created_at),
+        expenses=sign * Decimal(str(amount)),
+        expense_count=sign,
+    )
+
+
+def _for_shop(queryset, shop):
+    """Limit rows to a Shop, a shop id or a list of shop ids; None keeps every shop"""
+    if isinstance(shop, (list, tuple, set)):
+        return queryset.filter(shop_id__in=shop)
+    if shop is not None:
+        return queryset.filter(shop=shop)
+    return queryset
+
+
+def _rollup_rows(user, shop=None):
+    return _for_shop(DailyRollup.objects.filter(user=user), shop)
+
+
+def _closed_rows(user, start_date, end_date, today, shop=None):
+    rows = _rollup_rows(user, shop).filter(date__lte=min(end_date, today - timedelta(days=1)))
+    if start_date is not None:
+        rows = rows.filter(date__gte=start_date)
+    return rows
+
+
+def _live_querysets(user, day, shop=None):
+    return (
+        _for_shop(on_day(Sale.objects.filter(user=user), day), shop),
+        _for_shop(on_day(Expense.objects.filter(user=user), day), shop),
+    )
+
+
+def _live_day(user, day, shop=None):
+    """Aggregate one day straight from the Sale and Expense tables"""
+    sales, expenses = _live_querysets(user, day, shop)
+    totals = sales.aggregate(**LIVE_SALE_TOTALS)
+    totals.update(expenses.aggregate(**LIVE_EXPENSE_TOTALS))
+    return _clean(totals)
+
+
+def period_totals(user, start_date=None, end_date=None, shop=None):
+    """
+    Income, cost of goods, expenses, sale count, items sold and expense count for a date range.
+
+    ``start_date=None`` means "since the beginning"; ``end_date`` defaults
+    to today. ``shop`` may be a Shop, a shop id or a list of shop ids; None
+    covers all shops.
+    """
+    today = timezone.localdate()
+    if end_date is None:
+        end_date = today
+
+    totals = _clean(_closed_rows(user, start_date, end_date, today, shop).aggregate(**ROLLUP_TOTALS))
+
+    if (start_date is None or start_date <= today) and today <= end_date:
+        live = _live_day(user, today, shop)
+        for key in totals:
+            totals[key] += live[key]
+    return totals
+
+
+def period_totals_by_shop(user, start_date=None, end_date=None, shop=None):
+    """
+    period_totals() for each shop, as {shop_id: totals}.
+
+    One grouped query over the rollup table plus, when the range includes
+    today, one grouped query each over today's sales and expenses. Shops
+    without activity are left out.
+    """
+    today = timezone.localdate()
+    if end_date is None:
+        end_date = today
+
+    closed = _closed_rows(user, start_date, end_date, today, shop)
+    shops = {
+        row['shop_id']: _clean(row)
+        for row in closed.values('shop_id').annotate(**ROLLUP_TOTALS).order_by()
+    }
+
+    if (start_date is None or start_date <= today) and today <= end_date:
+        sales, expenses = _live_querysets(user, today, shop)
+        live = {row['shop_id']: row for row in sales.values('shop_id').annotate(**LIVE_SALE_TOTALS).order_by()}
+        for row in expenses.values('shop_id').annotate(**LIVE_EXPENSE_TOTALS).order_by():
+            live.setdefault(row.pop('shop_id'), {}).update(row)
+        for shop_id, row in live.items():
+            totals = shops.setdefault(shop_id, empty_totals())
+            for key, value in _clean(row).items():
+                totals[key] += value
+    return shops
+
+
+def daily_totals(user, start_date, end_date, shop=None):
+    """
+    Per-day totals for a date range, oldest first.
+
+    Days with neither sales nor expenses are left out.
+    """
+    today = timezone.localdate()
+    days = {}
+
+    rows = _closed_rows(user, start_date, end_date, today, shop)
+    for row in rows.values('date').annotate(**ROLLUP_TOTALS).order_by('date'):
+        days[row['date']] = _clean(row)
+
+    if start_date <= today <= end_date:
+        days[today] = _live_day(user, today, shop)
+
+    return [
+        dict(date=day, **totals)
+        for day, totals in sorted(days.items())
+        if totals['sales_count'] or totals['expenses']
+    ]
+
+
+def rebuild(user=None, shop=None):
+    """Recompute rollup rows from the raw tables; returns the row count"""
+    sales = Sale.objects.all()
+    expenses = Expense.objects.all()
+    existing = DailyRollup.objects.all()
+    if user is not None:
+        sales, expenses, existing = sales.filter(user=user), expenses.filter(user=user), existing.filter(user=user)
+    if shop is not None:
+        sales, expenses, existing = sales.filter(shop=shop), expenses.filter(shop=shop), existing.filter(shop=shop)
+
+    rows = {}
+
+    def row_for(record):
+        key = (record['user_id'], record['shop_id'], record['date'])
+        if key not in rows:
+            rows[key] = DailyRollup(user_id=key[0], shop_id=key[1], date=key[2], **empty_totals())
+        return rows[key]
+
+    daily_sales = sales.annotate(date=TruncDate('created_at')).values('user_id', 'shop_id', 'date').annotate(
+        income=Sum('total_amount'),
+        cost_of_goods=Sum(SALE_COST, output_field=DecimalField(max_digits=15, decimal_places=2)),
+        sales_count=Count('id'),
+        items_sold=Sum('quantity'),
+    ).order_by()
+    for record in daily_sales:
+        row = row_for(record)
+        row.income = record['income'] or ZERO
+        row.cost_of_goods = record['cost_of_goods'] or ZERO
+        row.sales_count = record['sales_count']
+        row.items_sold = record['items_sold'] or 0
+
+    daily_expenses = expenses.annotate(date=TruncDate('created_at')).values('user_id', 'shop_id', 'date').annotate(
+        total=Sum('amount'), count=Count('id')
+    ).order_by()
+    for record in daily_expenses:
+        row = row_for(record)
+        row.expenses = record['total'] or ZERO
+        row.expense_count = record['count']
+
+    with transaction.atomic():
+        existing.delete()
+        DailyRollup.objects.bulk_create(rows.values(), batch_size=1000)
+    return len(rows)
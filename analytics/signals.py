@@ -0,0 +1,92 @@
+"""
+Keep DailyRollup and the ProductRollup leaderboard in step with Sale and
+Expense writes.
+
+pre_save remembers the row as it is in the database so that an update can
+be applied as "remove old values, add new values" (which also handles a
+record moving to another shop or day).
+
+Writes to any model the analytics endpoints read also retire the user's
+cached analytics responses.
+"""
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from shops.models import Shop
+from inventory.models import Stock
+from sales.models import Sale
+from expenses.models import Expense
+from . import cache, rollups
+
+SALE_FIELDS = ('user_id', 'shop_id', 'stock_id', 'created_at', 'total_amount', 'quantity', 'unit_cost')
+EXPENSE_FIELDS = ('user_id', 'shop_id', 'created_at', 'amount')
+
+
+def _current(instance, fields):
+    return {field: getattr(instance, field) for field in fields}
+
+
+def _owner_deleted(origin):
+    """Deleting a shop or user cascades to its rollups, so there is nothing to adjust"""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, (Shop, User))
+
+
+def _stored(model, instance, fields):
+    if instance.pk is None:
+        return None
+    return model.objects.filter(pk=instance.pk).values(*fields).first()
+
+
+@receiver(pre_save, sender=Sale)
+def remember_sale(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous = None if raw else _stored(Sale, instance, SALE_FIELDS)
+
+
+@receiver(post_save, sender=Sale)
+def rollup_sale(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        rollups.record_sale(sign=-1, **previous)
+    rollups.record_sale(**_current(instance, SALE_FIELDS))
+
+
+@receiver(post_delete, sender=Sale)
+def unroll_sale(sender, instance, origin=None, **kwargs):
+    if _owner_deleted(origin):
+        return
+    rollups.record_sale(sign=-1, **_current(instance, SALE_FIELDS))
+
+
+@receiver(pre_save, sender=Expense)
+def remember_expense(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous = None if raw else _stored(Expense, instance, EXPENSE_FIELDS)
+
+
+@receiver(post_save, sender=Expense)
+def rollup_expense(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous:
+        rollups.record_expense(sign=-1, **previous)
+    rollups.record_expense(**_current(instance, EXPENSE_FIELDS))
+
+
+@receiver(post_delete, sender=Expense)
+def unroll_expense(sender, instance, origin=None, **kwargs):
+    if _owner_deleted(origin):
+        return
+    rollups.record_expense(sign=-1, **_current(instance, EXPENSE_FIELDS))
+
+
+def refresh_cache(sender, instance, **kwargs):
+    cache.invalidate_on_commit(instance.user_id)
+
+
+for model in (Sale, Expense, Stock, Shop):
+    post_save.connect(refresh_cache, sender=model, dispatch_uid=f'analytics_cache_save_{model.__name__}')
+    post_delete.connect(refresh_cache, sender=model, dispatch_uid=f'analytics_cache_delete_{model.__name__}')
@@ -0,0 +1,149 @@
+"""
+Bucketed time series for charts.
+
+Buckets are computed in SQL. Day, week and month series group the
+DailyRollup table with TruncDay/TruncWeek/TruncMonth on its ``date``
+column, plus today's live rows. Hourly series group the raw Sale and
+Expense rows with TruncHour in the local time zone. Empty buckets are
+filled with zeros on the server, so a chart gets one value per bucket.
+
+The result is columnar, one list of bucket labels and one list of values
+per metric, instead of a list of objects that repeats every key:
+``{'buckets': [...], 'series': {'income': [...], ...}}``.
+"""
+from datetime import timedelta
+from django.db.models import Sum
+from django.db.models.functions import TruncDay, TruncHour, TruncMonth, TruncWeek
+from django.utils import timezone
+from config.dates import day_start, in_days
+from expenses.models import Expense
+from sales.models import Sale
+from . import rollups
+
+METRICS = ('income', 'expenses', 'cost_of_goods', 'net_profit', 'sales_count', 'items_sold')
+DEFAULT_METRICS = ('income', 'expenses', 'sales_count')
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+MAX_BUCKETS = 3000
+
+_TRUNC = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+_SALE_METRICS = {'income', 'cost_of_goods', 'sales_count', 'items_sold'}
+
+
+def bucket_of(day, granularity):
+    """Date of the day/week/month bucket that contains ``day`` (weeks start on Monday)"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def default_range(granularity, end_date=None):
+    """Today for hourly series, otherwise the last 30 days / 12 weeks / 12 months"""
+    end_date = end_date or timezone.localdate()
+    if granularity == 'hour':
+        return end_date, end_date
+    if granularity == 'day':
+        return end_date - timedelta(days=29), end_date
+    if granularity == 'week':
+        return bucket_of(end_date, 'week') - timedelta(weeks=11), end_date
+    month = bucket_of(end_date, 'month')
+    year, month_index = divmod(month.year * 12 + month.month - 1 - 11, 12)
+    return month.replace(year=year, month=month_index + 1), end_date
+
+
+def buckets(start_date, end_date, granularity):
+    """Every bucket key from start_date to end_date inclusive, oldest first"""
+    if granularity == 'hour':
+        moment, end = day_start(start_date), day_start(end_date + timedelta(days=1))
+        keys = []
+        while moment < end:
+            keys.append(timezone.localtime(moment))
+            moment += timedelta(hours=1)
+        return keys
+
+    keys = []
+    key = bucket_of(start_date, granularity)
+    while key <= end_date:
+        keys.append(key)
+        if granularity == 'month':
+            key = (key + timedelta(days=32)).replace(day=1)
+        else:
+            key += timedelta(days=7 if granularity == 'week' else 1)
+    return keys
+
+
+def bucket_count(start_date, end_date, granularity):
+    """Number of buckets in a range, without building them"""
+    days = (end_date - start_date).days + 1
+    if granularity == 'hour':
+        return days * 24
+    if granularity == 'week':
+        return (bucket_of(end_date, 'week') - bucket_of(start_date, 'week')).days // 7 + 1
+    if granularity == 'month':
+        return (end_date.year - start_date.year) * 12 + end_date.month - start_date.month + 1
+    return days
+
+
+def _hourly(user, start_date, end_date, shop, metrics):
+    """{local hour: totals} grouped from the raw Sale and Expense rows"""
+    hours = {}
+    if metrics & _SALE_METRICS:
+        sales = rollups._for_shop(in_days(Sale.objects.filter(user=user), start_date, end_date), shop)
+        rows = sales.annotate(bucket=TruncHour('created_at')).values('bucket').annotate(
+            **rollups.LIVE_SALE_TOTALS
+        ).order_by()
+        for row in rows:
+            hours[row.pop('bucket')] = row
+    if 'expenses' in metrics:
+        expenses = rollups._for_shop(in_days(Expense.objects.filter(user=user), start_date, end_date), shop)
+        rows = expenses.annotate(bucket=TruncHour('created_at')).values('bucket').annotate(
+            expenses=Sum('amount')
+        ).order_by()
+        for row in rows:
+            hours.setdefault(row['bucket'], {})['expenses'] = row['expenses']
+    return {hour: rollups._clean(row) for hour, row in hours.items()}
+
+
+def _periodic(user, start_date, end_date, shop, granularity):
+    """{bucket date: totals} from closed rollup days plus today's live rows"""
+    today = timezone.localdate()
+    rows = rollups._closed_rows(user, start_date, end_date, today, shop)
+    periods = {
+        row['bucket']: rollups._clean(row)
+        for row in rows.annotate(bucket=_TRUNC[granularity]('date')).values('bucket').annotate(
+            **rollups.ROLLUP_TOTALS
+        ).order_by()
+    }
+    if start_date <= today <= end_date:
+        totals = periods.setdefault(bucket_of(today, granularity), rollups.empty_totals())
+        for key, value in rollups._live_day(user, today, shop).items():
+            totals[key] += value
+    return periods
+
+
+def series(user, metrics, granularity, start_date, end_date, shop=None):
+    """
+    Gap-filled series for ``metrics`` between two local dates.
+
+    ``shop`` may be a Shop, a shop id or a list of shop ids; None covers
+    all shops. Returns (bucket keys, {metric: [value per bucket]}).
+    """
+    needed = set(metrics)
+    if 'net_profit' in needed:
+        needed |= {'income', 'cost_of_goods', 'expenses'}
+    if granularity == 'hour':
+        totals = _hourly(user, start_date, end_date, shop, needed)
+    else:
+        totals = _periodic(user, start_date, end_date, shop, granularity)
+
+    keys = buckets(start_date, end_date, granularity)
+    empty = rollups.empty_totals()
+    rows = [totals.get(key, empty) for key in keys]
+    values = {}
+    for metric in metrics:
+        if metric == 'net_profit':
+            values[metric] = [row['income'] - row['cost_of_goods'] - row['expenses'] for row in rows]
+        else:
+            values[metric] = [row[metric] for row in rows]
+    return keys, values
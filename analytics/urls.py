@@ -6,5 +6,7 @@ router = DefaultRouter()
 router.register(r'analytics', AnalyticsViewSet, basename='analytics')
 
 urlpatterns = [
+    path('dashboard/', AnalyticsViewSet.as_view({'get': 'dashboard'}), name='analytics-dashboard'),
+    path('timeseries/', AnalyticsViewSet.as_view({'get': 'timeseries'}), name='analytics-timeseries'),
     path('', include(router.urls)),
 ]
@@ -1,121 +1,323 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Sum, Count, F, DecimalField
+from django.db.models import Sum, Count
 from inventory.models import Stock
-from sales.models import Sale
 from expenses.models import Expense
 from shops.models import Shop
 from .serializers import ReportDataSerializer
+from shops.active import get_active_shop_id
+from config.dates import parse_dates
+from . import breakdowns, leaderboard, rollups
+from . import dashboard as snapshots
+from . import timeseries as series
+from . import cache as analytics_cache
+from .cache import cached
 
 
 class AnalyticsViewSet(viewsets.ViewSet):
-    """Analytics and reporting"""
+    """
+    Analytics and reporting.
+    
+    The figure endpoints cover every shop by default. ?shops=1,2,3 (or the
+    single ?shop=<id>) limits them to some shops, and ?group_by=shop returns
+    each shop's figures next to the combined total, e.g.
+    {'group_by': 'shop', 'shops': [{'shop_id': 1, 'shop_name': ..., ...}], 'total': {...}}.
+    Breakdowns are computed with grouped queries, not one query per shop.
+    """
     permission_classes = [IsAuthenticated]
+    DEFAULT_TOP_PRODUCTS = 5
+    MAX_TOP_PRODUCTS = 100
+    
+    def _shop_scope(self, request):
+        """
+        Resolve ?shops= / ?shop= and ?group_by= to (shop_ids, names, error).
+        
+        shop_ids is None when every shop is included. names maps the
+        selected shop ids to shop names for group_by=shop, otherwise None.
+        """
+        group_by = request.query_params.get('group_by')
+        if group_by not in (None, '', 'shop'):
+            return None, None, Response(
+                {'error': "group_by must be 'shop'"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        raw = request.query_params.get('shops') or request.query_params.get('shop') or 'all'
+        shop_ids = None
+        if raw != 'all':
+            try:
+                shop_ids = sorted({int(value) for value in raw.split(',') if value.strip()})
+            except ValueError:
+                return None, None, Response({'error': 'Invalid shop id'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if shop_ids is None and group_by != 'shop':
+            return None, None, None
+        
+        shops = Shop.objects.filter(user=request.user)
+        if shop_ids is not None:
+            shops = shops.filter(id__in=shop_ids)
+        names = dict(shops.order_by('name', 'id').values_list('id', 'name'))
+        if shop_ids is not None and len(names) != len(shop_ids):
+            return None, None, Response({'error': 'Shop not found'}, status=status.HTTP_404_NOT_FOUND)
+        return shop_ids, names if group_by == 'shop' else None, None
+    
+    def _grouped(self, names, figures, total, **extra):
+        """Per-shop breakdown response; figures(shop_id) gives one shop's entry"""
+        return Response({
+            **extra,
+            'group_by': 'shop',
+            'shops': [
+                dict(shop_id=shop_id, shop_name=name, **figures(shop_id))
+                for shop_id, name in names.items()
+            ],
+            'total': total,
+        })
+    
+    @staticmethod
+    def _margin(totals):
+        income, expenses = totals['income'], totals['expenses']
+        margin = ((income - expenses) / income) * 100 if income else 0
+        return {
+            'total_income': income,
+            'total_expenses': expenses,
+            'profit_margin_percent': round(margin, 2),
+        }
+    
+    @staticmethod
+    def _report_summary(totals, total_stocks):
+        return {
+            'total_income': totals['income'],
+            'total_expenses': totals['expenses'],
+            'net_profit': totals['income'] - totals['expenses'],
+            'total_sales': totals['sales_count'],
+            'total_items_sold': totals['items_sold'],
+            'total_stocks': total_stocks,
+        }
+    
+    @staticmethod
+    def _sum_totals(per_shop):
+        totals = rollups.empty_totals()
+        for shop_totals in per_shop:
+            for key in totals:
+                totals[key] += shop_totals[key]
+        return totals
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        """Hit and miss counters of the analytics response cache, per endpoint"""
+        return Response(analytics_cache.stats())
     
     @action(detail=False, methods=['get'])
+    @cached
+    def dashboard(self, request):
+        """
+        Dashboard snapshot in one request.
+        
+        ?sections=today,yesterday,summary,low_stock,profit_margin,inventory_health,top_products
+        (default: all). ?shop=<id> picks a shop, otherwise the active shop is used.
+        """
+        requested = [s for s in request.query_params.get('sections', '').split(',') if s]
+        unknown = set(requested) - set(snapshots.SECTIONS)
+        if unknown:
+            return Response(
+                {'error': f"Unknown sections: {', '.join(sorted(unknown))}",
+                 'sections': snapshots.SECTIONS},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        sections = tuple(s for s in snapshots.SECTIONS if s in requested) or snapshots.SECTIONS
+        
+        shop_id = request.query_params.get('shop')
+        if shop_id:
+            shop = Shop.objects.filter(user=request.user, id=shop_id).first()
+            if shop is None:
+                return Response({'error': 'Shop not found'}, status=status.HTTP_404_NOT_FOUND)
+            shop_id = shop.id
+        else:
+            shop_id = get_active_shop_id(request)
+        
+        data = snapshots.build(request.user, shop_id, sections)
+        return Response(dict(data, shop=shop_id, generated_at=timezone.now()))
+    
+    @action(detail=False, methods=['get'])
+    @cached
+    def timeseries(self, request):
+        """
+        Chart series, bucketed in SQL and gap-filled.
+        
+        ?metrics=income,expenses,sales_count (also cost_of_goods, net_profit,
+        items_sold), ?granularity=hour|day|week|month (default day),
+        ?start_date= / ?end_date= (YYYY-MM-DD) and ?shops= / ?shop=.
+        Returns columnar JSON: one list of buckets and one list per metric.
+        """
+        metrics = [m for m in request.query_params.get('metrics', '').split(',') if m] or list(series.DEFAULT_METRICS)
+        unknown = set(metrics) - set(series.METRICS)
+        if unknown:
+            return Response(
+                {'error': f"Unknown metrics: {', '.join(sorted(unknown))}", 'metrics': series.METRICS},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        granularity = request.query_params.get('granularity', 'day')
+        if granularity not in series.GRANULARITIES:
+            return Response(
+                {'error': 'Invalid granularity', 'granularities': series.GRANULARITIES},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            start_date, end_date = parse_dates(request.query_params)
+        except ValueError:
+            return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        default_start, end_date = series.default_range(granularity, end_date)
+        start_date = start_date or default_start
+        if start_date > end_date:
+            return Response({'error': 'start_date is after end_date'}, status=status.HTTP_400_BAD_REQUEST)
+        if series.bucket_count(start_date, end_date, granularity) > series.MAX_BUCKETS:
+            return Response(
+                {'error': f'Range too long for {granularity} buckets (max {series.MAX_BUCKETS})'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        shop_ids, _, error = self._shop_scope(request)
+        if error:
+            return error
+        
+        buckets, values = series.series(request.user, metrics, granularity, start_date, end_date, shop=shop_ids)
+        return Response({
+            'granularity': granularity,
+            'start': start_date,
+            'end': end_date,
+            'shops': shop_ids,
+            'buckets': [bucket.isoformat() for bucket in buckets],
+            'series': values,
+        })
+    
+    @action(detail=False, methods=['get'])
+    @cached
     def report_data(self, request):
         """Get comprehensive report data"""
         report_type = request.query_params.get('type', 'daily')
-        shop_id = request.query_params.get('shop')
+        shop_ids, names, error = self._shop_scope(request)
+        if error:
+            return error
         
+        end_date = timezone.localdate()
         if report_type == 'weekly':
-            start_date = timezone.now().date() - timedelta(days=7)
+            start_date = end_date - timedelta(days=7)
         else:
-            start_date = timezone.now().date()
+            start_date = end_date
         
-        end_date = timezone.now().date()
+        date_range = {'start': start_date, 'end': end_date}
+        stocks = Stock.objects.filter(user=request.user)
+        if shop_ids is not None:
+            stocks = stocks.filter(shop_id__in=shop_ids)
         
-        # Get sales
-        sales_query = Sale.objects.filter(
-            user=request.user,
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date
-        )
-        if shop_id:
-            sales_query = sales_query.filter(shop_id=shop_id)
-        
-        # Get expenses
-        expenses_query = Expense.objects.filter(
-            user=request.user,
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date
-        )
-        if shop_id:
-            expenses_query = expenses_query.filter(shop_id=shop_id)
-        
-        total_income = sales_query.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        total_expenses = expenses_query.aggregate(Sum('amount'))['amount__sum'] or 0
+        if names is not None:
+            per_shop = rollups.period_totals_by_shop(request.user, start_date, end_date, shop=shop_ids)
+            stock_counts = dict(stocks.values('shop_id').annotate(count=Count('id')).values_list('shop_id', 'count'))
+            return self._grouped(
+                names,
+                lambda shop_id: {'summary': self._report_summary(
+                    per_shop.get(shop_id) or rollups.empty_totals(), stock_counts.get(shop_id, 0)
+                )},
+                {'summary': self._report_summary(
+                    self._sum_totals(per_shop.values()), sum(stock_counts.values())
+                )},
+                report_type=report_type,
+                date_range=date_range,
+            )
         
+        totals = rollups.period_totals(request.user, start_date, end_date, shop=shop_ids)
         return Response({
             'report_type': report_type,
-            'date_range': {'start': start_date, 'end': end_date},
-            'summary': {
-                'total_income': total_income,
-                'total_expenses': total_expenses,
-                'net_profit': total_income - total_expenses,
-                'total_sales': sales_query.count(),
-                'total_items_sold': sales_query.aggregate(Sum('quantity'))['quantity__sum'] or 0,
-                'total_stocks': Stock.objects.filter(user=request.user).count()
-            }
+            'date_range': date_range,
+            'summary': self._report_summary(totals, stocks.count())
         })
     
     @action(detail=False, methods=['get'])
+    @cached
     def profit_margin(self, request):
         """Get profit margin analysis"""
-        shop_id = request.query_params.get('shop')
+        shop_ids, names, error = self._shop_scope(request)
+        if error:
+            return error
         
-        sales_query = Sale.objects.filter(user=request.user)
-        if shop_id:
-            sales_query = sales_query.filter(shop_id=shop_id)
+        if names is not None:
+            per_shop = rollups.period_totals_by_shop(request.user, shop=shop_ids)
+            return self._grouped(
+                names,
+                lambda shop_id: self._margin(per_shop.get(shop_id) or rollups.empty_totals()),
+                self._margin(self._sum_totals(per_shop.values())),
+            )
         
-        expenses_query = Expense.objects.filter(user=request.user)
-        if shop_id:
-            expenses_query = expenses_query.filter(shop_id=shop_id)
-        
-        total_income = sales_query.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        total_expenses = expenses_query.aggregate(Sum('amount'))['amount__sum'] or 0
-        
-        if total_income == 0:
-            margin = 0
-        else:
-            margin = ((total_income - total_expenses) / total_income) * 100
-        
-        return Response({
-            'total_income': total_income,
-            'total_expenses': total_expenses,
-            'profit_margin_percent': round(margin, 2)
-        })
+        return Response(self._margin(rollups.period_totals(request.user, shop=shop_ids)))
     
     @action(detail=False, methods=['get'])
+    @cached
     def top_products(self, request):
-        """Get top selling products"""
-        limit = int(request.query_params.get('limit', 5))
-        shop_id = request.query_params.get('shop')
-        
-        sales_query = Sale.objects.filter(user=request.user)
-        if shop_id:
-            sales_query = sales_query.filter(shop_id=shop_id)
+        """
+        Get top selling products.
         
-        top_products = sales_query.values('stock__name').annotate(
-            total_quantity=Sum('quantity'),
-            total_revenue=Sum('total_amount'),
-            sale_count=Count('id')
-        ).order_by('-total_revenue')[:limit]
+        ?period=day|week|month|all (default all) picks the current day,
+        week, month or all time; ?limit= caps the list (default 5, at most 100).
+        """
+        try:
+            limit = int(request.query_params.get('limit', self.DEFAULT_TOP_PRODUCTS))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(max(limit, 1), self.MAX_TOP_PRODUCTS)
+        period = request.query_params.get('period', 'all')
+        if period not in leaderboard.PERIODS:
+            return Response(
+                {'error': 'Invalid period', 'periods': leaderboard.PERIODS},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        shop_ids, names, error = self._shop_scope(request)
+        if error:
+            return error
         
-        return Response(list(top_products))
+        top_products = leaderboard.top_products(request.user, limit, period, shop=shop_ids)
+        if names is not None:
+            per_shop = leaderboard.top_products_by_shop(request.user, limit, period, shop=shop_ids)
+            return self._grouped(
+                names,
+                lambda shop_id: {'products': per_shop.get(shop_id, [])},
+                {'products': top_products},
+                period=period,
+            )
+        return Response(top_products)
     
     @action(detail=False, methods=['get'])
+    @cached
     def expense_breakdown(self, request):
         """Get expense breakdown by category"""
-        shop_id = request.query_params.get('shop')
+        shop_ids, names, error = self._shop_scope(request)
+        if error:
+            return error
         
         expenses_query = Expense.objects.filter(user=request.user)
-        if shop_id:
-            expenses_query = expenses_query.filter(shop_id=shop_id)
+        if shop_ids is not None:
+            expenses_query = expenses_query.filter(shop_id__in=shop_ids)
+        
+        if names is not None:
+            per_shop = {}
+            rows = expenses_query.values('shop_id', 'category').annotate(
+                total=Sum('amount'),
+                count=Count('id')
+            ).order_by('-total')
+            for row in rows:
+                per_shop.setdefault(row.pop('shop_id'), []).append(row)
+            
+            total = {}
+            for row in (row for categories in per_shop.values() for row in categories):
+                entry = total.setdefault(row['category'], {'category': row['category'], 'total': 0, 'count': 0})
+                entry['total'] += row['total']
+                entry['count'] += row['count']
+            return self._grouped(
+                names,
+                lambda shop_id: {'categories': per_shop.get(shop_id, [])},
+                {'categories': sorted(total.values(), key=lambda entry: entry['total'], reverse=True)},
+            )
         
         breakdown = expenses_query.values('category').annotate(
             total=Sum('amount'),
@@ -125,23 +327,38 @@ class AnalyticsViewSet(viewsets.ViewSet):
         return Response(list(breakdown))
     
     @action(detail=False, methods=['get'])
+    @cached
     def inventory_health(self, request):
-        """Get inventory health status"""
-        shop_id = request.query_params.get('shop')
+        """
+        Get inventory health status.
+        
+        Counts of low, critical and overstocked items, the health percentage
+        and the stock valuation, in one query. ?breakdown=category adds the
+        same figures per category (also per shop with ?group_by=shop).
+        """
+        breakdown = request.query_params.get('breakdown', '')
+        if breakdown not in ('', 'category'):
+            return Response({'error': "breakdown must be 'category'"}, status=status.HTTP_400_BAD_REQUEST)
+        by_category = breakdown == 'category'
+        shop_ids, names, error = self._shop_scope(request)
+        if error:
+            return error
         
         stocks_query = Stock.objects.filter(user=request.user)
-        if shop_id:
-            stocks_query = stocks_query.filter(shop_id=shop_id)
+        if shop_ids is not None:
+            stocks_query = stocks_query.filter(shop_id__in=shop_ids)
         
-        total_stocks = stocks_query.count()
-        low_stock = stocks_query.filter(quantity_in_stock__lt=F('min_stock_level')).count()
-        critical_stock = stocks_query.filter(quantity_in_stock=0).count()
+        if names is None and not by_category:
+            return Response(breakdowns.inventory_health(stocks_query))
         
-        health_percent = 100 - ((low_stock + critical_stock) / total_stocks * 100) if total_stocks > 0 else 0
+        fields = (('shop_id',) if names is not None else ()) + (('category',) if by_category else ())
+        rows = breakdowns.inventory_health_rows(stocks_query, *fields)
+        if names is None:
+            return Response(breakdowns.summarize(rows, by_category))
         
-        return Response({
-            'total_stocks': total_stocks,
-            'low_stock': low_stock,
-            'critical_stock': critical_stock,
-            'health_percent': round(health_percent, 2)
-        })
+        per_shop = breakdowns.rows_by_shop(rows)
+        return self._grouped(
+            names,
+            lambda shop_id: breakdowns.summarize(per_shop.get(shop_id, []), by_category),
+            breakdowns.summarize(rows, by_category),
+        )
@@ -0,0 +1,51 @@
+"""
+Local-day date ranges for period queries.
+
+Filtering with ``created_at__date`` makes the database convert every row
+to local time (``DATE(created_at AT TIME ZONE ...)`` on PostgreSQL), which
+rules out the ``(user|shop, created_at)`` indexes. These helpers turn
+local (TIME_ZONE, Africa/Nairobi) calendar days into half-open
+``[start, end)`` ranges of aware datetimes instead, so the same filters
+become plain index range scans.
+"""
+from datetime import date, datetime, time, timedelta
+from django.utils import timezone
+
+
+def day_start(day):
+    """Aware datetime of local midnight at the start of ``day``"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def day_range(start_date, end_date=None):
+    """Half-open (start, end) datetimes covering local days start_date..end_date inclusive"""
+    return day_start(start_date), day_start((end_date or start_date) + timedelta(days=1))
+
+
+def in_days(queryset, start_date=None, end_date=None, field='created_at'):
+    """Filter ``field`` to local days start_date..end_date; either bound may be None"""
+    if start_date is not None:
+        queryset = queryset.filter(**{f'{field}__gte': day_start(start_date)})
+    if end_date is not None:
+        queryset = queryset.filter(**{f'{field}__lt': day_start(end_date + timedelta(days=1))})
+    return queryset
+
+
+def on_day(queryset, day, field='created_at'):
+    """Filter ``field`` to one local day"""
+    return in_days(queryset, day, day, field)
+
+
+def parse_dates(params):
+    """
+    Read optional ``start_date`` / ``end_date`` (YYYY-MM-DD) query params.
+
+    Returns (start_date, end_date) with None for missing values; raises
+    ValueError for malformed dates.
+    """
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
+    return (
+        date.fromisoformat(start_date) if start_date else None,
+        date.fromisoformat(end_date) if end_date else None,
+    )
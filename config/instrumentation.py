@@ -0,0 +1,205 @@
+"""
+Per-request query and timing instrumentation.
+
+``RequestMetricsMiddleware`` is listed in settings.MIDDLEWARE but stays out
+of the chain unless REQUEST_METRICS is on. When on, it wraps every
+database connection with ``execute_wrapper`` for the duration of the
+request and records the query count, DB time, total time and response
+size. The figures go out three ways:
+
+* a ``Server-Timing`` header (``db``, ``app`` and ``total``), which
+  browser dev tools show next to each request;
+* one JSON log line per request on the ``config.instrumentation`` logger,
+  at WARNING with the offending SQL when the request is over
+  REQUEST_METRICS_SLOW_MS or REQUEST_METRICS_MAX_QUERIES;
+* per-endpoint totals served by ``/api/metrics/`` to staff users.
+
+Endpoint totals are kept in process memory, so with several workers the
+endpoint reports the worker that answered (its pid is in the payload).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+SQL_LOG_LENGTH = 500
+SQL_LOG_COUNT = 5
+
+_lock = threading.Lock()
+_endpoints = {}
+_since = timezone.now()
+
+
+class QueryRecorder:
+    """execute_wrapper that counts and times the queries it sees"""
+
+    def __init__(self, slow_query_ms):
+        self.slow_query_ms = slow_query_ms
+        self.count = 0
+        self.duration = 0.0
+        self.slow = []
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.count += 1
+            self.duration += elapsed
+            # Placeholders are still in ``sql``, so repeats of one statement group together
+            self.statements[sql] += 1
+            if elapsed >= self.slow_query_ms:
+                self.slow.append((elapsed, sql))
+
+    def offending_sql(self):
+        """Slowest statements over the per-query threshold and the most repeated ones"""
+        slow = sorted(self.slow, key=lambda entry: entry[0], reverse=True)[:SQL_LOG_COUNT]
+        return {
+            'slow_queries': [{'ms': round(ms, 2), 'sql': sql[:SQL_LOG_LENGTH]} for ms, sql in slow],
+            'repeated_queries': [
+                {'count': count, 'sql': sql[:SQL_LOG_LENGTH]}
+                for sql, count in self.statements.most_common(SQL_LOG_COUNT) if count > 1
+            ],
+        }
+
+
+def endpoint_of(request):
+    """'METHOD view-name' for resolved requests, e.g. 'GET analytics-dashboard'"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    return f'{request.method} {match.view_name or match.route}'
+
+
+def response_size(response):
+    """Body size in bytes, or None for streamed responses without a Content-Length"""
+    if response.has_header('Content-Length'):
+        return int(response['Content-Length'])
+    if getattr(response, 'streaming', False):
+        return None
+    return len(response.content)
+
+
+def record(endpoint, metrics, slow):
+    with _lock:
+        totals = _endpoints.setdefault(endpoint, {
+            'requests': 0, 'errors': 0, 'slow': 0, 'queries': 0, 'max_queries': 0,
+            'db_ms': 0.0, 'total_ms': 0.0, 'max_ms': 0.0, 'bytes': 0,
+        })
+        totals['requests'] += 1
+        totals['errors'] += metrics['status'] >= 500
+        totals['slow'] += slow
+        totals['queries'] += metrics['queries']
+        totals['max_queries'] = max(totals['max_queries'], metrics['queries'])
+        totals['db_ms'] += metrics['db_ms']
+        totals['total_ms'] += metrics['total_ms']
+        totals['max_ms'] = max(totals['max_ms'], metrics['total_ms'])
+        totals['bytes'] += metrics['bytes'] or 0
+
+
+def stats():
+    """{endpoint: totals and per-request averages} since start or the last reset()"""
+    with _lock:
+        endpoints = {endpoint: dict(totals) for endpoint, totals in _endpoints.items()}
+    for totals in endpoints.values():
+        requests = totals['requests']
+        totals['avg_queries'] = round(totals['queries'] / requests, 2)
+        totals['avg_db_ms'] = round(totals['db_ms'] / requests, 2)
+        totals['avg_ms'] = round(totals['total_ms'] / requests, 2)
+        totals['avg_bytes'] = round(totals['bytes'] / requests)
+        for key in ('db_ms', 'total_ms', 'max_ms'):
+            totals[key] = round(totals[key], 2)
+    return endpoints
+
+
+def reset():
+    global _since
+    with _lock:
+        _endpoints.clear()
+        _since = timezone.now()
+
+
+class RequestMetricsMiddleware:
+    """Record query count, DB time, total time and response size per request"""
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = settings.REQUEST_METRICS_SLOW_MS
+        self.max_queries = settings.REQUEST_METRICS_MAX_QUERIES
+        self.slow_query_ms = settings.REQUEST_METRICS_SLOW_QUERY_MS
+
+    def __call__(self, request):
+        recorder = QueryRecorder(self.slow_query_ms)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+
+        metrics = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': endpoint_of(request),
+            'status': response.status_code,
+            'queries': recorder.count,
+            'db_ms': round(recorder.duration, 2),
+            'total_ms': round(total_ms, 2),
+            'bytes': response_size(response),
+        }
+        response['Server-Timing'] = (
+            f'db;dur={recorder.duration:.2f};desc="{recorder.count} queries", '
+            f'app;dur={max(total_ms - recorder.duration, 0):.2f}, total;dur={total_ms:.2f}'
+        )
+
+        reasons = []
+        if total_ms >= self.slow_ms:
+            reasons.append('time')
+        if recorder.count > self.max_queries:
+            reasons.append('queries')
+        if reasons:
+            metrics.update(slow=reasons, **recorder.offending_sql())
+            logger.warning(json.dumps(metrics))
+        else:
+            logger.info(json.dumps(metrics))
+
+        if metrics['endpoint'] is not None:
+            record(metrics['endpoint'], metrics, bool(reasons))
+        return response
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def request_metrics(request):
+    """Per-endpoint request metrics of this worker; DELETE resets them"""
+    if request.method == 'DELETE':
+        reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response({
+        'enabled': settings.REQUEST_METRICS,
+        'pid': os.getpid(),
+        'since': _since,
+        'thresholds': {
+            'slow_ms': settings.REQUEST_METRICS_SLOW_MS,
+            'max_queries': settings.REQUEST_METRICS_MAX_QUERIES,
+            'slow_query_ms': settings.REQUEST_METRICS_SLOW_QUERY_MS,
+        },
+        'endpoints': stats(),
+    })
@@ -0,0 +1,26 @@
+"""
+Data seeding shared by the benchmark commands.
+"""
+from collections import defaultdict
+
+
+def bulk_create_backdated(model, objs, batch_size=1000):
+    """
+    bulk_create ``objs``, keeping the ``created_at`` each one was given.
+
+    created_at is auto_now_add, so bulk_create stamps every row with now().
+    The intended times are written back afterwards with one queryset
+    UPDATE per distinct timestamp rather than by switching auto_now_add
+    off, which would change the field for every thread in the process.
+    Seed at hour or day resolution to keep the number of UPDATEs small.
+    """
+    stamps = [obj.created_at for obj in objs]
+    created = model.objects.bulk_create(objs, batch_size=batch_size)
+    rows = defaultdict(list)
+    for obj, stamp in zip(created, stamps):
+        obj.created_at = stamp
+        rows[stamp].append(obj.pk)
+    for stamp, pks in rows.items():
+        for i in range(0, len(pks), batch_size):
+            model.objects.filter(pk__in=pks[i:i + batch_size]).update(created_at=stamp)
+    return created
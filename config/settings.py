@@ -71,6 +71,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.instrumentation.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -119,6 +120,16 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Take the write lock when a transaction starts and wait for it,
+            # instead of failing with "database is locked" under concurrent writes
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+            # File-backed test database so threaded tests get real locking
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
         }
     }
 
@@ -164,10 +175,77 @@ STATICFILES_DIRS = [
     BASE_DIR / 'frontend' / 'dist' / 'assets',
 ]
 
+# Cache
+# Per-process by default. With several gunicorn workers, set REDIS_URL (and
+# install the redis package) so cache invalidation reaches every worker.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Cached analytics responses (see analytics/cache.py). Shares Redis when
+# REDIS_URL is set; otherwise ANALYTICS_CACHE_DIR selects a file cache that
+# all workers on one host share, and the fallback is per-process memory.
+if os.environ.get('REDIS_URL'):
+    CACHES['analytics'] = dict(CACHES['default'], KEY_PREFIX='analytics')
+elif os.environ.get('ANALYTICS_CACHE_DIR'):
+    CACHES['analytics'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ['ANALYTICS_CACHE_DIR'],
+    }
+else:
+    CACHES['analytics'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'analytics',
+    }
+
 # Media files (uploads, user content)
 # https://docs.djangoproject.com/en/5.2/topics/files/
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Rendered PDF/DOCX reports, keyed by content (see reports/cache.py)
+REPORT_CACHE_DIR = BASE_DIR / 'report_cache'
+
+# Partial chunked uploads (see reports/uploads.py)
+REPORT_UPLOAD_TMP_DIR = BASE_DIR / 'upload_tmp'
+
+# Hand report downloads to the front-end server: '', 'x-accel-redirect' (nginx) or 'x-sendfile'
+REPORT_DOWNLOAD_OFFLOAD = os.environ.get('REPORT_DOWNLOAD_OFFLOAD', '')
+# nginx 'internal' location aliased to MEDIA_ROOT, used with x-accel-redirect
+REPORT_DOWNLOAD_ACCEL_PREFIX = os.environ.get('REPORT_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+
+# Per-request query count, DB time and response size (see config/instrumentation.py).
+# Off unless REQUEST_METRICS=true; slow requests are logged with their SQL.
+REQUEST_METRICS = os.environ.get('REQUEST_METRICS', 'False').lower() == 'true'
+REQUEST_METRICS_SLOW_MS = float(os.environ.get('REQUEST_METRICS_SLOW_MS', 500))
+REQUEST_METRICS_MAX_QUERIES = int(os.environ.get('REQUEST_METRICS_MAX_QUERIES', 30))
+REQUEST_METRICS_SLOW_QUERY_MS = float(os.environ.get('REQUEST_METRICS_SLOW_QUERY_MS', 100))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'config.instrumentation': {
+            'handlers': ['console'],
+            'level': os.environ.get('REQUEST_METRICS_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -5,6 +5,7 @@ from django.contrib import admin
 from django.urls import path, include, re_path
 from django.views.generic import TemplateView
 from django.http import JsonResponse
+from config.instrumentation import request_metrics
 
 # Test endpoint for debugging authentication issues
 def test_endpoint(request):
@@ -28,6 +29,7 @@ urlpatterns = [
     path('api/expenses/', include('expenses.urls')),
     path('api/analytics/', include('analytics.urls')),
     path('api/reports/', include('reports.urls')),
+    path('api/metrics/', request_metrics),  # Request metrics (staff only)
     path('api/test/', test_endpoint),  # Debug endpoint
     # Catch-all pattern to serve React app for client-side routing
     re_path(r'^(?!api/|admin/).*$', TemplateView.as_view(template_name='index.html')),
@@ -0,0 +1,98 @@
+import statistics
+import time
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from analytics import rollups
+from config.seeding import bulk_create_backdated
+from expenses.models import Expense
+from expenses.views import ExpenseViewSet
+from shops.models import Shop
+
+ENDPOINTS = [
+    ('daily_summary', {}),
+    ('by_category', {'type': 'weekly'}),
+    ('summary', {}),
+    ('summary', {'start_date': None, 'end_date': None}),  # last 30 days, filled in at run time
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the expense summary endpoints as the expense table grows. '
+        'Runs in a transaction that is rolled back, so no data is kept.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='1000,10000,100000,1000000',
+            help='Comma-separated expense row counts to measure at'
+        )
+        parser.add_argument('--repeat', type=int, default=5, help='Requests per endpoint and size (median is shown)')
+        parser.add_argument(
+            '--per-day', type=int, default=50,
+            help='Expenses per day; more rows means a longer history, as in a real shop'
+        )
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        with transaction.atomic():
+            self._run(sizes, options['repeat'], options['per_day'])
+            transaction.set_rollback(True)
+
+    def _run(self, sizes, repeat, per_day):
+        user = User.objects.create_user(username=f'bench-{time.time_ns()}')
+        shop = Shop.objects.create(user=user, name='Benchmark')
+        factory = APIRequestFactory()
+        today = timezone.localdate()
+        month_ago = (today - timedelta(days=30)).isoformat()
+
+        self.stdout.write(f"{'rows':>9}  " + '  '.join(f'{self._label(name, params):>22}' for name, params in ENDPOINTS))
+        inserted = 0
+        for size in sizes:
+            self._insert(user, shop, inserted, size, per_day)
+            inserted = size
+            # bulk_create sends no signals, so bring the daily rollups up to date
+            rollups.rebuild(user=user)
+
+            timings = []
+            for name, params in ENDPOINTS:
+                if 'start_date' in params:
+                    params = {'start_date': month_ago, 'end_date': today.isoformat()}
+                view = ExpenseViewSet.as_view({'get': name})
+                samples = []
+                for _ in range(repeat):
+                    request = factory.get(f'/api/expenses/{name}/', params)
+                    force_authenticate(request, user=user)
+                    started = time.perf_counter()
+                    response = view(request)
+                    response.render()
+                    samples.append((time.perf_counter() - started) * 1000)
+                timings.append(statistics.median(samples))
+            self.stdout.write(f'{size:>9}  ' + '  '.join(f'{ms:>19.1f} ms' for ms in timings))
+
+    def _label(self, name, params):
+        if 'start_date' in params:
+            return f'{name} (30d)'
+        if params:
+            return f"{name} ({params['type']})"
+        return name
+
+    def _insert(self, user, shop, start, end, per_day):
+        """Add expenses start..end, ``per_day`` per day going back from today (one timestamp per day)"""
+        categories = [choice for choice, _ in Expense.CATEGORY_CHOICES]
+        now = timezone.now()
+        batch = []
+        for i in range(start, end):
+            batch.append(Expense(
+                shop=shop, user=user, category=categories[i % len(categories)],
+                description=f'Expense {i}', amount=100 + i % 900,
+                created_at=now - timedelta(days=i // per_day),
+            ))
+            if len(batch) == 10000:
+                bulk_create_backdated(Expense, batch)
+                batch = []
+        bulk_create_backdated(Expense, batch)
@@ -2,8 +2,13 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from config.dates import in_days, on_day, parse_dates
+from config.pagination import CreatedAtPagination
+from analytics import rollups
+from django.db.models import Sum, Count
 from django.utils import timezone
 from datetime import timedelta
+from decimal import Decimal
 from .models import Expense
 from .serializers import ExpenseSerializer
 
@@ -12,6 +17,7 @@ class ExpenseViewSet(viewsets.ModelViewSet):
     """Expense management"""
     serializer_class = ExpenseSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtPagination  # ?cursor= for keyset pages
     
     def get_queryset(self):
         """Get expenses for current user"""
@@ -28,71 +34,97 @@ class ExpenseViewSet(viewsets.ModelViewSet):
         """Create expense for current user"""
         # Get the active shop for the user
         from shops.models import Shop
-        active_shop = Shop.objects.filter(user=self.request.user, is_active=True).first()
+        from shops.active import get_active_shop_id
+        active_shop_id = get_active_shop_id(self.request)
         
-        if not active_shop:
+        if not active_shop_id:
             # If no active shop, get the first shop
-            active_shop = Shop.objects.filter(user=self.request.user).first()
+            active_shop_id = Shop.objects.filter(user=self.request.user).values_list('id', flat=True).first()
         
-        if active_shop:
-            serializer.save(user=self.request.user, shop=active_shop)
+        if active_shop_id:
+            serializer.save(user=self.request.user, shop_id=active_shop_id)
         else:
             serializer.save(user=self.request.user)
     
+    def _in_date_range(self, expenses):
+        """Apply optional ?start_date= / ?end_date= (YYYY-MM-DD); raises ValueError"""
+        return in_days(expenses, *parse_dates(self.request.query_params))
+    
+    @staticmethod
+    def _by_category(expenses):
+        """One grouped query: {category: {'count', 'total'}}"""
+        rows = expenses.order_by().values('category').annotate(count=Count('id'), total=Sum('amount'))
+        return {row['category']: {'count': row['count'], 'total': row['total']} for row in rows}
+    
     @action(detail=False, methods=['get'])
     def daily_summary(self, request):
         """Get today's expenses summary"""
-        today = timezone.now().date()
-        expenses = self.get_queryset().filter(created_at__date=today)
+        today = timezone.localdate()
+        expenses = on_day(self.get_queryset(), today)
         
-        total = sum(e.amount for e in expenses)
-        by_category = {}
-        for expense in expenses:
-            if expense.category not in by_category:
-                by_category[expense.category] = 0
-            by_category[expense.category] += expense.amount
+        categories = self._by_category(expenses)
         
         return Response({
             'date': today,
-            'total': total,
-            'count': expenses.count(),
-            'by_category': by_category,
+            'total': sum((c['total'] for c in categories.values()), Decimal('0')),
+            'count': sum(c['count'] for c in categories.values()),
+            'by_category': {category: c['total'] for category, c in categories.items()},
             'expenses': ExpenseSerializer(expenses, many=True).data
         })
     
     @action(detail=False, methods=['get'])
     def by_category(self, request):
-        """Get expenses by category"""
+        """
+        Get expenses by category.
+        
+        ?type=daily|weekly, or an explicit ?start_date=&end_date= range.
+        """
         expense_type = request.query_params.get('type', 'daily')
         
         if expense_type == 'weekly':
-            start_date = timezone.now().date() - timedelta(days=7)
+            start_date = timezone.localdate() - timedelta(days=7)
         else:  # daily
-            start_date = timezone.now().date()
+            start_date = timezone.localdate()
         
-        expenses = self.get_queryset().filter(created_at__date__gte=start_date)
+        expenses = self.get_queryset()
+        try:
+            if request.query_params.get('start_date') or request.query_params.get('end_date'):
+                expenses = self._in_date_range(expenses)
+            else:
+                expenses = in_days(expenses, start_date)
+        except ValueError:
+            return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
         
-        by_category = {}
-        for expense in expenses:
-            if expense.category not in by_category:
-                by_category[expense.category] = {'count': 0, 'total': 0}
-            by_category[expense.category]['count'] += 1
-            by_category[expense.category]['total'] += expense.amount
+        categories = self._by_category(expenses)
         
         return Response({
             'type': expense_type,
-            'by_category': by_category,
-            'total': sum(e.amount for e in expenses)
+            'by_category': categories,
+            'total': sum((c['total'] for c in categories.values()), Decimal('0'))
         })
     
     @action(detail=False, methods=['get'])
     def summary(self, request):
-        """Get expenses summary"""
-        expenses = self.get_queryset()
-        total = sum(e.amount for e in expenses)
+        """
+        Get expenses summary, optionally for ?start_date=&end_date= and ?shop=
+        
+        Served from the daily rollups (closed days) plus today's rows, so
+        the cost does not grow with the size of the expense history.
+        """
+        try:
+            start_date, end_date = parse_dates(request.query_params)
+        except ValueError:
+            return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        shop_id = request.query_params.get('shop') or None
+        if shop_id is not None and not shop_id.isdigit():
+            return Response({'error': 'Invalid shop id'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        totals = rollups.period_totals(request.user, start_date, end_date, shop=shop_id)
+        total = totals['expenses']
+        count = totals['expense_count']
         
         return Response({
             'total_expenses': total,
-            'count': expenses.count(),
-            'average': total / expenses.count() if expenses.count() > 0 else 0
+            'count': count,
+            'average': total / count if count > 0 else 0
         })
@@ -10,7 +10,7 @@ class StockAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
     fieldsets = (
         ('Shop & User', {'fields': ('shop', 'user')}),
-        ('Product Info', {'fields': ('name', 'category', 'price')}),
+        ('Product Info', {'fields': ('name', 'category', 'price', 'cost_price')}),
         ('Inventory', {'fields': ('quantity_in_stock', 'quantity_sold', 'min_stock_level')}),
         ('Timestamps', {'fields': ('created_at', 'updated_at')}),
     )
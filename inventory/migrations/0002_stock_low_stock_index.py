@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+        ('shops', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(condition=models.Q(('quantity_in_stock__lt', models.F('min_stock_level')), ('quantity_in_stock__lte', 0), _connector='OR'), fields=['user', 'shop'], name='inventory_stock_low_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 01:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_stock_low_stock_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='cost_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
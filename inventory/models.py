@@ -10,6 +10,8 @@ class Stock(models.Model):
     name = models.CharField(max_length=255)
     category = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # What one unit costs the shop; copied onto each Sale as unit_cost
+    cost_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     quantity_in_stock = models.IntegerField(default=0)
     quantity_sold = models.IntegerField(default=0)
     min_stock_level = models.IntegerField(default=10)
@@ -22,6 +24,12 @@ class Stock(models.Model):
             models.Index(fields=['shop', 'user']),
             models.Index(fields=['created_at']),
             models.Index(fields=['shop', 'created_at']),
+            # Partial index: only rows that need restocking are indexed
+            models.Index(
+                fields=['user', 'shop'],
+                condition=models.Q(quantity_in_stock__lt=models.F('min_stock_level')) | models.Q(quantity_in_stock__lte=0),
+                name='inventory_stock_low_idx',
+            ),
         ]
 
     def __str__(self):
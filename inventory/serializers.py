@@ -10,12 +10,23 @@ class StockHistorySerializer(serializers.ModelSerializer):
 
 
 class StockSerializer(serializers.ModelSerializer):
-    history = StockHistorySerializer(many=True, read_only=True)
+    """
+    Stock without its history by default.
+
+    With ``expand_history`` in the context, ``history`` lists the rows
+    prefetched into ``recent_history`` (see services.with_recent_history).
+    """
+    history = StockHistorySerializer(source='recent_history', many=True, read_only=True)
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.context.get('expand_history'):
+            self.fields.pop('history')
     
     class Meta:
         model = Stock
         fields = [
-            'id', 'shop', 'name', 'category', 'price', 'quantity_in_stock',
+            'id', 'shop', 'name', 'category', 'price', 'cost_price', 'quantity_in_stock',
             'quantity_sold', 'min_stock_level', 'created_at', 'updated_at', 'history'
         ]
         read_only_fields = ['id', 'shop', 'created_at', 'updated_at']
@@ -0,0 +1,128 @@
+"""
+Stock movements that must stay consistent under concurrent requests,
+and the stock queries shared by the inventory and sales views.
+"""
+from django.db import transaction
+from django.db.models import (
+    F, Q, Case, When, Value, IntegerField, CharField, DecimalField, Count, Sum, Avg, Prefetch
+)
+from django.utils import timezone
+from analytics import cache as analytics_cache
+from .models import Stock, StockHistory
+
+
+class InsufficientStock(Exception):
+    """Raised when a stock does not hold enough units for a sale"""
+
+    def __init__(self, available):
+        self.available = available
+        super().__init__(f'Insufficient stock. Available: {available}')
+
+
+def sell_stock(stock_id, quantity, notes=''):
+    """
+    Take ``quantity`` units out of a stock and log it in StockHistory.
+
+    The decrement is a single conditional UPDATE, which row-locks the stock
+    until the surrounding transaction commits, so concurrent sales can
+    neither lose updates nor oversell. Call it inside transaction.atomic()
+    together with the Sale insert so both commit or roll back as one.
+
+    The UPDATE sends no post_save, so the owner's cached analytics
+    responses are retired here once the transaction commits.
+    """
+    with transaction.atomic():
+        updated = Stock.objects.filter(pk=stock_id, quantity_in_stock__gte=quantity).update(
+            quantity_in_stock=F('quantity_in_stock') - quantity,
+            quantity_sold=F('quantity_sold') + quantity,
+            updated_at=timezone.now(),
+        )
+        stock = Stock.objects.get(pk=stock_id)
+        if not updated:
+            raise InsufficientStock(stock.quantity_in_stock)
+
+        StockHistory.objects.create(
+            stock=stock,
+            quantity_before=stock.quantity_in_stock + quantity,
+            quantity_after=stock.quantity_in_stock,
+            action='sold',
+            notes=notes
+        )
+        analytics_cache.invalidate_on_commit(stock.user_id)
+    return stock
+
+
+# Matches the condition of the partial index inventory_stock_low_idx
+LOW_STOCK = Q(quantity_in_stock__lt=F('min_stock_level')) | Q(quantity_in_stock__lte=0)
+CRITICAL_STOCK = Q(quantity_in_stock__lte=0)
+
+
+def low_stock(stocks):
+    """
+    Narrow a Stock queryset to items that need restocking.
+
+    Adds ``stock_deficit`` and ``alert_level`` ('critical' when nothing is
+    left, otherwise 'warning') and orders critical items first, then by
+    largest deficit.
+    """
+    return stocks.filter(LOW_STOCK).annotate(
+        stock_deficit=F('min_stock_level') - F('quantity_in_stock'),
+        alert_rank=Case(When(CRITICAL_STOCK, then=Value(0)), default=Value(1), output_field=IntegerField()),
+        alert_level=Case(
+            When(CRITICAL_STOCK, then=Value('critical')),
+            default=Value('warning'),
+            output_field=CharField(),
+        ),
+    ).order_by('alert_rank', '-stock_deficit', 'id')
+
+
+def low_stock_counts(stocks):
+    """Critical and warning counts for a Stock queryset in one query"""
+    return stocks.filter(LOW_STOCK).aggregate(
+        critical=Count('id', filter=CRITICAL_STOCK),
+        warning=Count('id', filter=~CRITICAL_STOCK),
+    )
+
+
+MONEY = DecimalField(max_digits=15, decimal_places=2)
+
+
+def _summary_aggregates():
+    return {
+        'total_stocks': Count('id'),
+        'total_quantity': Sum('quantity_in_stock'),
+        'total_sold': Sum('quantity_sold'),
+        'average_price': Avg('price'),
+        # Retail value of what is on the shelves, and its cost where cost_price is known
+        'inventory_value': Sum(F('price') * F('quantity_in_stock'), output_field=MONEY),
+        'inventory_cost': Sum(F('cost_price') * F('quantity_in_stock'), output_field=MONEY),
+    }
+
+
+def _clean_summary(row):
+    """NULL sums (no rows, or no cost prices) become 0"""
+    for key in ('total_quantity', 'total_sold', 'average_price', 'inventory_value', 'inventory_cost'):
+        row[key] = row[key] or 0
+    return row
+
+
+def stock_summary(stocks):
+    """Count, quantities, average price and valuation of a Stock queryset in one query"""
+    return _clean_summary(stocks.aggregate(**_summary_aggregates()))
+
+
+def stock_summary_by(stocks, *fields):
+    """The stock_summary figures grouped by ``fields`` (e.g. 'category'), one query"""
+    rows = stocks.order_by().values(*fields).annotate(**_summary_aggregates()).order_by(*fields)
+    return [_clean_summary(row) for row in rows]
+
+
+def with_recent_history(stocks, limit):
+    """
+    Prefetch each stock's ``limit`` newest history rows into ``recent_history``.
+
+    One extra query for the whole page: Django turns the sliced prefetch
+    into ROW_NUMBER() over (stock, newest first) <= limit.
+    """
+    history = StockHistory.objects.order_by('-created_at', '-id')[:limit]
+    return stocks.prefetch_related(Prefetch('history', queryset=history, to_attr='recent_history'))
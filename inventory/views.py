@@ -2,9 +2,12 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q
+from config.pagination import CreatedAtPagination
 from .models import Stock, StockHistory
 from .serializers import StockSerializer, StockHistorySerializer
+from .services import (
+    sell_stock, InsufficientStock, low_stock, with_recent_history, stock_summary, stock_summary_by
+)
 
 
 class StockViewSet(viewsets.ModelViewSet):
@@ -12,6 +15,21 @@ class StockViewSet(viewsets.ModelViewSet):
     serializer_class = StockSerializer
     permission_classes = [IsAuthenticated]
     
+    DEFAULT_HISTORY_LIMIT = 10
+    SUMMARY_BREAKDOWNS = {'category': ('category',), 'shop': ('shop', 'shop__name')}
+    MAX_HISTORY_LIMIT = 100
+    
+    def history_limit(self):
+        """Rows of history per stock for ?expand=history, or None when not expanded"""
+        expand = self.request.query_params.get('expand', '')
+        if 'history' not in expand.split(','):
+            return None
+        try:
+            limit = int(self.request.query_params.get('history_limit', self.DEFAULT_HISTORY_LIMIT))
+        except ValueError:
+            limit = self.DEFAULT_HISTORY_LIMIT
+        return min(max(limit, 1), self.MAX_HISTORY_LIMIT)
+    
     def get_queryset(self):
         """Get stocks for current user and active shop"""
         user = self.request.user
@@ -21,46 +39,63 @@ class StockViewSet(viewsets.ModelViewSet):
         if shop_id:
             queryset = queryset.filter(shop_id=shop_id)
         
+        limit = self.history_limit()
+        if limit and self.request.method == 'GET':
+            queryset = with_recent_history(queryset, limit)
+        
         return queryset.order_by('-created_at')
     
+    def get_serializer_context(self):
+        """Tell StockSerializer whether to include history"""
+        context = super().get_serializer_context()
+        context['expand_history'] = self.request.method == 'GET' and self.history_limit() is not None
+        return context
+    
     def perform_create(self, serializer):
         """Create stock for current user"""
         # Get the active shop for the user
         from shops.models import Shop
-        active_shop = Shop.objects.filter(user=self.request.user, is_active=True).first()
+        from shops.active import get_active_shop_id
+        active_shop_id = get_active_shop_id(self.request)
         
-        if not active_shop:
+        if not active_shop_id:
             # If no active shop, get the first shop
-            active_shop = Shop.objects.filter(user=self.request.user).first()
+            active_shop_id = Shop.objects.filter(user=self.request.user).values_list('id', flat=True).first()
         
-        if active_shop:
-            serializer.save(user=self.request.user, shop=active_shop)
+        if active_shop_id:
+            serializer.save(user=self.request.user, shop_id=active_shop_id)
         else:
             serializer.save(user=self.request.user)
     
     @action(detail=False, methods=['get'])
     def summary(self, request):
-        """Get stock summary"""
+        """
+        Get stock summary.
+        
+        ?breakdown=category,shop adds per-category and/or per-shop figures
+        (one grouped query each).
+        """
         stocks = self.get_queryset()
-        total_stocks = stocks.count()
-        total_quantity = sum(s.quantity_in_stock for s in stocks)
-        total_sold = sum(s.quantity_sold for s in stocks)
+        data = stock_summary(stocks)
         
-        return Response({
-            'total_stocks': total_stocks,
-            'total_quantity': total_quantity,
-            'total_sold': total_sold,
-            'average_price': sum(s.price for s in stocks) / total_stocks if total_stocks > 0 else 0
-        })
+        breakdowns = [b for b in request.query_params.get('breakdown', '').split(',') if b]
+        for breakdown in breakdowns:
+            if breakdown not in self.SUMMARY_BREAKDOWNS:
+                return Response(
+                    {'error': f"breakdown must be one of: {', '.join(self.SUMMARY_BREAKDOWNS)}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            data[f'by_{breakdown}'] = stock_summary_by(stocks, *self.SUMMARY_BREAKDOWNS[breakdown])
+        
+        return Response(data)
     
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
-        """Get low stock items"""
-        stocks = self.get_queryset().filter(
-            Q(quantity_in_stock__lt=models.F('min_stock_level'))
-        )
-        serializer = self.get_serializer(stocks, many=True)
-        return Response(serializer.data)
+        """Get low stock items, most urgent first"""
+        stocks = low_stock(self.get_queryset())
+        page = self.paginate_queryset(stocks)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
     @action(detail=True, methods=['post'])
     def add_stock(self, request, pk=None):
@@ -111,28 +146,15 @@ class StockViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            if stock.quantity_in_stock < quantity:
-                return Response(
-                    {'error': f'Insufficient stock. Available: {stock.quantity_in_stock}'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Create history record
-            StockHistory.objects.create(
-                stock=stock,
-                quantity_before=stock.quantity_in_stock,
-                quantity_after=stock.quantity_in_stock - quantity,
-                action='sold',
-                notes=request.data.get('notes', '')
-            )
-            
-            # Update stock
-            stock.quantity_in_stock -= quantity
-            stock.quantity_sold += quantity
-            stock.save()
+            stock = sell_stock(stock.pk, quantity, notes=request.data.get('notes', ''))
             
             serializer = self.get_serializer(stock)
             return Response(serializer.data)
+        except InsufficientStock as e:
+            return Response(
+                {'error': str(e), 'available': e.available},
+                status=status.HTTP_409_CONFLICT
+            )
         except (ValueError, TypeError):
             return Response(
                 {'error': 'Invalid quantity'},
@@ -144,6 +166,7 @@ class StockHistoryViewSet(viewsets.ReadOnlyModelViewSet):
     """Stock history (read-only)"""
     serializer_class = StockHistorySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtPagination  # ?cursor= for keyset pages
     
     def get_queryset(self):
         """Get history for current user's stocks"""
@@ -0,0 +1,375 @@
+"""
+Report data gathering and PDF/DOCX rendering.
+
+Used by ReportViewSet.generate for on-demand downloads and by the
+run_report_worker command for queued report jobs.
+"""
+from datetime import timedelta
+from io import BytesIO
+from django.db.models import Sum, Avg, OuterRef, Subquery
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.lib.units import inch
+from reportlab.graphics.shapes import Drawing
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.lib.enums import TA_CENTER
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from inventory.models import Stock
+from sales.models import Sale
+from analytics import rollups
+from config.dates import in_days
+
+
+CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+}
+
+
+def report_period(period, start_date=None, end_date=None):
+    """
+    Resolve a report period to (start_date, end_date).
+
+    Explicit ISO dates win over ``period`` (daily, weekly, monthly, yearly).
+    Raises ValueError for malformed dates.
+    """
+    if start_date and end_date:
+        return (
+            timezone.datetime.fromisoformat(start_date).date(),
+            timezone.datetime.fromisoformat(end_date).date(),
+        )
+
+    today = timezone.localdate()
+    if period == 'weekly':
+        return today - timedelta(days=7), today
+    if period == 'monthly':
+        return today.replace(day=1), today
+    if period == 'yearly':
+        return today.replace(month=1, day=1), today
+    return today, today
+
+
+def build_report(user, start_date, end_date, format_type='pdf', include_charts=True, include_details=True, shop=None):
+    """Gather a user's report data and render it; returns (content, filename, content_type)"""
+    sales_query = in_days(Sale.objects.filter(user=user), start_date, end_date)
+    stocks_query = Stock.objects.filter(user=user)
+    if shop is not None:
+        sales_query = sales_query.filter(shop=shop)
+        stocks_query = stocks_query.filter(shop=shop)
+
+    totals = rollups.period_totals(user, start_date, end_date, shop=shop)
+    total_income = totals['income']
+    total_expenses = totals['expenses']
+    total_sales = totals['sales_count']
+    total_items_sold = totals['items_sold']
+    total_stocks = stocks_query.count()
+
+    # Daily breakdown
+    daily_data = {}
+    for day in rollups.daily_totals(user, start_date, end_date, shop=shop):
+        daily_data[day['date']] = {
+            'income': day['income'], 'sales': day['sales_count'], 'expenses': day['expenses']
+        }
+
+    # Sales details, one row per product with its average and latest unit price
+    last_price = sales_query.filter(stock_id=OuterRef('stock_id')).order_by('-created_at', '-id').values('price_per_unit')[:1]
+    sales_details = list(sales_query.values('stock_id', 'stock__name').annotate(
+        qty=Sum('quantity'),
+        total=Sum('total_amount'),
+        avg_price=Avg('price_per_unit'),
+        last_price=Subquery(last_price),
+    ).order_by('-total'))
+
+    format_type = 'docx' if format_type == 'docx' else 'pdf'
+    render = render_docx if format_type == 'docx' else render_pdf
+    content = render(
+        start_date, end_date, total_income, total_expenses, total_sales,
+        total_items_sold, total_stocks, daily_data, sales_details,
+        include_charts, include_details
+    )
+    filename = f'Daily-Business-Report-{start_date}-to-{end_date}.{format_type}'
+    return content, filename, CONTENT_TYPES[format_type]
+
+
+def render_pdf(start_date, end_date, total_income, total_expenses, total_sales,
+                        total_items_sold, total_stocks, daily_data, sales_details,
+                        include_charts=True, include_details=True):
+    """Render the report as PDF bytes"""
+    # Create PDF
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    styles = getSampleStyleSheet()
+
+    # Custom styles
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        spaceAfter=30,
+        alignment=1,  # Center
+        textColor=colors.HexColor('#1a365d')
+    )
+
+    subtitle_style = ParagraphStyle(
+        'CustomSubtitle',
+        parent=styles['Heading2'],
+        fontSize=16,
+        spaceAfter=20,
+        textColor=colors.HexColor('#2d3748')
+    )
+
+    section_style = ParagraphStyle(
+        'Section',
+        parent=styles['Heading3'],
+        fontSize=14,
+        spaceAfter=15,
+        textColor=colors.HexColor('#2d3748')
+    )
+
+    normal_style = styles['Normal']
+    normal_style.fontSize = 12
+    normal_style.spaceAfter = 12
+
+    # Footer style for page numbers
+    footer_style = ParagraphStyle(
+        'Footer',
+        parent=styles['Normal'],
+        fontSize=10,
+        textColor=colors.gray,
+        alignment=TA_CENTER
+    )
+
+    def on_first_page(canvas, doc):
+        # Add footer to first page
+        canvas.saveState()
+        canvas.setFont('Helvetica', 10)
+        canvas.setFillColor(colors.gray)
+        canvas.drawString(inch, 0.75 * inch, f"Page 1 of 2 - Generated on {timezone.now().strftime('%-m/%-d/%Y, %-I:%M:%S %p')}")
+        canvas.restoreState()
+
+    def on_later_pages(canvas, doc):
+        # Add footer to subsequent pages
+        canvas.saveState()
+        canvas.setFont('Helvetica', 10)
+        canvas.setFillColor(colors.gray)
+        page_num = canvas.getPageNumber()
+        canvas.drawString(inch, 0.75 * inch, f"Page {page_num} of 2 - Generated on {timezone.now().strftime('%-m/%-d/%Y, %-I:%M:%S %p')}")
+        canvas.restoreState()
+
+    # Build PDF content
+    content = []
+
+    # Title
+    content.append(Paragraph("Daily Business Report", title_style))
+    content.append(Paragraph(f"Period: {start_date} to {end_date}", subtitle_style))
+    content.append(Spacer(1, 20))
+
+    # Summary
+    content.append(Paragraph("Summary", section_style))
+    summary_data = [
+        ['Total Income', f"₹{total_income:,.0f}"],
+        ['Total Expenses', f"₹{total_expenses:,.0f}"],
+        ['Net Profit', f"₹{(total_income - total_expenses):,.0f}"],
+        ['Total Sales', str(total_sales)],
+        ['Items Sold', str(total_items_sold)],
+        ['Total Stocks', str(total_stocks)],
+    ]
+
+    summary_table = Table(summary_data, colWidths=[3*inch, 2*inch])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f7fafc')),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#1a365d')),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 12),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e2e8f0')),
+    ]))
+
+    content.append(summary_table)
+    content.append(Spacer(1, 30))
+
+    # Daily Breakdown Chart (conditional)
+    if include_charts and daily_data:
+        content.append(Paragraph("Daily Breakdown Chart", section_style))
+        drawing = Drawing(400, 200)
+        bc = VerticalBarChart()
+        bc.x = 50
+        bc.y = 50
+        bc.height = 125
+        bc.width = 300
+        bc.data = [
+            [float(d['income']) for d in daily_data.values()],
+            [float(d['expenses']) for d in daily_data.values()]
+        ]
+        bc.categoryAxis.categoryNames = [d.strftime('%a, %b %d') for d in daily_data.keys()]
+        bc.valueAxis.valueMin = 0
+        bc.bars[0].fillColor = colors.HexColor('#48bb78')  # green for income
+        bc.bars[1].fillColor = colors.HexColor('#f56565')  # red for expenses
+        drawing.add(bc)
+        content.append(drawing)
+        content.append(Spacer(1, 30))
+
+    # Daily Details (conditional)
+    if include_details:
+        content.append(Paragraph("Daily Details", section_style))
+        daily_table_data = [['Date', 'Income', 'Expenses', 'Sales']]
+        for date, data in sorted(daily_data.items()):
+            daily_table_data.append([
+                date.strftime('%a, %b %d'),
+                f"₹{data['income']:,.0f}",
+                f"₹{data['expenses']:,.0f}",
+                str(data['sales'])
+            ])
+
+        daily_table = Table(daily_table_data, colWidths=[2*inch, 1.5*inch, 1.5*inch, 1*inch])
+        daily_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e2e8f0')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1a365d')),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#cbd5e0')),
+            ('FONTSIZE', (0, 1), (-1, -1), 11),
+        ]))
+
+        content.append(daily_table)
+        content.append(Spacer(1, 30))
+
+    # Sales Details (conditional)
+    if include_details:
+        content.append(Paragraph("Sales Details", section_style))
+        sales_table_data = [['Product', 'Qty', 'Price/Unit', 'Total']]
+        for item in sales_details:
+            sales_table_data.append([
+                item['stock__name'],
+                str(item['qty']),
+                f"₹{item['last_price'] or 0:,.0f}",
+                f"₹{item['total']:,.0f}"
+            ])
+
+        sales_table = Table(sales_table_data, colWidths=[2*inch, 1*inch, 1.5*inch, 1.5*inch])
+        sales_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e2e8f0')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1a365d')),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#cbd5e0')),
+            ('FONTSIZE', (0, 1), (-1, -1), 11),
+        ]))
+
+        content.append(sales_table)
+        content.append(Spacer(1, 30))
+
+    # Build PDF
+    doc.build(content, onFirstPage=on_first_page, onLaterPages=on_later_pages)
+    return buffer.getvalue()
+
+
+def render_docx(start_date, end_date, total_income, total_expenses, total_sales,
+                         total_items_sold, total_stocks, daily_data, sales_details,
+                         include_charts=True, include_details=True):
+    """Render the report as DOCX bytes"""
+    # Create Word document
+    doc = Document()
+
+    # Add title
+    title = doc.add_heading('Daily Business Report', 0)
+    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    # Add period
+    para = doc.add_paragraph(f'Period: {start_date} to {end_date}')
+    para.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    doc.add_paragraph()  # Add space
+
+    # Summary section
+    doc.add_heading('Summary', level=1)
+    summary_table = doc.add_table(rows=1, cols=2)
+    summary_table.style = 'Table Grid'
+
+    # Add header row
+    hdr_cells = summary_table.rows[0].cells
+    hdr_cells[0].text = 'Metric'
+    hdr_cells[1].text = 'Value'
+
+    # Add summary data
+    summary_data = [
+        ('Total Income', f"₹{total_income:,.0f}"),
+        ('Total Expenses', f"₹{total_expenses:,.0f}"),
+        ('Net Profit', f"₹{(total_income - total_expenses):,.0f}"),
+        ('Total Sales', str(total_sales)),
+        ('Items Sold', str(total_items_sold)),
+        ('Total Stocks', str(total_stocks)),
+    ]
+
+    for metric, value in summary_data:
+        row_cells = summary_table.add_row().cells
+        row_cells[0].text = metric
+        row_cells[1].text = value
+        row_cells[1].paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.RIGHT
+
+    doc.add_paragraph()  # Add space
+
+    # Daily Details section (conditional)
+    if include_details:
+        doc.add_heading('Daily Details', level=1)
+        daily_table = doc.add_table(rows=1, cols=4)
+        daily_table.style = 'Table Grid'
+
+        # Add header row
+        hdr_cells = daily_table.rows[0].cells
+        hdr_cells[0].text = 'Date'
+        hdr_cells[1].text = 'Income'
+        hdr_cells[2].text = 'Expenses'
+        hdr_cells[3].text = 'Sales'
+
+        # Add daily data
+        for date, data in sorted(daily_data.items()):
+            row_cells = daily_table.add_row().cells
+            row_cells[0].text = date.strftime('%a, %b %d')
+            row_cells[1].text = f"₹{data['income']:,.0f}"
+            row_cells[2].text = f"₹{data['expenses']:,.0f}"
+            row_cells[3].text = str(data['sales'])
+
+        doc.add_paragraph()  # Add space
+
+    # Sales Details section (conditional)
+    if include_details:
+        doc.add_heading('Sales Details', level=1)
+        sales_table = doc.add_table(rows=1, cols=4)
+        sales_table.style = 'Table Grid'
+
+        # Add header row
+        hdr_cells = sales_table.rows[0].cells
+        hdr_cells[0].text = 'Product'
+        hdr_cells[1].text = 'Qty'
+        hdr_cells[2].text = 'Price/Unit'
+        hdr_cells[3].text = 'Total'
+
+        # Add sales data
+        for item in sales_details:
+            row_cells = sales_table.add_row().cells
+            row_cells[0].text = item['stock__name']
+            row_cells[1].text = str(item['qty'])
+            row_cells[2].text = f"₹{item['last_price'] or 0:,.0f}"
+            row_cells[3].text = f"₹{item['total']:,.0f}"
+
+        doc.add_paragraph()  # Add space
+
+    # Add footer
+    doc.add_paragraph()
+    footer = doc.add_paragraph(f"Generated on {timezone.now().strftime('%-m/%-d/%Y, %-I:%M:%S %p')}")
+    footer.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    # Save to buffer
+    buffer = BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,120 @@
+"""
+On-disk cache for generated reports.
+
+A rendered report is stored under a key derived from everything that
+affects its bytes: user, shop, date range, format, chart/detail flags and
+a data version. The data version is a fingerprint of the DailyRollup rows
+in the range (touched on every Sale/Expense write, see analytics.signals)
+and of the stocks the report lists, so editing any sale or expense in the
+range produces a new key while closed past periods keep theirs forever.
+
+The key doubles as the HTTP ETag. Files are grouped in one directory per
+report (everything but the data version), and writing a new version
+removes the ones it supersedes, so a range that includes today keeps one
+file however often its data changes.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+from analytics.models import DailyRollup
+from inventory.models import Stock
+from .builder import build_report, CONTENT_TYPES
+
+
+def cache_dir():
+    return Path(getattr(settings, 'REPORT_CACHE_DIR', Path(settings.BASE_DIR) / 'report_cache'))
+
+
+def data_version(user, start_date, end_date, shop=None):
+    """Fingerprint of the data a report for this range is built from"""
+    rollups = DailyRollup.objects.filter(user=user, date__gte=start_date, date__lte=end_date)
+    stocks = Stock.objects.filter(user=user)
+    if shop is not None:
+        rollups = rollups.filter(shop=shop)
+        stocks = stocks.filter(shop=shop)
+
+    days = rollups.aggregate(
+        rows=Count('id'),
+        updated=Max('updated_at'),
+        income=Sum('income'),
+        expenses=Sum('expenses'),
+        sales=Sum('sales_count'),
+    )
+    inventory = stocks.aggregate(rows=Count('id'), updated=Max('updated_at'))
+    parts = [days[k] for k in ('rows', 'updated', 'income', 'expenses', 'sales')]
+    parts += [inventory['rows'], inventory['updated']]
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _report_parts(user, start_date, end_date, format_type, include_charts, include_details, shop):
+    return [
+        user.pk, shop if shop is not None else '', start_date, end_date, format_type,
+        int(bool(include_charts)), int(bool(include_details)),
+    ]
+
+
+def _digest(parts):
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def report_key(user, start_date, end_date, format_type, include_charts, include_details, shop=None):
+    """Cache key (and ETag) for a report as of the current data version"""
+    format_type = 'docx' if format_type == 'docx' else 'pdf'
+    parts = _report_parts(user, start_date, end_date, format_type, include_charts, include_details, shop)
+    return _digest(parts + [data_version(user, start_date, end_date, shop)])
+
+
+def report_dir(user, start_date, end_date, format_type, include_charts, include_details, shop=None):
+    """Directory holding every version of one report"""
+    slot = _digest(_report_parts(user, start_date, end_date, format_type, include_charts, include_details, shop))
+    return cache_dir() / slot[:2] / slot
+
+
+def _evict_superseded(path):
+    """Remove the other versions of the report stored next to ``path``"""
+    for old in path.parent.glob(f'*{path.suffix}'):
+        if old != path:
+            try:
+                old.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def get_or_build(user, start_date, end_date, format_type='pdf', include_charts=True, include_details=True,
+                 shop=None, key=None):
+    """
+    Return (content, filename, content_type, key), rendering only on a miss.
+
+    Pass ``key`` when it has already been computed for this request.
+    """
+    format_type = 'docx' if format_type == 'docx' else 'pdf'
+    if key is None:
+        key = report_key(user, start_date, end_date, format_type, include_charts, include_details, shop)
+    filename = f'Daily-Business-Report-{start_date}-to-{end_date}.{format_type}'
+    path = report_dir(
+        user, start_date, end_date, format_type, include_charts, include_details, shop
+    ) / f'{key}.{format_type}'
+
+    try:
+        return path.read_bytes(), filename, CONTENT_TYPES[format_type], key
+    except FileNotFoundError:
+        pass
+
+    content, filename, content_type = build_report(
+        user, start_date, end_date, format_type, include_charts, include_details, shop=shop
+    )
+    # Write to a temp file and rename so readers never see a partial report
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(tmp, path)
+        _evict_superseded(path)
+    except OSError:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    return content, filename, content_type, key
@@ -0,0 +1,102 @@
+"""
+Streaming downloads for stored report files.
+
+Files are never read into memory whole: full downloads go out through
+FileResponse in blocks, single byte ranges (``Range: bytes=a-b``) are
+streamed as 206 responses, and with REPORT_DOWNLOAD_OFFLOAD set the body
+is handed to the front-end server instead:
+
+* ``'x-accel-redirect'`` - nginx serves the file from an ``internal``
+  location mapped at REPORT_DOWNLOAD_ACCEL_PREFIX to MEDIA_ROOT.
+* ``'x-sendfile'`` - Apache mod_xsendfile / lighttpd serve the absolute path.
+"""
+import os
+import re
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """
+    Resolve a single-range Range header to (start, end) inclusive.
+
+    Returns None when there is no usable range (serve the whole file) and
+    raises ValueError when the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError('Empty suffix range')
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+def _read_range(fileobj, start, length):
+    try:
+        fileobj.seek(start)
+        while length > 0:
+            chunk = fileobj.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def _offload(uploaded, mode, content_type):
+    response = HttpResponse(content_type=content_type)
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'REPORT_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + uploaded.file.name
+    else:
+        response['X-Sendfile'] = uploaded.file.path
+    return response
+
+
+def file_response(request, uploaded, content_type):
+    """Build a download response for an UploadedFile"""
+    filename = os.path.basename(uploaded.filename or uploaded.file.name)
+    mode = (getattr(settings, 'REPORT_DOWNLOAD_OFFLOAD', '') or '').lower()
+
+    if mode in ('x-accel-redirect', 'x-sendfile'):
+        response = _offload(uploaded, mode, content_type)
+    else:
+        size = uploaded.file.size
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        fileobj = uploaded.file.open('rb')
+        if byte_range is None:
+            response = FileResponse(fileobj, content_type=content_type)
+            response.block_size = CHUNK_SIZE
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read_range(fileobj, start, end - start + 1), status=206, content_type=content_type
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+        response['Accept-Ranges'] = 'bytes'
+
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
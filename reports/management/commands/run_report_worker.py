@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from reports.worker import claim_next_job, run_job, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = 'Render queued report jobs in a local worker process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process the current queue and exit')
+        parser.add_argument('--poll', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument(
+            '--stale-after', type=int, default=600,
+            help='Requeue jobs that have been running for this many seconds'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            requeue_stale_jobs(options['stale_after'])
+
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                # Drop broken or expired DB connections while idle
+                close_old_connections()
+                time.sleep(options['poll'])
+                continue
+
+            run_job(job)
+            self.stdout.write(f'Report job {job.id}: {job.status}')
@@ -10,6 +10,7 @@ class UploadedFile(models.Model):
     filename = models.CharField(max_length=255)
     file_type = models.CharField(max_length=10)  # 'pdf' or 'docx'
     file_size = models.IntegerField()
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)  # sha256 hex
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -19,8 +20,73 @@ class UploadedFile(models.Model):
         return f"{self.filename} - {self.user.username}"
     
     def save(self, *args, **kwargs):
+        # Only fill in what the caller did not already provide
         if self.file:
-            self.filename = self.file.name
-            self.file_type = self.filename.lower().split('.')[-1]
-            self.file_size = self.file.size
+            if not self.filename:
+                self.filename = self.file.name
+            if not self.file_type:
+                self.file_type = self.filename.lower().split('.')[-1]
+            if not self.file_size:
+                self.file_size = self.file.size
         super().save(*args, **kwargs)
+
+
+class ReportJob(models.Model):
+    """A queued PDF/DOCX report, rendered by the run_report_worker command"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='report_jobs')
+    shop = models.ForeignKey('shops.Shop', on_delete=models.CASCADE, null=True, blank=True, related_name='+')  # None: all shops
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    format = models.CharField(max_length=10, default='pdf')  # 'pdf' or 'docx'
+    start_date = models.DateField()
+    end_date = models.DateField()
+    include_charts = models.BooleanField(default=True)
+    include_details = models.BooleanField(default=True)
+    result = models.ForeignKey(UploadedFile, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.format} report {self.start_date} to {self.end_date} ({self.status})"
+
+
+class UploadSession(models.Model):
+    """A resumable chunked upload; chunks are appended to a temp file until completed"""
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('complete', 'Complete'),
+    ]
+
+    user = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField()
+    checksum = models.CharField(max_length=64)  # expected sha256 hex
+    received = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    result = models.ForeignKey(UploadedFile, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'status', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.total_size})"
@@ -1,5 +1,9 @@
 from rest_framework import serializers
-from .models import UploadedFile
+import re
+from shops.models import Shop
+from .models import UploadedFile, ReportJob, UploadSession
+from .builder import report_period
+from . import uploads
 
 
 class UploadedFileSerializer(serializers.ModelSerializer):
@@ -8,8 +12,8 @@ class UploadedFileSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = UploadedFile
-        fields = ['id', 'filename', 'file_type', 'file_size', 'file_size_display', 'uploaded_at']
-        read_only_fields = ['id', 'file_size', 'uploaded_at']
+        fields = ['id', 'filename', 'file_type', 'file_size', 'file_size_display', 'content_hash', 'uploaded_at']
+        read_only_fields = ['id', 'file_size', 'content_hash', 'uploaded_at']
     
     def get_file_size_display(self, obj):
         """Convert file size to human readable format"""
@@ -41,3 +45,83 @@ class FileUploadSerializer(serializers.Serializer):
             raise serializers.ValidationError("File size must be less than 10MB")
         
         return value
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    """Serializer for queued report jobs"""
+    file = UploadedFileSerializer(source='result', read_only=True)
+
+    class Meta:
+        model = ReportJob
+        fields = [
+            'id', 'status', 'shop', 'format', 'start_date', 'end_date', 'include_charts', 'include_details',
+            'file', 'error', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+
+class ReportJobCreateSerializer(serializers.Serializer):
+    """Serializer for queuing a report; same options as the generate endpoint"""
+    period = serializers.ChoiceField(choices=['daily', 'weekly', 'monthly', 'yearly', 'custom'], default='daily')
+    format = serializers.ChoiceField(choices=['pdf', 'docx'], default='pdf')
+    start_date = serializers.CharField(required=False)
+    end_date = serializers.CharField(required=False)
+    include_charts = serializers.BooleanField(default=True)
+    include_details = serializers.BooleanField(default=True)
+    shop = serializers.IntegerField(required=False, allow_null=True, default=None)
+
+    def validate_shop(self, value):
+        """One of the requesting user's shops (pass the request in the context)"""
+        if value is None:
+            return None
+        shop = Shop.objects.filter(user=self.context['request'].user, id=value).first()
+        if shop is None:
+            raise serializers.ValidationError("Shop not found")
+        return shop
+
+    def validate(self, data):
+        """Resolve the period to concrete dates"""
+        try:
+            data['start_date'], data['end_date'] = report_period(
+                data['period'], data.get('start_date'), data.get('end_date')
+            )
+        except ValueError:
+            raise serializers.ValidationError("Invalid date format. Use YYYY-MM-DD")
+        return data
+
+
+class UploadSessionCreateSerializer(serializers.Serializer):
+    """Serializer for opening a chunked upload"""
+    filename = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1, max_value=uploads.MAX_FILE_SIZE)
+    checksum = serializers.CharField()
+
+    def validate_filename(self, value):
+        """Same file types as single uploads"""
+        if value.lower().split('.')[-1] not in uploads.ALLOWED_TYPES:
+            raise serializers.ValidationError("Only PDF and DOCX files are allowed")
+        return value
+
+    def validate_checksum(self, value):
+        """sha256 of the whole file, hex encoded"""
+        value = value.lower()
+        if not re.fullmatch(r'[0-9a-f]{64}', value):
+            raise serializers.ValidationError("checksum must be a hex sha256 digest")
+        return value
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """Serializer for chunked upload progress"""
+    file = UploadedFileSerializer(source='result', read_only=True)
+    max_chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'filename', 'total_size', 'checksum', 'received', 'status', 'max_chunk_size',
+            'file', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
+    def get_max_chunk_size(self, obj):
+        return uploads.MAX_CHUNK_SIZE
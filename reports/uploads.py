@@ -0,0 +1,160 @@
+"""
+Resumable chunked uploads and content-hash deduplication for UploadedFile.
+
+A client opens an UploadSession with the file name, size and sha256,
+PUTs the bytes in order (``?offset=`` must equal what the server already
+has, so an interrupted upload resumes from the reported ``received``),
+then completes it. Chunks are appended to a temp file under
+REPORT_UPLOAD_TMP_DIR and never held in memory whole.
+
+Stored blobs are shared by content hash: a file whose bytes are already
+in storage gets a new UploadedFile row pointing at the existing blob, and
+a user re-uploading one of their own files gets that file back without
+sending any bytes. Skipping the transfer is limited to the user's own
+files so that a hash alone never grants access to someone else's upload.
+"""
+import hashlib
+import os
+from datetime import timedelta
+from pathlib import Path
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from .models import UploadedFile, UploadSession
+
+ALLOWED_TYPES = ('pdf', 'docx')
+MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB, same limit as FileUploadSerializer
+MAX_CHUNK_SIZE = 2 * 1024 * 1024
+READ_SIZE = 64 * 1024
+SESSION_TTL = timedelta(hours=24)
+
+
+class UploadError(Exception):
+    """A chunk or completion request that cannot be applied"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def tmp_dir():
+    return Path(getattr(settings, 'REPORT_UPLOAD_TMP_DIR', Path(settings.BASE_DIR) / 'upload_tmp'))
+
+
+def part_path(session):
+    return tmp_dir() / f'{session.pk}.part'
+
+
+def file_hash(fileobj):
+    """sha256 hex of a file-like object, read in blocks"""
+    digest = hashlib.sha256()
+    for block in iter(lambda: fileobj.read(READ_SIZE), b''):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def _discard(session):
+    try:
+        os.unlink(part_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def discard_stale_sessions(user):
+    """Drop a user's open sessions that have not moved for SESSION_TTL"""
+    stale = UploadSession.objects.filter(
+        user=user, status='open', updated_at__lt=timezone.now() - SESSION_TTL
+    )
+    for session in stale:
+        _discard(session)
+    stale.delete()
+
+
+def own_copy(user, content_hash):
+    return UploadedFile.objects.filter(user=user, content_hash=content_hash).first()
+
+
+def store_file(user, fileobj, filename, content_hash):
+    """
+    Create an UploadedFile for already-verified content.
+
+    Returns the user's existing record for identical bytes, or a new
+    record that reuses a stored blob when another upload has the same hash.
+    """
+    existing = own_copy(user, content_hash)
+    if existing:
+        return existing
+
+    file_type = filename.lower().split('.')[-1]
+    blob = UploadedFile.objects.filter(content_hash=content_hash).exclude(file='').first()
+    if blob:
+        return UploadedFile.objects.create(
+            user=user, file=blob.file.name, filename=filename, file_type=file_type,
+            file_size=blob.file_size, content_hash=content_hash,
+        )
+
+    fileobj.seek(0)
+    return UploadedFile.objects.create(
+        user=user, file=File(fileobj, name=filename), filename=filename, file_type=file_type,
+        content_hash=content_hash,
+    )
+
+
+def blob_in_use(uploaded):
+    """Whether another UploadedFile still points at this record's stored blob"""
+    return UploadedFile.objects.filter(file=uploaded.file.name).exclude(pk=uploaded.pk).exists()
+
+
+def write_chunk(session, offset, stream):
+    """Append a request body at ``offset``; returns the new received count"""
+    if session.status != 'open':
+        raise UploadError('Upload is already complete', status=409)
+    if offset != session.received:
+        raise UploadError(f'Expected offset {session.received}', status=409)
+
+    path = part_path(session)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    with open(path, 'r+b' if path.exists() else 'wb') as part:
+        # Drop any tail left by an interrupted earlier attempt
+        part.seek(offset)
+        part.truncate()
+        for block in iter(lambda: stream.read(READ_SIZE), b''):
+            written += len(block)
+            if written > MAX_CHUNK_SIZE or offset + written > session.total_size:
+                raise UploadError('Chunk exceeds the declared size', status=413)
+            part.write(block)
+
+    # Another request may have raced us to the same offset
+    updated = UploadSession.objects.filter(pk=session.pk, received=offset, status='open').update(
+        received=offset + written, updated_at=timezone.now()
+    )
+    if not updated:
+        raise UploadError('Upload changed concurrently; check the session and retry', status=409)
+    session.received = offset + written
+    return session.received
+
+
+def complete(session):
+    """Verify size and checksum, then store (or dedupe) the file"""
+    if session.status == 'complete':
+        return session.result
+    if session.received != session.total_size:
+        raise UploadError(f'Upload incomplete: {session.received} of {session.total_size} bytes')
+
+    path = part_path(session)
+    with open(path, 'rb') as part:
+        content_hash = file_hash(part)
+        if content_hash != session.checksum:
+            part.close()
+            _discard(session)
+            session.received = 0
+            session.save(update_fields=['received', 'updated_at'])
+            raise UploadError('Checksum mismatch; upload restarted from offset 0')
+        with transaction.atomic():
+            uploaded = store_file(session.user, part, session.filename, content_hash)
+            session.status = 'complete'
+            session.result = uploaded
+            session.save(update_fields=['status', 'result', 'updated_at'])
+    _discard(session)
+    return uploaded
@@ -0,0 +1,55 @@
+"""
+Database-backed queue for report jobs.
+
+Jobs are rows in ReportJob. A worker (``manage.py run_report_worker``)
+claims the oldest queued job with a conditional UPDATE, so several
+workers can share the table without an external broker, renders it through
+the report cache and stores the file as an UploadedFile.
+"""
+import hashlib
+from datetime import timedelta
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from .cache import get_or_build
+from .models import ReportJob
+from .uploads import store_file
+
+
+def claim_next_job():
+    """Move the oldest queued job to 'running'; None when the queue is empty"""
+    while True:
+        job = ReportJob.objects.filter(status='queued').order_by('created_at', 'id').first()
+        if job is None:
+            return None
+        claimed = ReportJob.objects.filter(pk=job.pk, status='queued').update(
+            status='running', started_at=timezone.now()
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+        # Another worker got there first; try the next one
+
+
+def run_job(job):
+    """Render a claimed job and record the outcome"""
+    try:
+        content, filename, _, _ = get_or_build(
+            job.user, job.start_date, job.end_date, job.format,
+            job.include_charts, job.include_details, shop=job.shop_id
+        )
+        job.result = store_file(job.user, ContentFile(content), filename, hashlib.sha256(content).hexdigest())
+        job.status = 'done'
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['result', 'status', 'error', 'finished_at'])
+    return job
+
+
+def requeue_stale_jobs(timeout_seconds):
+    """Put back jobs whose worker died mid-render; returns how many"""
+    cutoff = timezone.now() - timedelta(seconds=timeout_seconds)
+    return ReportJob.objects.filter(status='running', started_at__lt=cutoff).update(
+        status='queued', started_at=None
+    )
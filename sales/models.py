@@ -12,10 +12,17 @@ class Sale(models.Model):
     quantity = models.IntegerField()
     price_per_unit = models.DecimalField(max_digits=10, decimal_places=2)
     total_amount = models.DecimalField(max_digits=15, decimal_places=2)
+    # Stock.cost_price at the time of sale; NULL when the cost was not known
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Client-supplied key so a retried POS sync does not record a sale twice
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
 
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_sale_idempotency_key'),
+        ]
         indexes = [
             models.Index(fields=['shop', 'created_at']),
             models.Index(fields=['user', 'created_at']),
@@ -7,5 +7,20 @@ class SaleSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Sale
-        fields = ['id', 'shop', 'stock', 'stock_name', 'quantity', 'price_per_unit', 'total_amount', 'created_at']
-        read_only_fields = ['id', 'shop', 'created_at']
+        fields = ['id', 'shop', 'stock', 'stock_name', 'quantity', 'price_per_unit', 'total_amount', 'unit_cost', 'created_at']
+        read_only_fields = ['id', 'shop', 'unit_cost', 'created_at']
+
+    def validate_quantity(self, value):
+        """Validate quantity"""
+        if value <= 0:
+            raise serializers.ValidationError("Quantity must be positive")
+        return value
+
+
+class BulkSaleItemSerializer(serializers.Serializer):
+    """One sale in a bulk POS sync"""
+    stock = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+    price_per_unit = serializers.DecimalField(max_digits=10, decimal_places=2)
+    total_amount = serializers.DecimalField(max_digits=15, decimal_places=2)
+    idempotency_key = serializers.CharField(max_length=64, required=False)
@@ -2,19 +2,29 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from django.db.models import Sum
+from config.dates import in_days, on_day, parse_dates
+from config.pagination import CreatedAtPagination
+from django.db import transaction, IntegrityError
+from django.db.models import Sum, Count, F, Q, DecimalField
 from django.utils import timezone
 from datetime import timedelta
+from collections import Counter
 from .models import Sale
-from .serializers import SaleSerializer
-from inventory.models import Stock
+from .serializers import SaleSerializer, BulkSaleItemSerializer
+from inventory.models import Stock, StockHistory
+from inventory.services import sell_stock, InsufficientStock, low_stock, low_stock_counts
 from shops.models import Shop
+from shops.active import get_active_shop_id
+from analytics import cache as analytics_cache, rollups
+
+MAX_BULK_SALES = 1000
 
 
 class SaleViewSet(viewsets.ModelViewSet):
     """Sales management"""
     serializer_class = SaleSerializer
     permission_classes = [AllowAny]  # Allow unauthenticated access
+    pagination_class = CreatedAtPagination  # ?cursor= for keyset pages
     
     def get_queryset(self):
         """Get sales for current user's active shop"""
@@ -22,138 +32,309 @@ class SaleViewSet(viewsets.ModelViewSet):
         # If user is not authenticated, return empty queryset
         if not user.is_authenticated:
             return Sale.objects.none()
-        active_shop = Shop.objects.filter(user=user, is_active=True).first()
-        if active_shop:
-            return Sale.objects.filter(user=user, shop=active_shop)
-        return Sale.objects.filter(user=user)
+        active_shop_id = get_active_shop_id(self.request)
+        sales = Sale.objects.filter(user=user).select_related('stock')
+        if active_shop_id:
+            return sales.filter(shop_id=active_shop_id)
+        return sales
+    
+    def _period_totals(self, start_date=None, end_date=None):
+        """Rollup totals scoped the same way as get_queryset()"""
+        user = self.request.user
+        if not user.is_authenticated:
+            return rollups.empty_totals()
+        return rollups.period_totals(user, start_date, end_date, shop=get_active_shop_id(self.request))
+    
+    def _sale_details(self, request, sales):
+        """
+        One page of the period's sales when the request has ?include=sales.
+        
+        Summaries otherwise return aggregates only.
+        """
+        if 'sales' not in request.query_params.get('include', '').split(','):
+            return None
+        page = self.paginate_queryset(sales.order_by('-created_at', '-id'))
+        return {
+            'count': self.paginator.page.paginator.count,
+            'next': self.paginator.get_next_link(),
+            'previous': self.paginator.get_previous_link(),
+            'results': SaleSerializer(page, many=True).data,
+        }
+    
+    def create(self, request, *args, **kwargs):
+        """Create a sale, answering 409 when the stock is too low"""
+        try:
+            return super().create(request, *args, **kwargs)
+        except InsufficientStock as e:
+            return Response(
+                {'error': str(e), 'available': e.available},
+                status=status.HTTP_409_CONFLICT
+            )
     
     def perform_create(self, serializer):
         """Create sale and update stock"""
         user = self.request.user
-        active_shop = Shop.objects.filter(user=user, is_active=True).first()
-        if not active_shop:
+        active_shop_id = get_active_shop_id(self.request)
+        if not active_shop_id:
             # Create default shop if none exists
-            active_shop = Shop.objects.create(
+            active_shop_id = Shop.objects.create(
+                user=user,
+                name="Main Shop",
+                location="Default",
+                is_active=True
+            ).id
+        
+        # Sale row, stock decrement and history commit together
+        with transaction.atomic():
+            sale = serializer.save(
+                user=user,
+                shop_id=active_shop_id,
+                unit_cost=serializer.validated_data['stock'].cost_price
+            )
+            sell_stock(sale.stock_id, sale.quantity, notes=f'Sale #{sale.id}')
+    
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Record a batch of sales from an offline till in one transaction"""
+        user = request.user
+        if not user.is_authenticated:
+            return Response({'error': 'Not authenticated'}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        rows = request.data.get('sales') if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({'error': 'Provide a non-empty list of sales'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > MAX_BULK_SALES:
+            return Response(
+                {'error': f'At most {MAX_BULK_SALES} sales per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        results = [None] * len(rows)
+        valid = []
+        for index, row in enumerate(rows):
+            item = BulkSaleItemSerializer(data=row)
+            if item.is_valid():
+                valid.append((index, item.validated_data))
+            else:
+                results[index] = {'index': index, 'status': 'invalid', 'errors': item.errors}
+        
+        # Rows already recorded by an earlier sync, or repeated within this batch
+        keys = {data['idempotency_key'] for _, data in valid if data.get('idempotency_key')}
+        recorded = dict(
+            Sale.objects.filter(user=user, idempotency_key__in=keys).values_list('idempotency_key', 'id')
+        )
+        first_in_batch = {}
+        pending = []
+        for index, data in valid:
+            key = data.get('idempotency_key')
+            if key in recorded:
+                results[index] = {'index': index, 'status': 'duplicate', 'id': recorded[key]}
+            elif key in first_in_batch:
+                results[index] = {'index': index, 'status': 'duplicate'}
+            else:
+                if key:
+                    first_in_batch[key] = index
+                pending.append((index, data))
+        
+        active_shop_id = get_active_shop_id(request)
+        if not active_shop_id:
+            active_shop_id = Shop.objects.create(
                 user=user,
                 name="Main Shop",
                 location="Default",
                 is_active=True
+            ).id
+        
+        try:
+            with transaction.atomic():
+                stock_ids = {data['stock'] for _, data in pending}
+                stocks = {
+                    stock.pk: stock
+                    for stock in Stock.objects.select_for_update().filter(user=user, pk__in=stock_ids).order_by('pk')
+                }
+                remaining = {pk: stock.quantity_in_stock for pk, stock in stocks.items()}
+                
+                new_sales = []
+                for index, data in pending:
+                    stock = stocks.get(data['stock'])
+                    if stock is None:
+                        results[index] = {'index': index, 'status': 'invalid', 'errors': {'stock': ['Stock not found']}}
+                    elif remaining[stock.pk] < data['quantity']:
+                        results[index] = {
+                            'index': index, 'status': 'insufficient_stock', 'available': remaining[stock.pk]
+                        }
+                    else:
+                        remaining[stock.pk] -= data['quantity']
+                        new_sales.append((index, Sale(
+                            shop_id=active_shop_id,
+                            stock=stock,
+                            user=user,
+                            quantity=data['quantity'],
+                            price_per_unit=data['price_per_unit'],
+                            total_amount=data['total_amount'],
+                            unit_cost=stock.cost_price,
+                            idempotency_key=data.get('idempotency_key'),
+                        )))
+                
+                created = Sale.objects.bulk_create([sale for _, sale in new_sales])
+                
+                # One UPDATE and one history row per stock
+                sold = Counter()
+                sale_counts = Counter()
+                for sale in created:
+                    sold[sale.stock_id] += sale.quantity
+                    sale_counts[sale.stock_id] += 1
+                for stock_id, quantity in sold.items():
+                    Stock.objects.filter(pk=stock_id).update(
+                        quantity_in_stock=F('quantity_in_stock') - quantity,
+                        quantity_sold=F('quantity_sold') + quantity,
+                        updated_at=timezone.now(),
+                    )
+                StockHistory.objects.bulk_create([
+                    StockHistory(
+                        stock=stocks[stock_id],
+                        quantity_before=stocks[stock_id].quantity_in_stock,
+                        quantity_after=remaining[stock_id],
+                        action='sold',
+                        notes=f'Bulk sync of {sale_counts[stock_id]} sales'
+                    )
+                    for stock_id in sold
+                ])
+                rollups.record_sales(created)
+                analytics_cache.invalidate_on_commit(user.id)
+        except IntegrityError:
+            # Another sync recorded one of these idempotency keys concurrently
+            return Response(
+                {'error': 'Some of these sales were recorded by a concurrent request; retry the sync'},
+                status=status.HTTP_409_CONFLICT
             )
         
-        sale = serializer.save(user=user, shop=active_shop)
+        for index, sale in new_sales:
+            results[index] = {'index': index, 'status': 'created', 'id': sale.id}
+        # A repeat within the batch is only a duplicate if its first row was recorded;
+        # otherwise it shares that row's rejection
+        for index, data in valid:
+            key = data.get('idempotency_key')
+            if results[index]['status'] == 'duplicate' and 'id' not in results[index]:
+                first = results[first_in_batch[key]]
+                if first['status'] == 'created':
+                    results[index]['id'] = first['id']
+                else:
+                    results[index] = dict(first, index=index)
         
-        # Update stock quantities
-        stock = sale.stock
-        stock.quantity_in_stock -= sale.quantity
-        if stock.quantity_in_stock < 0:
-            stock.quantity_in_stock = 0
-        stock.quantity_sold += sale.quantity
-        stock.save()
+        statuses = Counter(result['status'] for result in results)
+        return Response({
+            'created': statuses['created'],
+            'duplicates': statuses['duplicate'],
+            'rejected': len(results) - statuses['created'] - statuses['duplicate'],
+            'results': results,
+        }, status=status.HTTP_201_CREATED if statuses['created'] else status.HTTP_200_OK)
     
     @action(detail=False, methods=['get'])
     def daily_summary(self, request):
         """Get today's sales summary"""
-        today = timezone.now().date()
-        sales_today = self.get_queryset().filter(created_at__date=today)
+        today = timezone.localdate()
+        sales_today = on_day(self.get_queryset(), today)
         
-        total_sales = sales_today.count()
-        total_amount = sales_today.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
+        totals = sales_today.aggregate(total_sales=Count('id'), total_amount=Sum('total_amount'))
         
-        return Response({
+        data = {
             'date': today,
-            'total_sales': total_sales,
-            'total_amount': float(total_amount),
-            'sales': SaleSerializer(sales_today, many=True).data
-        })
+            'total_sales': totals['total_sales'],
+            'total_amount': float(totals['total_amount'] or 0),
+        }
+        details = self._sale_details(request, sales_today)
+        if details is not None:
+            data['sales'] = details
+        return Response(data)
     
     @action(detail=False, methods=['get'])
     def yesterday_summary(self, request):
         """Get yesterday's sales summary"""
-        today = timezone.now().date()
+        today = timezone.localdate()
         yesterday = today - timedelta(days=1)
-        sales_yesterday = self.get_queryset().filter(created_at__date=yesterday)
+        sales_yesterday = on_day(self.get_queryset(), yesterday)
+        totals = self._period_totals(yesterday, yesterday)
         
-        total_sales = sales_yesterday.count()
-        total_amount = sales_yesterday.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        
-        return Response({
+        data = {
             'date': yesterday,
-            'total_sales': total_sales,
-            'total_amount': float(total_amount),
-            'sales': SaleSerializer(sales_yesterday, many=True).data
-        })
+            'total_sales': totals['sales_count'],
+            'total_amount': float(totals['income']),
+        }
+        details = self._sale_details(request, sales_yesterday)
+        if details is not None:
+            data['sales'] = details
+        return Response(data)
     
     @action(detail=False, methods=['get'])
     def report_data(self, request):
         """Generate report data for daily or weekly"""
         report_type = request.query_params.get('type', 'daily')  # daily or weekly
         
+        today = timezone.localdate()
         if report_type == 'weekly':
             # Get last 7 days
-            today = timezone.now().date()
             start_date = today - timedelta(days=6)
-            sales = self.get_queryset().filter(created_at__date__gte=start_date, created_at__date__lte=today)
         else:
             # Get today's sales
-            today = timezone.now().date()
-            sales = self.get_queryset().filter(created_at__date=today)
+            start_date = today
+        sales = in_days(self.get_queryset(), start_date, today)
         
-        # Calculate totals
-        total_amount = sales.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        total_sales = sales.count()
+        # Totals and per-day figures come from the daily rollups
+        active_shop_id = get_active_shop_id(request)
+        totals = rollups.period_totals(request.user, start_date, today, shop=active_shop_id)
+        total_amount = totals['income']
+        total_sales = totals['sales_count']
         
         # Get stocks info
-        stocks = Stock.objects.filter(user=request.user)
-        total_items_sold = stocks.aggregate(Sum('quantity_sold'))['quantity_sold__sum'] or 0
-        
-        # Calculate expenses (40% of revenue)
-        total_expenses = float(total_amount) * 0.4
-        net_profit = float(total_amount) - total_expenses
+        stock_totals = Stock.objects.filter(user=request.user).aggregate(
+            total_stocks=Count('id'), total_items_sold=Sum('quantity_sold')
+        )
+        total_items_sold = stock_totals['total_items_sold'] or 0
         
-        # Group sales by day for chart
-        daily_data = {}
-        for sale in sales:
-            day = sale.created_at.date()
-            if day not in daily_data:
-                daily_data[day] = {'income': 0, 'expenses': 0, 'sales_count': 0}
-            daily_data[day]['income'] += float(sale.total_amount)
-            daily_data[day]['expenses'] = daily_data[day]['income'] * 0.4
-            daily_data[day]['sales_count'] += 1
+        # Recorded expenses and the cost of the goods sold
+        total_expenses = float(totals['expenses'])
+        cost_of_goods = float(totals['cost_of_goods'])
+        net_profit = float(total_amount) - cost_of_goods - total_expenses
         
-        # Convert to list and sort
+        # Chart data per day
         chart_data = []
-        for day in sorted(daily_data.keys()):
+        for day in rollups.daily_totals(request.user, start_date, today, shop=active_shop_id):
             chart_data.append({
-                'day': day.strftime('%a, %b %d'),
-                'income': daily_data[day]['income'],
-                'expenses': daily_data[day]['expenses'],
-                'sales_count': daily_data[day]['sales_count']
+                'day': day['date'].strftime('%a, %b %d'),
+                'income': float(day['income']),
+                'expenses': float(day['expenses']),
+                'sales_count': day['sales_count']
             })
         
-        return Response({
+        data = {
             'report_type': report_type,
             'date_range': {
-                'start': (timezone.now().date() - timedelta(days=6 if report_type == 'weekly' else 0)).isoformat(),
-                'end': timezone.now().date().isoformat(),
+                'start': start_date.isoformat(),
+                'end': today.isoformat(),
             },
             'summary': {
                 'total_income': float(total_amount),
                 'total_expenses': total_expenses,
+                'cost_of_goods': cost_of_goods,
                 'net_profit': net_profit,
                 'total_sales': total_sales,
                 'total_items_sold': total_items_sold,
-                'total_stocks': stocks.count(),
+                'total_stocks': stock_totals['total_stocks'],
             },
             'chart_data': chart_data,
-            'sales': SaleSerializer(sales, many=True).data
-        })
+        }
+        details = self._sale_details(request, sales)
+        if details is not None:
+            data['sales'] = details
+        return Response(data)
     
     @action(detail=False, methods=['get'])
     def summary(self, request):
         """Get sales summary"""
-        sales = self.get_queryset()
-        total_sales = sales.count()
-        total_amount = sales.aggregate(Sum('total_amount'))['total_amount__sum'] or 0
+        totals = self._period_totals()
+        total_sales = totals['sales_count']
+        total_amount = totals['income']
         
         return Response({
             'total_sales': total_sales,
@@ -168,102 +349,111 @@ class SaleViewSet(viewsets.ModelViewSet):
         if not user.is_authenticated:
             return Response({'error': 'Not authenticated'}, status=status.HTTP_401_UNAUTHORIZED)
         
-        # Get all stocks for the user
         stocks = Stock.objects.filter(user=user)
+        counts = low_stock_counts(stocks)
         
-        critical_alerts = []
-        warning_alerts = []
-        
-        for stock in stocks:
-            if stock.quantity_in_stock == 0:
-                # Critical: stock is zero
-                critical_alerts.append({
-                    'product_id': stock.id,
-                    'product_name': stock.name,
-                    'category': stock.category,
-                    'current_stock': stock.quantity_in_stock,
-                    'min_stock_level': stock.min_stock_level,
-                    'stock_deficit': stock.min_stock_level - stock.quantity_in_stock,
-                    'price': float(stock.price),
-                    'alert_level': 'critical'
-                })
-            elif stock.quantity_in_stock < stock.min_stock_level:
-                # Warning: stock below minimum
-                warning_alerts.append({
-                    'product_id': stock.id,
-                    'product_name': stock.name,
-                    'category': stock.category,
-                    'current_stock': stock.quantity_in_stock,
-                    'min_stock_level': stock.min_stock_level,
-                    'stock_deficit': stock.min_stock_level - stock.quantity_in_stock,
-                    'price': float(stock.price),
-                    'alert_level': 'warning'
-                })
-        
-        all_alerts = critical_alerts + warning_alerts
+        # Worst items first, one page at a time
+        alerts = low_stock(stocks).values(
+            'id', 'name', 'category', 'quantity_in_stock', 'min_stock_level',
+            'stock_deficit', 'price', 'alert_level'
+        )
+        page = self.paginate_queryset(alerts)
+        items = [
+            {
+                'product_id': alert['id'],
+                'product_name': alert['name'],
+                'category': alert['category'],
+                'current_stock': alert['quantity_in_stock'],
+                'min_stock_level': alert['min_stock_level'],
+                'stock_deficit': alert['stock_deficit'],
+                'price': float(alert['price']),
+                'alert_level': alert['alert_level']
+            }
+            for alert in page
+        ]
         
         return Response({
-            'critical_alerts': len(critical_alerts),
-            'warning_alerts': len(warning_alerts),
-            'total_alerts': len(all_alerts),
-            'items': all_alerts
+            'critical_alerts': counts['critical'],
+            'warning_alerts': counts['warning'],
+            'total_alerts': counts['critical'] + counts['warning'],
+            'next': self.paginator.get_next_link(),
+            'previous': self.paginator.get_previous_link(),
+            'items': items
         })
     
     @action(detail=False, methods=['get'])
     def profit_margin_analysis(self, request):
-        """Get profit margin analysis by product"""
+        """
+        Get profit margin analysis by product.
+
+        Costs come from Sale.unit_cost captured at sale time. Sales recorded
+        without a known cost are counted in revenue but left out of the
+        cost, profit and margin figures (see uncosted_sales).
+        Optional filters: ?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD&shop=<id>
+        """
         user = request.user
         if not user.is_authenticated:
             return Response({'error': 'Not authenticated'}, status=status.HTTP_401_UNAUTHORIZED)
         
-        # Get all stocks for the user
-        stocks = Stock.objects.filter(user=user)
+        try:
+            sales = in_days(Sale.objects.filter(user=user), *parse_dates(request.query_params))
+        except ValueError:
+            return Response({'error': 'Invalid date format. Use YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+        if request.query_params.get('shop'):
+            sales = sales.filter(shop_id=request.query_params['shop'])
+        
+        money = DecimalField(max_digits=15, decimal_places=2)
+        costed = Q(unit_cost__isnull=False)
+        rows = sales.values(
+            'stock_id', 'stock__name', 'stock__category', 'stock__price'
+        ).annotate(
+            quantity_sold=Sum('quantity'),
+            revenue=Sum('total_amount'),
+            costed_revenue=Sum('total_amount', filter=costed),
+            cost=Sum(F('unit_cost') * F('quantity'), filter=costed, output_field=money),
+            uncosted_sales=Count('id', filter=~costed),
+        ).order_by('-revenue')
         
         products = []
         total_revenue = 0
         total_cost = 0
         total_profit = 0
+        uncosted_sales = 0
         
-        for stock in stocks:
-            if stock.quantity_sold > 0:
-                # Calculate revenue (price * quantity sold)
-                revenue = float(stock.price) * stock.quantity_sold
-                
-                # Estimate cost (assume 60% of price is cost)
-                cost = revenue * 0.6
-                
-                # Calculate profit
-                profit = revenue - cost
-                
-                # Calculate margin percentage
-                margin_percent = (profit / revenue * 100) if revenue > 0 else 0
-                
-                products.append({
-                    'product_id': stock.id,
-                    'product_name': stock.name,
-                    'category': stock.category,
-                    'quantity_sold': stock.quantity_sold,
-                    'total_revenue': revenue,
-                    'total_cost': cost,
-                    'total_profit': profit,
-                    'profit_margin_percent': margin_percent,
-                    'price': float(stock.price),
-                })
-                
-                total_revenue += revenue
-                total_cost += cost
-                total_profit += profit
+        for row in rows:
+            revenue = float(row['revenue'] or 0)
+            costed_revenue = float(row['costed_revenue'] or 0)
+            cost = float(row['cost'] or 0)
+            profit = costed_revenue - cost
+            
+            products.append({
+                'product_id': row['stock_id'],
+                'product_name': row['stock__name'],
+                'category': row['stock__category'],
+                'quantity_sold': row['quantity_sold'],
+                'total_revenue': revenue,
+                'total_cost': cost,
+                'total_profit': profit,
+                'profit_margin_percent': (profit / costed_revenue * 100) if costed_revenue > 0 else 0,
+                'price': float(row['stock__price']),
+                'uncosted_sales': row['uncosted_sales'],
+            })
+            
+            total_revenue += revenue
+            total_cost += cost
+            total_profit += profit
+            uncosted_sales += row['uncosted_sales']
         
-        # Calculate overall metrics
-        overall_margin_percent = (total_profit / total_revenue * 100) if total_revenue > 0 else 0
+        costed_total = total_cost + total_profit
         
         return Response({
             'overall_metrics': {
                 'total_revenue': total_revenue,
                 'total_cost': total_cost,
                 'total_profit': total_profit,
-                'overall_margin_percent': overall_margin_percent,
+                'overall_margin_percent': (total_profit / costed_total * 100) if costed_total > 0 else 0,
                 'product_count': len(products),
+                'uncosted_sales': uncosted_sales,
             },
             'products': products
         })
@@ -0,0 +1,69 @@
+"""
+Active-shop lookup shared by the API views.
+
+Most endpoints scope their data to the user's active shop. The views only
+need its id (for filters and for the shop of new rows), so that is what
+get_active_shop_id() resolves: at most once per request (memoised on the
+request) and, when the default cache is shared between workers
+(REDIS_URL), across requests too, so warm requests need no query at all.
+Any Shop save or delete clears the user's entry (see signals.py).
+
+A per-process cache (the LocMem default) is not used across requests:
+a switch or delete handled by one worker would leave the other workers
+writing into the old shop until the entry expired.
+"""
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from .models import Shop
+
+CACHE_TIMEOUT = 60 * 60
+NO_SHOP = 0  # cached marker for "user has no active shop"
+
+
+def cache_key(user_id):
+    return f'shops:active:{user_id}'
+
+
+def shared_cache():
+    """Whether the default cache is seen by every worker"""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def get_active_shop_id(request):
+    """Id of the request user's active shop, or None"""
+    request = getattr(request, '_request', request)  # DRF Request -> HttpRequest
+    user = request.user
+    if not user.is_authenticated:
+        return None
+
+    memo = getattr(request, '_active_shop_id', None)
+    if memo is not None and memo[0] == user.pk:
+        return memo[1]
+
+    shop_id = cache.get(cache_key(user.pk)) if shared_cache() else None
+    if shop_id is None:
+        shop_id = Shop.objects.filter(user=user, is_active=True).values_list('id', flat=True).first()
+        if shared_cache():
+            cache.set(cache_key(user.pk), shop_id or NO_SHOP, CACHE_TIMEOUT)
+    elif shop_id == NO_SHOP:
+        shop_id = None
+
+    request._active_shop_id = (user.pk, shop_id)
+    return shop_id
+
+
+def get_active_shop(request):
+    """The request user's active Shop, or None"""
+    shop_id = get_active_shop_id(request)
+    if shop_id is None:
+        return None
+    return Shop.objects.filter(pk=shop_id).first()
+
+
+def invalidate(user_id, request=None):
+    """Forget the cached active shop for a user"""
+    cache.delete(cache_key(user_id))
+    if request is not None:
+        request = getattr(request, '_request', request)
+        request.__dict__.pop('_active_shop_id', None)
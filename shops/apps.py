@@ -5,3 +5,6 @@ class ShopsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shops'
     verbose_name = 'Shop Management'
+
+    def ready(self):
+        from . import signals  # noqa: F401
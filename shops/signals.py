@@ -0,0 +1,13 @@
+"""
+Drop the cached active shop whenever one of the user's shops changes.
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Shop
+from . import active
+
+
+@receiver(post_save, sender=Shop)
+@receiver(post_delete, sender=Shop)
+def forget_active_shop(sender, instance, **kwargs):
+    active.invalidate(instance.user_id)
@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.db import IntegrityError
 from .models import Shop
+from .active import get_active_shop, invalidate
 from .serializers import ShopSerializer
 
 
@@ -48,9 +49,10 @@ class ShopViewSet(viewsets.ModelViewSet):
         # Deactivate all other shops
         Shop.objects.filter(user=request.user).exclude(id=shop.id).update(is_active=False)
         
-        # Activate this shop
+        # Activate this shop (saving it clears the cached active shop)
         shop.is_active = True
         shop.save()
+        invalidate(request.user.id, request)
         
         serializer = self.get_serializer(shop)
         return Response(serializer.data)
@@ -58,7 +60,7 @@ class ShopViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def active_shop(self, request):
         """Get the currently active shop"""
-        shop = Shop.objects.filter(user=request.user, is_active=True).first()
+        shop = get_active_shop(request)
         if shop:
             serializer = self.get_serializer(shop)
             return Response(serializer.data)
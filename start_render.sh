@@ -0,0 +1,23 @@
+#!/bin/bash
+
+# Start command for the Render web service: migrations, the report worker
+# and gunicorn in one container.
+#
+# The report worker saves rendered reports under MEDIA_ROOT on this
+# service's disk, which a separate Render worker service could not read,
+# so it runs here under a loop that restarts it whenever it exits (crash,
+# OOM kill). Jobs left 'running' by a dead worker are requeued after
+# --stale-after seconds.
+
+set -e
+
+python manage.py migrate --noinput
+
+(
+    while true; do
+        python manage.py run_report_worker || echo "Report worker exited with status $?, restarting" >&2
+        sleep 5
+    done
+) &
+
+exec gunicorn config.wsgi:application --bind 0.0.0.0:$PORT
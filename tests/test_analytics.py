@@ -0,0 +1,600 @@
+"""
+Tests for the daily sales/expense rollups
+"""
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.utils import timezone
+from analytics import leaderboard
+from analytics.management.commands import benchmark_api
+from analytics.models import DailyRollup, ProductRollup
+from expenses.models import Expense
+from inventory.models import Stock
+from sales.models import Sale
+from shops.models import Shop
+import json
+
+
+class DailyRollupTests(TestCase):
+    """Test that rollups follow sale and expense writes"""
+
+    def setUp(self):
+        """Set up test data"""
+        caches['analytics'].clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.shop = Shop.objects.create(user=self.user, name='Main Shop')
+        self.stock = Stock.objects.create(
+            shop=self.shop,
+            user=self.user,
+            name='Shirts',
+            category='Clothing',
+            price=15000,
+            quantity_in_stock=100,
+        )
+        self.today = timezone.localdate()
+
+    def _sale(self, quantity=2, total=30000):
+        return Sale.objects.create(
+            shop=self.shop, stock=self.stock, user=self.user,
+            quantity=quantity, price_per_unit=15000, total_amount=total,
+        )
+
+    def _rollup(self, day):
+        return DailyRollup.objects.get(user=self.user, shop=self.shop, date=day)
+
+    def test_sale_create_updates_rollup(self):
+        """Creating sales adds to today's rollup"""
+        self._sale(quantity=2, total=30000)
+        self._sale(quantity=1, total=15000)
+
+        rollup = self._rollup(self.today)
+        self.assertEqual(rollup.income, Decimal('45000'))
+        self.assertEqual(rollup.sales_count, 2)
+        self.assertEqual(rollup.items_sold, 3)
+
+    def test_sale_update_and_delete(self):
+        """Updating a sale moves its totals; deleting removes them"""
+        sale = self._sale(quantity=2, total=30000)
+        yesterday = self.today - timedelta(days=1)
+
+        sale.created_at = sale.created_at - timedelta(days=1)
+        sale.total_amount = 20000
+        sale.save()
+
+        self.assertEqual(self._rollup(self.today).sales_count, 0)
+        self.assertEqual(self._rollup(self.today).income, Decimal('0'))
+        self.assertEqual(self._rollup(yesterday).income, Decimal('20000'))
+        self.assertEqual(self._rollup(yesterday).sales_count, 1)
+
+        sale.delete()
+        self.assertEqual(self._rollup(yesterday).sales_count, 0)
+        self.assertEqual(self._rollup(yesterday).items_sold, 0)
+
+    def test_expense_create_and_delete(self):
+        """Expenses are tracked in the same rollup row"""
+        expense = Expense.objects.create(
+            shop=self.shop, user=self.user, category='rent', description='Rent', amount=5000
+        )
+        self.assertEqual(self._rollup(self.today).expenses, Decimal('5000'))
+
+        expense.delete()
+        self.assertEqual(self._rollup(self.today).expenses, Decimal('0'))
+
+    def test_rebuild_command(self):
+        """rebuild_rollups recreates rows from the raw tables"""
+        sale = self._sale(quantity=4, total=60000)
+        Sale.objects.filter(pk=sale.pk).update(created_at=sale.created_at - timedelta(days=3))
+        DailyRollup.objects.all().delete()
+
+        call_command('rebuild_rollups', stdout=StringIO())
+
+        rollup = self._rollup(self.today - timedelta(days=3))
+        self.assertEqual(rollup.income, Decimal('60000'))
+        self.assertEqual(rollup.items_sold, 4)
+        self.assertEqual(DailyRollup.objects.count(), 1)
+
+    def test_report_data_reads_rollups(self):
+        """Closed days come from the rollup table, today from raw rows"""
+        DailyRollup.objects.create(
+            user=self.user, shop=self.shop, date=self.today - timedelta(days=2),
+            income=10000, expenses=2500, sales_count=3, items_sold=5,
+        )
+        self._sale(quantity=2, total=30000)
+        self.client.force_login(self.user)
+
+        response = self.client.get('/api/analytics/analytics/report_data/?type=weekly')
+        self.assertEqual(response.status_code, 200)
+        summary = json.loads(response.content)['summary']
+
+        self.assertEqual(Decimal(str(summary['total_income'])), Decimal('40000'))
+        self.assertEqual(Decimal(str(summary['total_expenses'])), Decimal('2500'))
+        self.assertEqual(summary['total_sales'], 4)
+        self.assertEqual(summary['total_items_sold'], 7)
+
+
+class DashboardTests(TestCase):
+    """Test the consolidated dashboard snapshot"""
+    
+    def setUp(self):
+        """Set up a shop with sales today and yesterday"""
+        cache.clear()
+        caches['analytics'].clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.shop = Shop.objects.create(user=self.user, name='Main Shop')
+        self.stock = Stock.objects.create(
+            shop=self.shop, user=self.user, name='Shirts', category='Clothing',
+            price=15000, cost_price=10000, quantity_in_stock=3, min_stock_level=5,
+        )
+        self.today = timezone.localdate()
+        Sale.objects.create(
+            shop=self.shop, stock=self.stock, user=self.user,
+            quantity=2, price_per_unit=15000, total_amount=30000, unit_cost=10000,
+        )
+        DailyRollup.objects.create(
+            user=self.user, shop=self.shop, date=self.today - timedelta(days=1),
+            income=45000, sales_count=3, items_sold=3,
+        )
+        self.client.force_login(self.user)
+    
+    def _get(self, url='/api/analytics/dashboard/'):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content), len(queries)
+    
+    def test_snapshot_sections(self):
+        """All sections come back from one request with a bounded query count"""
+        data, queries = self._get()
+        self.assertLessEqual(queries, 12)
+        self.assertEqual(data['shop'], self.shop.id)
+        self.assertEqual(data['today']['total_sales'], 1)
+        self.assertEqual(data['today']['total_amount'], 30000)
+        self.assertEqual(data['yesterday']['total_amount'], 45000)
+        self.assertEqual(data['summary']['total_sales'], 4)
+        self.assertEqual(data['low_stock']['warning_alerts'], 1)
+        self.assertEqual(data['profit_margin']['total_profit'], 10000)
+        self.assertEqual(data['inventory_health']['low_stock'], 1)
+        self.assertEqual(data['top_products'][0]['stock__name'], 'Shirts')
+        
+        data, _ = self._get('/api/analytics/dashboard/?sections=today,top_products')
+        self.assertEqual(set(data) - {'shop', 'generated_at'}, {'today', 'top_products'})
+        
+        response = self.client.get('/api/analytics/dashboard/?sections=weather')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_snapshot_is_cached_until_data_changes(self):
+        """Warm loads run no dashboard queries; a new sale retires the snapshot"""
+        first, _ = self._get()
+        second, queries = self._get()
+        self.assertEqual(queries, 2)  # session + user only
+        self.assertEqual(second['generated_at'], first['generated_at'])
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Sale.objects.create(
+                shop=self.shop, stock=self.stock, user=self.user,
+                quantity=1, price_per_unit=15000, total_amount=15000,
+            )
+        data, _ = self._get()
+        self.assertEqual(data['today']['total_sales'], 2)
+
+
+class MultiShopAnalyticsTests(TestCase):
+    """Test ?shops= selection and the group_by=shop breakdowns"""
+    
+    def setUp(self):
+        """Set up three shops with a sale, an expense and a stock each"""
+        caches['analytics'].clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.shops = []
+        for index, name in enumerate(['Alpha', 'Beta', 'Gamma'], start=1):
+            shop = Shop.objects.create(user=self.user, name=name)
+            stock = Stock.objects.create(
+                shop=shop, user=self.user, name=f'{name} Shirts', category='Clothing',
+                price=1000, quantity_in_stock=index - 1, min_stock_level=1,
+            )
+            Sale.objects.create(
+                shop=shop, stock=stock, user=self.user,
+                quantity=index, price_per_unit=1000, total_amount=1000 * index,
+            )
+            Expense.objects.create(shop=shop, user=self.user, category='rent', description='Rent', amount=100 * index)
+            self.shops.append(shop)
+        self.client.force_login(self.user)
+    
+    def _get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content), len(queries)
+    
+    def test_group_by_shop(self):
+        """Each endpoint returns per-shop figures and the combined total"""
+        data, _ = self._get('/api/analytics/analytics/profit_margin/?group_by=shop')
+        self.assertEqual([shop['shop_name'] for shop in data['shops']], ['Alpha', 'Beta', 'Gamma'])
+        self.assertEqual([shop['total_income'] for shop in data['shops']], [1000, 2000, 3000])
+        self.assertEqual(data['total']['total_income'], 6000)
+        self.assertEqual(data['total']['total_expenses'], 600)
+        self.assertEqual(data['total']['profit_margin_percent'], 90)
+        
+        data, _ = self._get('/api/analytics/analytics/report_data/?group_by=shop')
+        self.assertEqual(data['shops'][2]['summary']['total_sales'], 1)
+        self.assertEqual(data['total']['summary']['total_sales'], 3)
+        self.assertEqual(data['total']['summary']['total_stocks'], 3)
+        
+        data, _ = self._get('/api/analytics/analytics/top_products/?group_by=shop&limit=1')
+        self.assertEqual(data['shops'][1]['products'][0]['stock__name'], 'Beta Shirts')
+        self.assertEqual(data['total']['products'][0]['stock__name'], 'Gamma Shirts')
+        
+        data, _ = self._get('/api/analytics/analytics/inventory_health/?group_by=shop')
+        self.assertEqual(data['shops'][0]['critical_stock'], 1)
+        self.assertEqual(data['shops'][1]['low_stock'], 0)
+        self.assertEqual(data['total']['total_stocks'], 3)
+        self.assertEqual(data['total']['critical_stock'], 1)
+        
+        data, _ = self._get('/api/analytics/analytics/expense_breakdown/?group_by=shop')
+        self.assertEqual(data['shops'][2]['categories'][0]['total'], 300)
+        self.assertEqual(data['total']['categories'], [{'category': 'rent', 'total': 600, 'count': 3}])
+    
+    def test_shop_selection(self):
+        """?shops= limits the figures; unknown shops and bad parameters are rejected"""
+        ids = f'{self.shops[0].id},{self.shops[2].id}'
+        data, _ = self._get(f'/api/analytics/analytics/profit_margin/?shops={ids}')
+        self.assertEqual(data['total_income'], 4000)
+        
+        data, _ = self._get(f'/api/analytics/analytics/inventory_health/?shops={ids}&group_by=shop')
+        self.assertEqual([shop['shop_name'] for shop in data['shops']], ['Alpha', 'Gamma'])
+        
+        data, _ = self._get(f'/api/analytics/analytics/profit_margin/?shop={self.shops[1].id}')
+        self.assertEqual(data['total_income'], 2000)
+        
+        other = Shop.objects.create(user=User.objects.create_user(username='other'), name='Other')
+        response = self.client.get(f'/api/analytics/analytics/profit_margin/?shops={self.shops[0].id},{other.id}')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get('/api/analytics/analytics/profit_margin/?shops=one')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/analytics/analytics/profit_margin/?group_by=category')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_breakdown_queries_do_not_grow_with_shops(self):
+        """A breakdown of more shops runs the same number of queries"""
+        urls = [
+            f'/api/analytics/analytics/{name}/?group_by=shop'
+            for name in ('report_data', 'profit_margin', 'top_products', 'inventory_health', 'expense_breakdown')
+        ]
+        before = [self._get(url)[1] for url in urls]
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            shop = Shop.objects.create(user=self.user, name='Delta')
+            stock = Stock.objects.create(shop=shop, user=self.user, name='Hats', category='Clothing', price=500)
+            Sale.objects.create(shop=shop, stock=stock, user=self.user, quantity=1, price_per_unit=500, total_amount=500)
+        
+        after = [self._get(url)[1] for url in urls]
+        self.assertEqual(after, before)
+        data, _ = self._get('/api/analytics/analytics/profit_margin/?group_by=shop')
+        self.assertEqual(len(data['shops']), 4)
+
+
+class TimeseriesTests(TestCase):
+    """Test the bucketed, gap-filled chart series"""
+    
+    def setUp(self):
+        """Set up a closed rollup day and a live sale today"""
+        caches['analytics'].clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.shop = Shop.objects.create(user=self.user, name='Main Shop')
+        self.stock = Stock.objects.create(shop=self.shop, user=self.user, name='Shirts', category='Clothing', price=1000)
+        self.today = timezone.localdate()
+        self.sale = Sale.objects.create(
+            shop=self.shop, stock=self.stock, user=self.user,
+            quantity=2, price_per_unit=1000, total_amount=2000, unit_cost=600,
+        )
+        DailyRollup.objects.create(
+            user=self.user, shop=self.shop, date=self.today - timedelta(days=2),
+            income=5000, expenses=500, sales_count=4, items_sold=5,
+        )
+        self.client.force_login(self.user)
+    
+    def _get(self, query=''):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/analytics/timeseries/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content), len(queries)
+    
+    def test_daily_series_is_gap_filled(self):
+        """One value per day, zeros for quiet days, today from live rows"""
+        data, queries = self._get('metrics=income,net_profit')
+        self.assertLessEqual(queries, 5)  # session, user, rollups, today's sales and expenses
+        self.assertEqual(len(data['buckets']), 30)
+        self.assertEqual(data['buckets'][-1], self.today.isoformat())
+        self.assertEqual(data['series']['income'][-1], 2000)
+        self.assertEqual(data['series']['income'][-3], 5000)
+        self.assertEqual(data['series']['income'][-2], 0)
+        self.assertEqual(data['series']['net_profit'][-1], 800)
+        self.assertEqual(data['series']['net_profit'][-3], 4500)
+    
+    def test_week_and_month_buckets(self):
+        """Longer buckets add up the days they contain"""
+        start = (self.today - timedelta(days=40)).isoformat()
+        data, _ = self._get(f'granularity=month&metrics=sales_count&start_date={start}')
+        self.assertEqual(data['buckets'][-1], self.today.replace(day=1).isoformat())
+        self.assertEqual(sum(data['series']['sales_count']), 5)
+        
+        data, _ = self._get('granularity=week&metrics=sales_count')
+        self.assertEqual(len(data['buckets']), 12)
+        self.assertEqual(sum(data['series']['sales_count']), 5)
+    
+    def test_hourly_series(self):
+        """Hourly buckets come from raw rows in local time"""
+        hour = timezone.localtime().replace(hour=9, minute=15, second=0, microsecond=0)
+        Sale.objects.filter(pk=self.sale.pk).update(created_at=hour)
+        data, _ = self._get('granularity=hour&metrics=income,sales_count')
+        self.assertEqual(len(data['buckets']), 24)
+        self.assertEqual(data['series']['income'][9], 2000)
+        self.assertEqual(sum(data['series']['sales_count']), 1)
+    
+    def test_invalid_parameters(self):
+        """Unknown metrics, granularities, dates and long ranges are rejected"""
+        for query in ('metrics=weather', 'granularity=minute', 'start_date=yesterday',
+                      'granularity=hour&start_date=2000-01-01'):
+            response = self.client.get(f'/api/analytics/timeseries/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+
+class AnalyticsCacheTests(TestCase):
+    """Test the analytics response cache and its invalidation"""
+    
+    def setUp(self):
+        """Set up a shop with one sale"""
+        caches['analytics'].clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.shop = Shop.objects.create(user=self.user, name='Main Shop')
+        self.stock = Stock.objects.create(
+            shop=self.shop, user=self.user, name='Shirts', category='Clothing', price=1000, quantity_in_stock=10,
+        )
+        Sale.objects.create(shop=self.shop, stock=self.stock, user=self.user,
+                            quantity=1, price_per_unit=1000, total_amount=1000)
+        self.client.force_login(self.user)
+    
+    def _get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+    
+    def test_repeat_requests_are_served_from_cache(self):
+        """The second identical request runs no analytics queries; other params miss"""
+        first, _ = self._get('/api/analytics/analytics/profit_margin/')
+        second, queries = self._get('/api/analytics/analytics/profit_margin/')
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(queries, 2)  # session + user only
+        self.assertEqual(json.loads(second.content), json.loads(first.content))
+        
+        response, _ = self._get(f'/api/analytics/analytics/profit_margin/?shop={self.shop.id}')
+        self.assertEqual(response['X-Cache'], 'MISS')
+    
+    def test_writes_invalidate_cached_responses(self):
+        """Sale, Expense and Stock writes retire the user's cached responses once committed"""
+        url = '/api/analytics/analytics/report_data/'
+        self._get(url)
+        writes = [
+            lambda: Sale.objects.create(shop=self.shop, stock=self.stock, user=self.user,
+                                        quantity=1, price_per_unit=1000, total_amount=1000),
+            lambda: Expense.objects.create(shop=self.shop, user=self.user, category='rent',
+                                           description='Rent', amount=200),
+            lambda: Stock.objects.create(shop=self.shop, user=self.user, name='Hats', category='Clothing', price=50),
+        ]
+        for write in writes:
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            response, _ = self._get(url)
+            self.assertEqual(response['X-Cache'], 'MISS')
+        
+        summary = json.loads(response.content)['summary']
+        self.assertEqual(summary['total_sales'], 2)
+        self.assertEqual(summary['total_expenses'], 200)
+        self.assertEqual(summary['total_stocks'], 2)
+
+    def test_stock_record_sale_invalidates_cached_responses(self):
+        """record_sale updates stock without a post_save and still retires cached responses"""
+        url = '/api/analytics/analytics/inventory_health/'
+        response, _ = self._get(url)
+        self.assertEqual(json.loads(response.content)['critical_stock'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/stocks/{self.stock.id}/record_sale/', {'quantity': 10})
+        self.assertEqual(response.status_code, 200)
+
+        response, _ = self._get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(json.loads(response.content)['critical_stock'], 1)
+
+    def test_cache_stats(self):
+        """Hit and miss counters are exposed to staff"""
+        for _ in range(3):
+            self._get('/api/analytics/analytics/inventory_health/')
+        response = self.client.get('/api/analytics/analytics/cache_stats/')
+        self.assertEqual(response.status_code, 403)
+        
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/api/analytics/analytics/cache_stats/')
+        self.assertEqual(json.loads(response.content)['inventory_health'], {'hits': 2, 'misses': 1})
+
+
+class LeaderboardTests(TestCase):
+    """Test the product leaderboard kept up to date on each sale"""
+    
+    def setUp(self):
+        """Set up two shops that both sell 'Shirts'"""
+        caches['analytics'].clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.shop = Shop.objects.create(user=self.user, name='Main Shop')
+        self.branch = Shop.objects.create(user=self.user, name='Branch')
+        self.shirts = Stock.objects.create(shop=self.shop, user=self.user, name='Shirts', category='Clothing', price=1000)
+        self.branch_shirts = Stock.objects.create(
+            shop=self.branch, user=self.user, name='Shirts', category='Clothing', price=1000
+        )
+        self.today = timezone.localdate()
+        self.client.force_login(self.user)
+    
+    def _sale(self, stock, quantity, total):
+        return Sale.objects.create(
+            shop=stock.shop, stock=stock, user=self.user,
+            quantity=quantity, price_per_unit=1000, total_amount=total,
+        )
+    
+    def _top(self, query=''):
+        response = self.client.get(f'/api/analytics/analytics/top_products/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+    
+    def test_sales_maintain_period_rows(self):
+        """Each sale adjusts the day, week, month and all-time rows of its stock"""
+        sale = self._sale(self.shirts, 2, 2000)
+        self._sale(self.shirts, 1, 1000)
+        rows = ProductRollup.objects.filter(stock=self.shirts)
+        self.assertEqual(sorted(rows.values_list('period', flat=True)), ['all', 'day', 'month', 'week'])
+        self.assertTrue(all(row.revenue == 3000 and row.items_sold == 3 and row.sales_count == 2 for row in rows))
+        
+        sale.stock = self.branch_shirts
+        sale.save()
+        self.assertEqual(ProductRollup.objects.get(stock=self.shirts, period='all').revenue, 1000)
+        self.assertEqual(ProductRollup.objects.get(stock=self.branch_shirts, period='week').revenue, 2000)
+        
+        sale.delete()
+        self.assertEqual(ProductRollup.objects.get(stock=self.branch_shirts, period='day').sales_count, 0)
+        
+        self.shirts.delete()
+        self.assertFalse(ProductRollup.objects.filter(stock_id=self.shirts.id).exists())
+    
+    def test_same_name_products_stay_apart(self):
+        """Stock items are ranked separately even when their names match"""
+        self._sale(self.shirts, 1, 1000)
+        self._sale(self.branch_shirts, 3, 3000)
+        
+        top = self._top()
+        self.assertEqual([(row['stock_id'], row['total_revenue']) for row in top],
+                         [(self.branch_shirts.id, 3000), (self.shirts.id, 1000)])
+        
+        data = self._top('group_by=shop&limit=1')
+        self.assertEqual(data['shops'][0]['products'][0]['stock_id'], self.branch_shirts.id)
+        self.assertEqual(data['shops'][1]['products'][0]['stock_id'], self.shirts.id)
+    
+    def test_period_windows(self):
+        """?period= ranks the current day, week, month or all time"""
+        old = self._sale(self.shirts, 5, 5000)
+        Sale.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=40))
+        self._sale(self.branch_shirts, 1, 1000)
+        call_command('rebuild_rollups', stdout=StringIO())
+        
+        self.assertEqual([row['stock_id'] for row in self._top('period=all')], [self.shirts.id, self.branch_shirts.id])
+        self.assertEqual([row['stock_id'] for row in self._top('period=day')], [self.branch_shirts.id])
+        self.assertEqual([row['stock_id'] for row in self._top('period=month')], [self.branch_shirts.id])
+        response = self.client.get('/api/analytics/analytics/top_products/?period=year')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_limit_is_validated_and_clamped(self):
+        """?limit= must be an integer and is kept between 1 and MAX_TOP_PRODUCTS"""
+        self._sale(self.shirts, 1, 1000)
+        self._sale(self.branch_shirts, 3, 3000)
+    
+        response = self.client.get('/api/analytics/analytics/top_products/?limit=abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(self._top('limit=-1')), 1)
+        self.assertEqual(len(self._top('limit=0')), 1)
+        self.assertEqual(len(self._top('limit=1000000')), 2)
+    
+    def test_leaderboard_is_an_index_scan(self):
+        """Reading the leaderboard does not touch the sales table"""
+        self._sale(self.shirts, 1, 1000)
+        with CaptureQueriesContext(connection) as queries:
+            self._top()
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('sales_sale', sql)
+        
+        plan = leaderboard._rows(self.user, 'week').order_by('-revenue')[:5].explain()
+        if connection.vendor == 'sqlite':
+            self.assertIn('USING INDEX', plan)
+
+
+class InventoryHealthTests(TestCase):
+    """Test the single-pass inventory health figures"""
+    
+    def setUp(self):
+        """Set up empty, low, healthy and overstocked items in two categories"""
+        caches['analytics'].clear()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.shop = Shop.objects.create(user=self.user, name='Main Shop')
+        for name, category, quantity in [('Shirts', 'Clothing', 0), ('Hats', 'Clothing', 3),
+                                         ('Soap', 'Household', 20), ('Brooms', 'Household', 60)]:
+            Stock.objects.create(
+                shop=self.shop, user=self.user, name=name, category=category,
+                price=100, cost_price=60, quantity_in_stock=quantity, min_stock_level=10,
+            )
+        self.client.force_login(self.user)
+    
+    def _get(self, query=''):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/analytics/analytics/inventory_health/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content), len(queries)
+    
+    def test_figures_in_one_query(self):
+        """Empty items count as critical only; overstock and valuation come from the same query"""
+        data, queries = self._get()
+        self.assertEqual(queries, 3)  # session, user, aggregate
+        self.assertEqual(data['total_stocks'], 4)
+        self.assertEqual(data['critical_stock'], 1)
+        self.assertEqual(data['low_stock'], 1)
+        self.assertEqual(data['overstock'], 1)
+        self.assertEqual(data['health_percent'], 50)
+        self.assertEqual(data['inventory_value'], 8300)
+        self.assertEqual(data['inventory_cost'], 4980)
+    
+    def test_category_breakdown(self):
+        """?breakdown=category adds per-category figures without another query"""
+        data, queries = self._get('breakdown=category')
+        self.assertEqual(queries, 3)
+        self.assertEqual(data['total_stocks'], 4)
+        clothing, household = data['by_category']
+        self.assertEqual((clothing['category'], clothing['critical_stock'], clothing['low_stock']), ('Clothing', 1, 1))
+        self.assertEqual((household['overstock'], household['health_percent']), (1, 100))
+        
+        data, _ = self._get('breakdown=category&group_by=shop')
+        self.assertEqual(data['shops'][0]['by_category'][1]['inventory_value'], 8000)
+        
+        response = self.client.get('/api/analytics/analytics/inventory_health/?breakdown=colour')
+        self.assertEqual(response.status_code, 400)
+
+
+class BenchmarkApiTests(TestCase):
+    """Smoke test for the API benchmark command"""
+    
+    def test_every_endpoint_answers(self):
+        """One request per endpoint against a small seed; all succeed and the seed is rolled back"""
+        caches['analytics'].clear()
+        out = StringIO()
+        call_command(
+            'benchmark_api', '--users', '1', '--shops', '1', '--stocks', '5', '--sales', '20',
+            '--expenses', '5', '--days', '3', '--requests', '1', stdout=out,
+        )
+        report = json.loads(out.getvalue())
+        
+        self.assertEqual(list(report['endpoints']), [endpoint[0] for endpoint in benchmark_api.ENDPOINTS])
+        for name, figures in report['endpoints'].items():
+            self.assertEqual(figures['errors'], 0, name)
+            self.assertTrue(all(200 <= int(code) < 300 for code in figures['status_codes']), (name, figures))
+        self.assertFalse(User.objects.filter(username__startswith='bench-').exists())
+        self.assertFalse(Sale.objects.exists())
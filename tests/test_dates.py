@@ -0,0 +1,89 @@
+"""
+Tests for local-day date ranges and the index usage they allow
+"""
+from datetime import date, datetime, timezone as dt_timezone
+from unittest import mock
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, Client
+from django.contrib.auth.models import User
+from django.utils import timezone
+from config.dates import day_range, on_day
+from reports.builder import report_period
+from expenses.models import Expense
+from sales.models import Sale
+from shops.models import Shop
+
+
+class DayRangeTests(TestCase):
+    """Test local-day boundaries"""
+    
+    def test_nairobi_day_in_utc(self):
+        """A local day starts at 21:00 UTC the evening before"""
+        start, end = day_range(date(2025, 3, 10))
+        self.assertEqual(start, datetime(2025, 3, 9, 21, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(end, datetime(2025, 3, 10, 21, 0, tzinfo=dt_timezone.utc))
+    
+    def test_on_day_is_half_open(self):
+        """Rows at local midnight belong to the day that starts there"""
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        shop = Shop.objects.create(user=user, name='Main Shop')
+        for moment in ('2025-03-09T20:59:59+00:00', '2025-03-09T21:00:00+00:00',
+                       '2025-03-10T20:59:59+00:00', '2025-03-10T21:00:00+00:00'):
+            expense = Expense.objects.create(shop=shop, user=user, category='other', description=moment, amount=1)
+            Expense.objects.filter(pk=expense.pk).update(created_at=datetime.fromisoformat(moment))
+        
+        rows = on_day(Expense.objects.all(), date(2025, 3, 10))
+        self.assertEqual(
+            sorted(rows.values_list('description', flat=True)),
+            ['2025-03-09T21:00:00+00:00', '2025-03-10T20:59:59+00:00']
+        )
+
+    
+    def test_report_periods_end_on_the_local_day(self):
+        """Just after local midnight (still the previous day in UTC) reports end today"""
+        caches['analytics'].clear()
+        client = Client()
+        client.force_login(User.objects.create_user(username='testuser', password='testpass123'))
+        after_midnight = datetime(2025, 3, 10, 22, 30, tzinfo=dt_timezone.utc)  # 01:30 on 11 March in Nairobi
+        
+        with mock.patch('django.utils.timezone.now', return_value=after_midnight):
+            self.assertEqual(report_period('daily'), (date(2025, 3, 11), date(2025, 3, 11)))
+            self.assertEqual(report_period('weekly'), (date(2025, 3, 4), date(2025, 3, 11)))
+            response = client.get('/api/analytics/analytics/report_data/?type=weekly')
+        
+        self.assertEqual(response.json()['date_range'], {'start': '2025-03-04', 'end': '2025-03-11'})
+
+
+class DayRangeIndexTests(TestCase):
+    """EXPLAIN the period filters and check they use the created_at indexes"""
+    
+    def _plan(self, queryset):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would always be scanned sequentially otherwise
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+    
+    def assertUsesCreatedAtIndex(self, queryset):
+        plan = self._plan(queryset)
+        if connection.vendor == 'sqlite':
+            self.assertIn('USING INDEX', plan)
+            self.assertIn('created_at>?', plan.replace(' ', ''))
+        elif connection.vendor == 'postgresql':
+            self.assertIn('Index', plan)
+            self.assertNotIn('Seq Scan', plan)
+    
+    def test_period_filters_use_indexes(self):
+        """Sales and expense day filters are index range scans"""
+        today = timezone.localdate()
+        self.assertUsesCreatedAtIndex(on_day(Sale.objects.filter(user_id=1, shop_id=1), today))
+        self.assertUsesCreatedAtIndex(on_day(Sale.objects.filter(user_id=1), today))
+        self.assertUsesCreatedAtIndex(on_day(Expense.objects.filter(user_id=1), today))
+    
+    def test_date_lookup_cannot_use_the_index(self):
+        """The old created_at__date form needs a per-row conversion"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('plan text checked on SQLite only')
+        plan = self._plan(Sale.objects.filter(user_id=1, created_at__date=timezone.localdate()))
+        self.assertNotIn('created_at>?', plan.replace(' ', ''))
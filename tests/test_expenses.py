@@ -0,0 +1,86 @@
+"""
+Tests for expense summary endpoints
+"""
+from datetime import timedelta
+from decimal import Decimal
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.db import connection
+from django.utils import timezone
+from expenses.models import Expense
+from shops.models import Shop
+import json
+
+
+class ExpenseSummaryTests(TestCase):
+    """Test that expense summaries are aggregated in SQL"""
+    
+    def setUp(self):
+        """Set up expenses today and ten days ago"""
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.shop = Shop.objects.create(user=self.user, name='Main Shop')
+        for category, amount in (('rent', 5000), ('rent', 1000), ('transport', 250)):
+            Expense.objects.create(
+                shop=self.shop, user=self.user, category=category, description=category, amount=amount
+            )
+        old = Expense.objects.create(
+            shop=self.shop, user=self.user, category='salary', description='Salary', amount=20000
+        )
+        # save() (not a queryset update) so the daily rollups follow the move
+        old.created_at = timezone.now() - timedelta(days=10)
+        old.save()
+        self.client.force_login(self.user)
+    
+    def _get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # session + user, then the endpoint's own queries
+        return json.loads(response.content), len(queries) - 2
+    
+    def test_summary_reads_the_rollups(self):
+        """summary reads closed days from the rollups and honours the date range"""
+        # closed rollup days, then today's sales and expenses
+        data, queries = self._get('/api/expenses/summary/')
+        self.assertEqual(queries, 3)
+        self.assertEqual(data['count'], 4)
+        self.assertEqual(Decimal(str(data['total_expenses'])), Decimal('26250'))
+        
+        start = (timezone.localdate() - timedelta(days=2)).isoformat()
+        data, _ = self._get(f'/api/expenses/summary/?start_date={start}')
+        self.assertEqual(data['count'], 3)
+        self.assertAlmostEqual(float(data['average']), 6250 / 3, places=2)
+        
+        data, _ = self._get(f'/api/expenses/summary/?end_date={start}')
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(Decimal(str(data['total_expenses'])), Decimal('20000'))
+        
+        other = Shop.objects.create(user=self.user, name='Branch')
+        data, _ = self._get(f'/api/expenses/summary/?shop={other.id}')
+        self.assertEqual(data['count'], 0)
+        self.assertEqual(self.client.get('/api/expenses/summary/?shop=abc').status_code, 400)
+    
+    def test_by_category_groups_in_sql(self):
+        """by_category issues one grouped query"""
+        data, queries = self._get('/api/expenses/by_category/?type=weekly')
+        self.assertEqual(queries, 1)
+        self.assertEqual(data['by_category']['rent'], {'count': 2, 'total': 6000.0})
+        self.assertNotIn('salary', data['by_category'])
+        self.assertEqual(Decimal(str(data['total'])), Decimal('6250'))
+    
+    def test_daily_summary(self):
+        """daily_summary totals today's expenses"""
+        data, _ = self._get('/api/expenses/daily_summary/')
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(len(data['expenses']), 3)
+        self.assertEqual(Decimal(str(data['by_category']['rent'])), Decimal('6000'))
+    
+    def test_invalid_date(self):
+        """Malformed dates are rejected"""
+        response = self.client.get('/api/expenses/summary/?start_date=yesterday')
+        self.assertEqual(response.status_code, 400)
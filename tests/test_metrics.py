@@ -0,0 +1,84 @@
+"""
+Tests for the request metrics middleware and /api/metrics/
+"""
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth.models import User
+from config import instrumentation
+from inventory.models import Stock
+from shops.models import Shop
+import json
+
+
+@override_settings(REQUEST_METRICS=True)
+class RequestMetricsTests(TestCase):
+    """Test per-request instrumentation"""
+
+    def setUp(self):
+        """Set up test data"""
+        instrumentation.reset()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.admin = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        self.shop = Shop.objects.create(user=self.user, name='Main Shop')
+        for i in range(3):
+            Stock.objects.create(shop=self.shop, user=self.user, name=f'Item {i}', price=1000, quantity_in_stock=10)
+        self.client.force_login(self.user)
+
+    def test_server_timing_header(self):
+        """Test responses carry DB time, query count and total time"""
+        with self.assertLogs('config.instrumentation', 'INFO') as logs:
+            response = self.client.get('/api/stocks/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", app;dur=[\d.]+, total;dur=[\d.]+$')
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        self.assertEqual(line['path'], '/api/stocks/')
+        self.assertEqual(line['status'], 200)
+        self.assertGreater(line['queries'], 0)
+        self.assertEqual(line['bytes'], len(response.content))
+        self.assertIn(f'desc="{line["queries"]} queries"', response['Server-Timing'])
+
+    @override_settings(REQUEST_METRICS=False)
+    def test_disabled_by_default(self):
+        """Test the middleware stays out of the chain when REQUEST_METRICS is off"""
+        response = self.client.get('/api/stocks/')
+
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(instrumentation.stats(), {})
+
+    @override_settings(REQUEST_METRICS_MAX_QUERIES=1, REQUEST_METRICS_SLOW_QUERY_MS=0)
+    def test_slow_request_logged_with_sql(self):
+        """Test requests over the query threshold are logged as warnings with their SQL"""
+        with self.assertLogs('config.instrumentation', 'WARNING') as logs:
+            self.client.get('/api/stocks/')
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['slow'], ['queries'])
+        self.assertTrue(line['slow_queries'])
+        self.assertTrue(all('SELECT' in query['sql'] for query in line['slow_queries']))
+
+    def test_metrics_endpoint(self):
+        """Test per-endpoint totals are served to staff only"""
+        with self.assertLogs('config.instrumentation', 'INFO'):
+            self.client.get('/api/stocks/')
+            self.client.get('/api/stocks/')
+            response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(self.admin)
+        with self.assertLogs('config.instrumentation', 'INFO'):
+            response = self.client.get('/api/metrics/')
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['enabled'])
+        stocks = data['endpoints']['GET stock-list']
+        self.assertEqual(stocks['requests'], 2)
+        self.assertGreater(stocks['avg_queries'], 0)
+        self.assertEqual(stocks['queries'], stocks['avg_queries'] * 2)
+
+        with self.assertLogs('config.instrumentation', 'INFO'):
+            response = self.client.delete('/api/metrics/')
+        self.assertEqual(response.status_code, 204)
+        self.assertNotIn('GET stock-list', instrumentation.stats())
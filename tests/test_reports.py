@@ -0,0 +1,344 @@
+"""
+Tests for report generation
+"""
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.db import connection
+from inventory.models import Stock
+from reports.models import ReportJob, UploadedFile
+from sales.models import Sale
+from shops.models import Shop
+from io import StringIO
+from pathlib import Path
+import hashlib
+import json
+import shutil
+import tempfile
+
+
+class ReportGenerationTests(TestCase):
+    """Test PDF and DOCX report generation"""
+    
+    # session + user, data version (2), period totals (3), stock count, daily totals (3), sales details
+    REPORT_QUERIES = 12
+    
+    def setUp(self):
+        """Set up test data and a throwaway report cache"""
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        override = override_settings(REPORT_CACHE_DIR=self.cache_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.shop = Shop.objects.create(user=self.user, name='Main Shop')
+        self.client.force_login(self.user)
+    
+    def _add_products(self, count):
+        for i in range(Stock.objects.count(), Stock.objects.count() + count):
+            stock = Stock.objects.create(
+                shop=self.shop,
+                user=self.user,
+                name=f'Product {i}',
+                category='General',
+                price=1000 + i,
+                quantity_in_stock=100
+            )
+            Sale.objects.create(
+                shop=self.shop, stock=stock, user=self.user,
+                quantity=2, price_per_unit=1000 + i, total_amount=2 * (1000 + i)
+            )
+    
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+    
+    def test_report_query_count_is_independent_of_products(self):
+        """Building a report issues the same number of queries for 3 or 30 products"""
+        for report_format in ('pdf', 'docx'):
+            url = f'/api/reports/reports/generate/?period=weekly&format={report_format}'
+            self._add_products(3)
+            small = self._count_queries(url)
+            self._add_products(27)
+            large = self._count_queries(url)
+            self.assertEqual(small, large, report_format)
+            self.assertEqual(large, self.REPORT_QUERIES, report_format)
+    
+    def test_docx_report(self):
+        """format=docx returns a Word document"""
+        self._add_products(2)
+        response = self.client.get('/api/reports/reports/generate/?period=daily&format=docx')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Type'],
+            'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+        )
+    
+    def test_report_is_cached_until_data_changes(self):
+        """Repeat requests are served from the cache and honour If-None-Match"""
+        self._add_products(2)
+        url = '/api/reports/reports/generate/?period=weekly&format=pdf'
+        
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        
+        # Hit: session + user + data version only, same bytes
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(url)
+        self.assertEqual(len(queries), 4)
+        self.assertEqual(second['ETag'], etag)
+        self.assertEqual(second.content, first.content)
+        
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        
+        # A new sale in the range changes the data version
+        self._add_products(1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        
+        # The new version replaced the old file instead of adding to it
+        key = response['ETag'].strip('"')
+        files = [path.name for path in Path(self.cache_dir).rglob('*.pdf')]
+        self.assertEqual(files, [f'{key}.pdf'])
+    
+    def test_shop_parameter_is_validated(self):
+        """?shop= must be one of the user's shops"""
+        other = User.objects.create_user(username='other', password='testpass123')
+        other_shop = Shop.objects.create(user=other, name='Other Shop')
+        url = '/api/reports/reports/generate/?period=daily&format=pdf'
+        
+        self.assertEqual(self.client.get(f'{url}&shop=abc').status_code, 400)
+        self.assertEqual(self.client.get(f'{url}&shop={other_shop.id}').status_code, 404)
+        response = self.client.get(f'{url}&shop={self.shop.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], self.client.get(url)['ETag'])
+
+
+class ReportJobTests(TestCase):
+    """Test queued report rendering"""
+    
+    def setUp(self):
+        """Set up test data and a throwaway media directory"""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root, REPORT_CACHE_DIR=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_login(self.user)
+    
+    def test_job_is_queued_then_rendered(self):
+        """POST queues a job; the worker renders it into an uploaded file"""
+        response = self.client.post(
+            '/api/reports/reports/jobs/',
+            data=json.dumps({'period': 'custom', 'format': 'docx',
+                             'start_date': '2025-01-01', 'end_date': '2025-12-31'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 202)
+        job = json.loads(response.content)
+        self.assertEqual(job['status'], 'queued')
+        self.assertIsNone(job['file'])
+        
+        call_command('run_report_worker', '--once', stdout=StringIO())
+        
+        response = self.client.get(f"/api/reports/reports/jobs/{job['id']}/")
+        self.assertEqual(response.status_code, 200)
+        job = json.loads(response.content)
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['file']['file_type'], 'docx')
+        self.assertGreater(job['file']['file_size'], 0)
+    
+    def test_job_for_one_shop(self):
+        """A job renders the same report as generate for that shop"""
+        shop = Shop.objects.create(user=self.user, name='Main Shop')
+        other_shop = Shop.objects.create(user=User.objects.create_user(username='other'), name='Other Shop')
+        body = {'period': 'weekly', 'format': 'pdf'}
+        
+        response = self.client.post('/api/reports/reports/jobs/', data=dict(body, shop=other_shop.id))
+        self.assertEqual(response.status_code, 400)
+        
+        generated = self.client.get(f'/api/reports/reports/generate/?period=weekly&format=pdf&shop={shop.id}')
+        response = self.client.post('/api/reports/reports/jobs/', data=dict(body, shop=shop.id))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(json.loads(response.content)['shop'], shop.id)
+        
+        call_command('run_report_worker', '--once', stdout=StringIO())
+        job = ReportJob.objects.get()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.result.content_hash, hashlib.sha256(generated.content).hexdigest())
+    
+    def test_job_status_is_private(self):
+        """Users cannot poll other users' jobs"""
+        other = User.objects.create_user(username='other', password='testpass123')
+        job = ReportJob.objects.create(user=other, start_date='2025-01-01', end_date='2025-01-01')
+        
+        response = self.client.get(f'/api/reports/reports/jobs/{job.id}/')
+        self.assertEqual(response.status_code, 404)
+
+
+class FileDownloadTests(TestCase):
+    """Test streamed downloads of stored report files"""
+    
+    def setUp(self):
+        """Store one file in a throwaway media directory"""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+        
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_login(self.user)
+        self.body = bytes(range(256)) * 1024
+        self.file = UploadedFile.objects.create(user=self.user, file=ContentFile(self.body, name='report.pdf'))
+        self.url = f'/api/reports/reports/download_file/?file_id={self.file.id}'
+    
+    def test_full_download_is_streamed(self):
+        """Whole-file downloads stream instead of buffering the body"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(b''.join(response.streaming_content), self.body)
+    
+    def test_range_requests(self):
+        """Single byte ranges return 206; ranges past the end return 416"""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1000-1999')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1999/{len(self.body)}')
+        self.assertEqual(b''.join(response.streaming_content), self.body[1000:2000])
+        
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.body[-10:])
+        
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.body)}-')
+        self.assertEqual(response.status_code, 416)
+    
+    @override_settings(REPORT_DOWNLOAD_OFFLOAD='x-accel-redirect', REPORT_DOWNLOAD_ACCEL_PREFIX='/protected-media/')
+    def test_accel_redirect_offload(self):
+        """With offload enabled the body is left to nginx"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.file.file.name}')
+        self.assertEqual(response.content, b'')
+
+
+class ChunkedUploadTests(TestCase):
+    """Test resumable chunked uploads and content deduplication"""
+    
+    def setUp(self):
+        """Set up a user and throwaway media/temp directories"""
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root, REPORT_UPLOAD_TMP_DIR=self.media_root + '/tmp')
+        override.enable()
+        self.addCleanup(override.disable)
+        
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.force_login(self.user)
+        self.body = b'%PDF-1.4 ' + bytes(range(256)) * 400
+        self.checksum = hashlib.sha256(self.body).hexdigest()
+    
+    def _start(self, checksum=None):
+        return self.client.post(
+            '/api/reports/reports/uploads/',
+            data=json.dumps({'filename': 'report.pdf', 'size': len(self.body),
+                             'checksum': checksum or self.checksum}),
+            content_type='application/json'
+        )
+    
+    def _put(self, session_id, offset, data):
+        return self.client.put(
+            f'/api/reports/reports/uploads/{session_id}/chunk/?offset={offset}',
+            data=data, content_type='application/octet-stream'
+        )
+    
+    def _upload(self):
+        session = json.loads(self._start().content)
+        half = len(self.body) // 2
+        self._put(session['id'], 0, self.body[:half])
+        self._put(session['id'], half, self.body[half:])
+        return self.client.post(f"/api/reports/reports/uploads/{session['id']}/complete/")
+    
+    def test_chunked_upload_resumes_and_completes(self):
+        """Chunks must arrive at the server's offset; completion verifies the checksum"""
+        response = self._start()
+        self.assertEqual(response.status_code, 201)
+        session_id = json.loads(response.content)['id']
+        
+        self.assertEqual(self._put(session_id, 0, self.body[:1000]).status_code, 200)
+        # A resend of a chunk the server already has is rejected with the real offset
+        response = self._put(session_id, 0, self.body[:1000])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(json.loads(response.content)['received'], 1000)
+        
+        status = json.loads(self.client.get(f'/api/reports/reports/uploads/{session_id}/').content)
+        self.assertEqual(status['received'], 1000)
+        self._put(session_id, status['received'], self.body[1000:])
+        
+        response = self.client.post(f'/api/reports/reports/uploads/{session_id}/complete/')
+        self.assertEqual(response.status_code, 201)
+        uploaded = UploadedFile.objects.get(id=json.loads(response.content)['file']['id'])
+        self.assertEqual(uploaded.content_hash, self.checksum)
+        self.assertEqual(uploaded.file_size, len(self.body))
+        with uploaded.file.open('rb') as f:
+            self.assertEqual(f.read(), self.body)
+    
+    def test_checksum_mismatch_restarts(self):
+        """A wrong checksum stores nothing and resets the session"""
+        session_id = json.loads(self._start(checksum='0' * 64).content)['id']
+        self._put(session_id, 0, self.body)
+        
+        response = self.client.post(f'/api/reports/reports/uploads/{session_id}/complete/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.content)['received'], 0)
+        self.assertFalse(UploadedFile.objects.exists())
+    
+    def test_identical_content_is_deduplicated(self):
+        """Re-uploads skip the transfer; other users share the stored blob"""
+        self.assertEqual(self._upload().status_code, 201)
+        original = UploadedFile.objects.get()
+        
+        response = self._start()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['file']['id'], original.id)
+        
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.client.force_login(other)
+        self.assertEqual(self._start().status_code, 201)
+        self.assertEqual(self._upload().status_code, 201)
+        copy = UploadedFile.objects.get(user=other)
+        self.assertEqual(copy.file.name, original.file.name)
+        
+        # Deleting one record keeps the blob the other still uses
+        self.client.delete(f'/api/reports/reports/delete_file/?file_id={copy.id}')
+        self.assertTrue(original.file.storage.exists(original.file.name))
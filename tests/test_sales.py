@@ -1,10 +1,17 @@
 """
 Tests for sales and stock alert endpoints
 """
-from django.test import TestCase, Client
+from datetime import timedelta
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
-from inventory.models import Stock
+from django.db import connection
+from django.utils import timezone
+from inventory.models import Stock, StockHistory
+from shops.models import Shop
 from sales.models import Sale
+from concurrent.futures import ThreadPoolExecutor
 import json
 
 
@@ -18,9 +25,11 @@ class StockAlertTests(TestCase):
             username='testuser',
             password='testpass123'
         )
+        self.shop = Shop.objects.create(user=self.user, name='Main Shop')
         
         # Create test stocks
         self.stock1 = Stock.objects.create(
+            shop=self.shop,
             user=self.user,
             name='Shirts',
             category='Clothing',
@@ -31,6 +40,7 @@ class StockAlertTests(TestCase):
         )
         
         self.stock2 = Stock.objects.create(
+            shop=self.shop,
             user=self.user,
             name='Shoes',
             category='Footwear',
@@ -41,6 +51,7 @@ class StockAlertTests(TestCase):
         )
         
         self.stock3 = Stock.objects.create(
+            shop=self.shop,
             user=self.user,
             name='Hats',
             category='Accessories',
@@ -110,8 +121,10 @@ class StockAlertTests(TestCase):
             username='testuser2',
             password='testpass123'
         )
+        shop2 = Shop.objects.create(user=user2, name='Main Shop')
         
         Stock.objects.create(
+            shop=shop2,
             user=user2,
             name='Pants',
             category='Clothing',
@@ -139,6 +152,104 @@ class StockAlertTests(TestCase):
         self.assertEqual(data['warning_alerts'], 0)
         self.assertEqual(len(data['items']), 0)
 
+    
+    def test_low_stock_alerts_order(self):
+        """Critical alerts come first, then by largest deficit"""
+        self.client.force_login(self.user)
+        response = self.client.get('/api/sales/low_stock_alerts/')
+        data = json.loads(response.content)
+        
+        self.assertEqual(
+            [(item['product_name'], item['alert_level']) for item in data['items']],
+            [('Hats', 'critical'), ('Shoes', 'warning')]
+        )
+        self.assertEqual(data['items'][1]['stock_deficit'], 5)
+    
+    def test_inventory_low_stock_endpoint(self):
+        """The inventory low_stock list shares the same alert query"""
+        self.client.force_login(self.user)
+        response = self.client.get('/api/stocks/low_stock/')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([item['name'] for item in data['results']], ['Hats', 'Shoes'])
+
+class StockListTests(TestCase):
+    """Test the stock list payload and optional history expansion"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.shop = Shop.objects.create(user=self.user, name='Main Shop')
+        self.client.force_login(self.user)
+    
+    def _add_stocks(self, count):
+        for i in range(Stock.objects.count(), Stock.objects.count() + count):
+            stock = Stock.objects.create(
+                shop=self.shop, user=self.user, name=f'Item {i}', category='General',
+                price=1000, quantity_in_stock=50
+            )
+            for quantity in (50, 45, 40, 35):
+                StockHistory.objects.create(
+                    stock=stock, quantity_before=quantity, quantity_after=quantity - 5, action='sold'
+                )
+    
+    def _get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)['results'], len(queries)
+    
+    def test_list_leaves_out_history(self):
+        """The plain list carries no history"""
+        self._add_stocks(2)
+        stocks, _ = self._get('/api/stocks/')
+        self.assertNotIn('history', stocks[0])
+    
+    def test_expanded_history_is_limited_and_prefetched(self):
+        """expand=history returns the newest N rows per stock in one extra query"""
+        url = '/api/stocks/?expand=history&history_limit=2'
+        self._add_stocks(3)
+        stocks, small = self._get(url)
+        self._add_stocks(12)
+        stocks, large = self._get(url)
+        self.assertEqual(small, large)
+        
+        for stock in stocks:
+            self.assertEqual([row['quantity_before'] for row in stock['history']], [35, 40])
+
+    
+    def test_summary_is_one_query_with_breakdowns(self):
+        """summary aggregates in SQL; each breakdown adds one grouped query"""
+        self._add_stocks(3)
+        Stock.objects.filter(name='Item 0').update(category='Shoes', price=2500, cost_price=2000)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/stocks/summary/')
+        summary = json.loads(response.content)
+        self.assertEqual(len(queries), 3)  # session, user, aggregate
+        self.assertEqual(summary['total_stocks'], 3)
+        self.assertEqual(summary['total_quantity'], 150)
+        self.assertEqual(float(summary['inventory_value']), 2500 * 50 + 2 * 1000 * 50)
+        self.assertEqual(float(summary['inventory_cost']), 2000 * 50)
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/stocks/summary/?breakdown=category,shop')
+        summary = json.loads(response.content)
+        self.assertEqual(len(queries), 5)
+        self.assertEqual(
+            [(row['category'], row['total_stocks']) for row in summary['by_category']],
+            [('General', 2), ('Shoes', 1)]
+        )
+        self.assertEqual(summary['by_shop'][0]['shop__name'], 'Main Shop')
+        
+        response = self.client.get('/api/stocks/summary/?breakdown=colour')
+        self.assertEqual(response.status_code, 400)
 
 class SalesTests(TestCase):
     """Test sales endpoints"""
@@ -150,8 +261,10 @@ class SalesTests(TestCase):
             username='testuser',
             password='testpass123'
         )
+        self.shop = Shop.objects.create(user=self.user, name='Main Shop')
         
         self.stock = Stock.objects.create(
+            shop=self.shop,
             user=self.user,
             name='Shirts',
             category='Clothing',
@@ -234,3 +347,323 @@ class SalesTests(TestCase):
         
         self.assertEqual(data['total_sales'], 2)
         self.assertEqual(data['total_amount'], 225000)
+    
+    def test_summaries_return_aggregates_only(self):
+        """Summary query counts do not grow with the number of sales"""
+        cache.clear()
+        self.client.force_login(self.user)
+        self.client.get('/api/sales/summary/')  # warm the active-shop cache
+        
+        def count_queries(url, sales):
+            for _ in range(sales - Sale.objects.count()):
+                Sale.objects.create(
+                    shop=self.shop, stock=self.stock, user=self.user,
+                    quantity=1, price_per_unit=15000, total_amount=15000
+                )
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            return json.loads(response.content), len(queries)
+        
+        for url in ('/api/sales/daily_summary/', '/api/sales/report_data/?type=weekly'):
+            Sale.objects.all().delete()
+            data, few = count_queries(url, 2)
+            self.assertNotIn('sales', data)
+            data, many = count_queries(url, 25)
+            self.assertEqual(few, many, url)
+        
+        # ?include=sales adds one select_related page of the sales
+        data, few = count_queries('/api/sales/daily_summary/?include=sales', 25)
+        self.assertEqual(data['sales']['count'], 25)
+        self.assertEqual(len(data['sales']['results']), 20)
+        self.assertEqual(data['sales']['results'][0]['stock_name'], 'Shirts')
+        data, many = count_queries('/api/sales/daily_summary/?include=sales', 40)
+        self.assertEqual(few, many)
+
+    
+    def test_profit_margin_uses_captured_cost(self):
+        """Margins use the cost price captured on each sale"""
+        self.stock.cost_price = 9000
+        self.stock.save()
+        self.client.force_login(self.user)
+        
+        response = self.client.post(
+            '/api/sales/',
+            data=json.dumps({
+                'stock': self.stock.id,
+                'quantity': 2,
+                'price_per_unit': 15000,
+                'total_amount': 30000
+            }),
+            content_type='application/json'
+        )
+        self.assertEqual(json.loads(response.content)['unit_cost'], '9000.00')
+        
+        # A later cost change does not rewrite past sales
+        self.stock.cost_price = 12000
+        self.stock.save()
+        
+        response = self.client.get('/api/sales/profit_margin_analysis/')
+        data = json.loads(response.content)
+        product = data['products'][0]
+        
+        self.assertEqual(product['quantity_sold'], 2)
+        self.assertEqual(product['total_revenue'], 30000)
+        self.assertEqual(product['total_cost'], 18000)
+        self.assertEqual(product['total_profit'], 12000)
+        self.assertEqual(product['profit_margin_percent'], 40)
+        self.assertEqual(data['overall_metrics']['uncosted_sales'], 0)
+
+class BulkSaleTests(TestCase):
+    """Test the bulk POS sync endpoint"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.shop = Shop.objects.create(user=self.user, name='Main Shop')
+        self.stock = Stock.objects.create(
+            shop=self.shop,
+            user=self.user,
+            name='Shirts',
+            category='Clothing',
+            price=15000,
+            quantity_in_stock=10,
+            min_stock_level=5
+        )
+        self.client.force_login(self.user)
+        self.batch = [
+            {'stock': self.stock.id, 'quantity': 4, 'price_per_unit': 15000,
+             'total_amount': 60000, 'idempotency_key': 'till1-0001'},
+            {'stock': self.stock.id, 'quantity': 5, 'price_per_unit': 15000,
+             'total_amount': 75000, 'idempotency_key': 'till1-0002'},
+            {'stock': self.stock.id, 'quantity': 3, 'price_per_unit': 15000,
+             'total_amount': 45000, 'idempotency_key': 'till1-0003'},
+            {'stock': self.stock.id, 'quantity': 0, 'price_per_unit': 15000,
+             'total_amount': 0, 'idempotency_key': 'till1-0004'},
+        ]
+    
+    def _sync(self, batch):
+        return self.client.post(
+            '/api/sales/bulk/',
+            data=json.dumps({'sales': batch}),
+            content_type='application/json'
+        )
+    
+    def test_bulk_sync_per_row_results(self):
+        """Rows are accepted until the stock runs out; others are reported"""
+        response = self._sync(self.batch)
+        self.assertEqual(response.status_code, 201)
+        data = json.loads(response.content)
+        
+        self.assertEqual(data['created'], 2)
+        self.assertEqual(data['rejected'], 2)
+        self.assertEqual(
+            [row['status'] for row in data['results']],
+            ['created', 'created', 'insufficient_stock', 'invalid']
+        )
+        self.assertEqual(data['results'][2]['available'], 1)
+        
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity_in_stock, 1)
+        self.assertEqual(self.stock.quantity_sold, 9)
+        self.assertEqual(StockHistory.objects.filter(stock=self.stock).count(), 1)
+    
+    def test_bulk_sync_retry_is_idempotent(self):
+        """Re-sending a batch does not record its sales twice"""
+        first = json.loads(self._sync(self.batch[:2]).content)
+        response = self._sync(self.batch[:2])
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        
+        self.assertEqual(data['created'], 0)
+        self.assertEqual(data['duplicates'], 2)
+        self.assertEqual(
+            [row['id'] for row in data['results']],
+            [row['id'] for row in first['results']]
+        )
+        self.assertEqual(Sale.objects.count(), 2)
+        
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity_in_stock, 1)
+    
+    def test_repeat_of_rejected_row_is_not_a_duplicate(self):
+        """A key repeated in one batch gets its first row's rejection, not 'duplicate'"""
+        sale = {'stock': self.stock.id, 'quantity': 20, 'price_per_unit': 15000,
+                'total_amount': 300000, 'idempotency_key': 'k1'}
+        missing = dict(sale, stock=self.stock.id + 100, quantity=1, idempotency_key='k2')
+        data = json.loads(self._sync([sale, missing, sale, missing]).content)
+        
+        self.assertEqual(data['created'], 0)
+        self.assertEqual(data['duplicates'], 0)
+        self.assertEqual(
+            [(row['index'], row['status']) for row in data['results']],
+            [(0, 'insufficient_stock'), (1, 'invalid'), (2, 'insufficient_stock'), (3, 'invalid')]
+        )
+        
+        # Once the first row is recorded, its repeat is a duplicate with the same id
+        sale['quantity'] = 1
+        data = json.loads(self._sync([sale, sale]).content)
+        self.assertEqual([row['status'] for row in data['results']], ['created', 'duplicate'])
+        self.assertEqual(data['results'][1]['id'], data['results'][0]['id'])
+
+
+class CursorPaginationTests(TestCase):
+    """Test keyset pagination on the sales list"""
+    
+    def setUp(self):
+        """Set up 25 sales with identical timestamps in pairs"""
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.shop = Shop.objects.create(user=self.user, name='Main Shop')
+        self.stock = Stock.objects.create(
+            shop=self.shop,
+            user=self.user,
+            name='Shirts',
+            category='Clothing',
+            price=1000,
+            quantity_in_stock=100
+        )
+        base = timezone.now() - timedelta(days=30)
+        for i in range(25):
+            sale = Sale.objects.create(
+                shop=self.shop, stock=self.stock, user=self.user,
+                quantity=1, price_per_unit=1000, total_amount=1000
+            )
+            Sale.objects.filter(pk=sale.pk).update(created_at=base + timedelta(hours=i // 2))
+        self.client.force_login(self.user)
+    
+    def _get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+    
+    def test_cursor_pages_cover_every_row_once(self):
+        """Pages follow (created_at, id) newest first without COUNT(*)"""
+        with CaptureQueriesContext(connection) as queries:
+            first = self._get('/api/sales/?cursor=')
+        self.assertNotIn('count', first)
+        self.assertFalse(any('COUNT(' in q['sql'] for q in queries))
+        self.assertIsNone(first['previous'])
+        self.assertEqual(len(first['results']), 20)
+        
+        # A sale recorded meanwhile does not shift the next page
+        Sale.objects.create(
+            shop=self.shop, stock=self.stock, user=self.user,
+            quantity=1, price_per_unit=1000, total_amount=1000
+        )
+        second = self._get(first['next'])
+        self.assertIsNone(second['next'])
+        self.assertEqual(len(second['results']), 5)
+        
+        ids = [sale['id'] for sale in first['results'] + second['results']]
+        expected = list(
+            Sale.objects.filter(created_at__lt=timezone.now() - timedelta(days=1))
+            .order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+        
+        back = self._get(second['previous'])
+        self.assertEqual([sale['id'] for sale in back['results']], ids[:20])
+    
+    def test_page_numbers_still_work(self):
+        """Clients without ?cursor keep the page-number format"""
+        page = self._get('/api/sales/?page=2')
+        self.assertEqual(page['count'], 25)
+        self.assertEqual(len(page['results']), 5)
+    
+    def test_invalid_cursor(self):
+        """Garbage cursors are rejected"""
+        response = self.client.get('/api/sales/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class StockConcurrencyTests(TransactionTestCase):
+    """Stress concurrent checkouts against a single stock row"""
+    
+    THREADS = 8
+    ATTEMPTS = 40
+    INITIAL_STOCK = 25
+    
+    def setUp(self):
+        """Set up one stock and one logged-in client per thread"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.shop = Shop.objects.create(user=self.user, name='Main Shop')
+        self.stock = Stock.objects.create(
+            shop=self.shop,
+            user=self.user,
+            name='Shirts',
+            category='Clothing',
+            price=15000,
+            quantity_in_stock=self.INITIAL_STOCK,
+            min_stock_level=10
+        )
+        self.clients = []
+        for _ in range(self.THREADS):
+            client = Client()
+            client.force_login(self.user)
+            self.clients.append(client)
+    
+    def _sell_one(self, attempt):
+        client = self.clients[attempt % self.THREADS]
+        try:
+            response = client.post(
+                '/api/sales/',
+                data=json.dumps({
+                    'stock': self.stock.id,
+                    'quantity': 1,
+                    'price_per_unit': 15000,
+                    'total_amount': 15000
+                }),
+                content_type='application/json'
+            )
+            return response.status_code
+        finally:
+            connection.close()
+    
+    def test_concurrent_sales_never_oversell(self):
+        """Every accepted sale is reflected exactly once in stock and history"""
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            statuses = list(pool.map(self._sell_one, range(self.ATTEMPTS)))
+        
+        created = statuses.count(201)
+        self.assertEqual(created + statuses.count(409), self.ATTEMPTS, statuses)
+        self.assertEqual(created, self.INITIAL_STOCK)
+        
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity_in_stock, 0)
+        self.assertEqual(self.stock.quantity_sold, self.INITIAL_STOCK)
+        self.assertEqual(Sale.objects.filter(stock=self.stock).count(), self.INITIAL_STOCK)
+        self.assertEqual(
+            StockHistory.objects.filter(stock=self.stock, action='sold').count(),
+            self.INITIAL_STOCK
+        )
+    
+    def test_oversell_returns_conflict(self):
+        """Selling more than is in stock is rejected with 409"""
+        response = self.clients[0].post(
+            '/api/sales/',
+            data=json.dumps({
+                'stock': self.stock.id,
+                'quantity': self.INITIAL_STOCK + 1,
+                'price_per_unit': 15000,
+                'total_amount': 15000
+            }),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(json.loads(response.content)['available'], self.INITIAL_STOCK)
+        self.assertEqual(Sale.objects.count(), 0)
+        
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity_in_stock, self.INITIAL_STOCK)
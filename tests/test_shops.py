@@ -0,0 +1,91 @@
+"""
+Tests for the cached active-shop lookup
+"""
+import tempfile
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from django.db import connection
+from inventory.models import Stock
+from sales.models import Sale
+from shops.models import Shop
+import json
+
+
+SHARED_CACHE = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': tempfile.mkdtemp(prefix='shops-cache-'),
+    },
+    'analytics': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'analytics'},
+}
+
+
+class ActiveShopTests(TestCase):
+    """Test that the active shop is resolved from the cache and invalidated on change"""
+    
+    def setUp(self):
+        """Set up two shops with one sale each"""
+        self.enterContext(override_settings(CACHES=SHARED_CACHE))
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.main = Shop.objects.create(user=self.user, name='Main Shop', is_active=True)
+        self.branch = Shop.objects.create(user=self.user, name='Branch', is_active=False)
+        for shop in (self.main, self.branch):
+            stock = Stock.objects.create(
+                shop=shop, user=self.user, name=f'{shop.name} item', category='General',
+                price=1000, quantity_in_stock=10
+            )
+            Sale.objects.create(
+                shop=shop, stock=stock, user=self.user,
+                quantity=1, price_per_unit=1000, total_amount=1000
+            )
+        self.client.force_login(self.user)
+    
+    def _shop_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in queries if 'FROM "shops_shop"' in q['sql']]
+    
+    def _sale_shops(self):
+        response = self.client.get('/api/sales/')
+        return {sale['shop'] for sale in json.loads(response.content)['results']}
+    
+    def test_warm_requests_skip_the_shop_query(self):
+        """With a shared cache only the first request looks the active shop up"""
+        self.assertEqual(len(self._shop_queries('/api/sales/')), 1)
+        self.assertEqual(self._shop_queries('/api/sales/'), [])
+        # Only the endpoint that returns the shop itself loads the row
+        self.assertEqual(len(self._shop_queries('/api/shops/active_shop/')), 1)
+    
+    def test_per_process_cache_is_not_used_across_requests(self):
+        """With the LocMem default a switch made by another worker is seen at once"""
+        with override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'analytics': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'analytics'},
+        }):
+            self.assertEqual(self._sale_shops(), {self.main.id})
+            self.assertEqual(len(self._shop_queries('/api/sales/')), 1)
+            
+            # As another worker would: its cache invalidation never reaches this process
+            Shop.objects.filter(pk=self.main.pk).update(is_active=False)
+            Shop.objects.filter(pk=self.branch.pk).update(is_active=True)
+            self.assertEqual(self._sale_shops(), {self.branch.id})
+    
+    def test_set_active_and_delete_invalidate(self):
+        """Switching or deleting shops is seen by the next request"""
+        self.assertEqual(self._sale_shops(), {self.main.id})
+        
+        response = self.client.post(f'/api/shops/{self.branch.id}/set_active/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._sale_shops(), {self.branch.id})
+        
+        self.client.delete(f'/api/shops/{self.branch.id}/')
+        response = self.client.get('/api/shops/active_shop/')
+        self.assertEqual(response.status_code, 404)